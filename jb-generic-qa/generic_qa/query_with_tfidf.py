@@ -1,11 +1,12 @@
 import fitz
-from sklearn.feature_extraction.text import TfidfVectorizer
 import os
 import re
 import csv
 import tempfile
-import numpy as np
+from typing import Dict, Tuple
+from cachetools import LRUCache, cached
 from jugalbandi.core.language import Language
+from jugalbandi.library import TitleSearchIndex
 from jugalbandi.audio_converter import convert_to_wav_with_ffmpeg
 from jugalbandi.core.errors import InternalServerException
 
@@ -73,15 +74,29 @@ def tfidf_indexing(directory):
             )
 
 
-async def querying_with_tfidf(
-    translator, speech_processor, query, input_language, audio_file
-):
+@cached(cache=LRUCache(maxsize=2))
+def _load_titles_index(
+    file_path: str, modified_ns: int
+) -> Tuple[Dict[str, str], TitleSearchIndex]:
     titles_map = {}
-    with open("Titles.csv", newline="") as csvfile:
+    with open(file_path, newline="") as csvfile:
         reader = csv.DictReader(csvfile)
         for row in reader:
             titles_map[row["Document Title"]] = row["Document Public Url"]
-    titles_list = list(titles_map.keys())
+    return titles_map, TitleSearchIndex(list(titles_map))
+
+
+def _titles_index(
+    file_path: str = "Titles.csv",
+) -> Tuple[Dict[str, str], TitleSearchIndex]:
+    # keyed by the modification time, a rewritten Titles.csv is fitted again
+    return _load_titles_index(file_path, os.stat(file_path).st_mtime_ns)
+
+
+async def querying_with_tfidf(
+    translator, speech_processor, query, input_language, audio_file
+):
+    titles_map, titles_index = _titles_index()
 
     if query == "":
         if audio_file is not None:
@@ -97,15 +112,8 @@ async def querying_with_tfidf(
             if query is None:
                 raise InternalServerException("Query translation failed")
 
-    vectorizer = TfidfVectorizer()
-    tfidf_matrix = vectorizer.fit_transform(titles_list)
-    title_vector = vectorizer.transform([query])
-    cosine_similarities = tfidf_matrix.dot(title_vector.T).toarray().flatten()
-    top_3_indices = np.argsort(cosine_similarities)[-3:][::-1]
-
     answer_list = []
-    for i in top_3_indices:
-        title = titles_list[i]
-        answer_list.append((title, titles_map[title], round(cosine_similarities[i], 2)))
+    for title, score in titles_index.search(query, 3):
+        answer_list.append((title, titles_map[title], round(score, 2)))
 
     return answer_list
@@ -1,14 +1,18 @@
 from .server_env import init_env
+from contextlib import asynccontextmanager
 from typing import Annotated, List
 from fastapi import FastAPI, UploadFile, Depends, Query, File
 from fastapi.responses import JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.security.api_key import APIKey
 from jugalbandi.core import (
+  AudioFormat,
   Language,
   MediaFormat,
   IncorrectInputException,
-  SpeechProcessor as SpeechProcessorEnum
+  SpeechProcessor as SpeechProcessorEnum,
+  BhashiniClient,
+  http_client_lifespan,
 )
 from jugalbandi.translator import (
   Translator,
@@ -79,6 +83,17 @@ response over it.
 """
 
 
+@asynccontextmanager
+async def lifespan(app):
+    async with http_client_lifespan(app):
+        document_repository = await get_document_repository()
+        try:
+            yield
+        finally:
+            await BhashiniClient().shutdown()
+            await document_repository.shutdown()
+
+
 app = FastAPI(
     title="Jugalbandi.ai",
     description=api_description,
@@ -88,6 +103,7 @@ app = FastAPI(
         "name": "MIT License",
         "url": "https://www.jugalbandi.ai/",
     },
+    lifespan=lifespan,
 )
 
 
@@ -143,16 +159,16 @@ async def upload_files(
 ):
     document_collection = document_repository.new_collection()
     source_files = [DocumentSourceFile(file.filename, file) for file in files]
-    await document_collection.init_from_files(source_files)
+    # the local copies are read by the text converter and the indexers
+    async with document_collection.in_use():
+        await document_collection.init_from_files(source_files)
+        await text_converter.textify_collection(document_collection)
 
-    async for filename in document_collection.list_files():
-        await text_converter.textify(filename, document_collection)
+        gpt_indexer = GPTIndexer()
+        langchain_indexer = LangchainIndexer()
 
-    gpt_indexer = GPTIndexer()
-    langchain_indexer = LangchainIndexer()
-
-    await gpt_indexer.index(document_collection)
-    await langchain_indexer.index(document_collection)
+        await gpt_indexer.index(document_collection)
+        await langchain_indexer.index(document_collection)
     return {
         "uuid_number": document_collection.id,
         "message": "Files uploading is successful",
@@ -436,7 +452,8 @@ async def get_text_to_speech(
     authorization: Annotated[User, Depends(verify_access_token)],
     text_query: str,
     language: Language,
-    speech_processor_enum: SpeechProcessorEnum
+    speech_processor_enum: SpeechProcessorEnum,
+    output_format: AudioFormat = AudioFormat.MP3,
 ):
     if speech_processor_enum.value == "Azure":
         speech_processor = AzureSpeechProcessor()
@@ -446,7 +463,8 @@ async def get_text_to_speech(
         speech_processor = DhruvaSpeechProcessor()
 
     print(text_query)
-    audio_bytes = await speech_processor.text_to_speech(text_query, language)
+    audio_bytes = await speech_processor.text_to_speech(text_query, language,
+                                                        output_format=output_format)
     audio_base64 = base64.b64encode(audio_bytes).decode('utf-8')
     return {"audio_bytes": audio_base64}
 
@@ -12,8 +12,11 @@ from jugalbandi.document_collection import (
     DocumentRepository,
     DocumentCollection,
     LocalStorage,
+    LocalStoreJanitor,
     GoogleStorage,
+    CachingStorage,
 )
+from prometheus_client import Counter, Gauge
 from jugalbandi.qa import (
     GPTIndexQAEngine,
     LangchainQAEngine,
@@ -22,6 +25,7 @@ from jugalbandi.qa import (
 )
 from jugalbandi.speech_processor import (
     CompositeSpeechProcessor,
+    LongAudioSpeechProcessor,
     DhruvaSpeechProcessor,
     GoogleSpeechProcessor,
     AzureSpeechProcessor,
@@ -60,12 +64,36 @@ async def verify_access_token(token: Annotated[str, Depends(reusable_oauth)]):
     return User(username=username, email=username)
 
 
+local_store_bytes = Gauge("local_store_bytes",
+                          "Bytes used by the local document store at the last sweep")
+local_store_evictions = Counter("local_store_evictions",
+                                "Collections evicted from the local document store")
+local_store_evicted_bytes = Counter("local_store_evicted_bytes",
+                                    "Bytes evicted from the local document store")
+
+
+def _record_eviction(collection_id: str, size: int):
+    local_store_evictions.inc()
+    local_store_evicted_bytes.inc(size)
+
+
 @aiocached(cache={})
 async def get_document_repository() -> DocumentRepository:
     # TODO: Rename the env variable
-    return DocumentRepository(LocalStorage(os.environ["DOCUMENT_LOCAL_STORAGE_PATH"]),
-                              GoogleStorage(os.environ["GCP_BUCKET_NAME"],
-                              os.environ["GCP_BUCKET_FOLDER_NAME"]))
+    remote_store = CachingStorage(
+        GoogleStorage(os.environ["GCP_BUCKET_NAME"],
+                      os.environ["GCP_BUCKET_FOLDER_NAME"],
+                      listing_cache_ttl=float(os.getenv("STORAGE_LISTING_CACHE_TTL", "30"))),
+        os.getenv("STORAGE_CACHE_DIR", "storage_cache"),
+        int(os.getenv("STORAGE_CACHE_MAX_BYTES", str(1024 * 1024 * 1024))))
+    local_path = os.environ["DOCUMENT_LOCAL_STORAGE_PATH"]
+    janitor = LocalStoreJanitor(
+        local_path,
+        int(os.getenv("DOCUMENT_LOCAL_STORAGE_MAX_BYTES", str(10 * 1024 * 1024 * 1024))),
+        grace_period=float(os.getenv("DOCUMENT_LOCAL_STORAGE_GRACE_PERIOD", "300")),
+        on_evict=_record_eviction)
+    local_store_bytes.set_function(lambda: janitor.used_bytes)
+    return DocumentRepository(LocalStorage(local_path), remote_store, janitor)
 
 
 async def get_document_collection(
@@ -77,16 +105,23 @@ async def get_document_collection(
     return document_repository.get_collection(uuid_number)
 
 
+@aiocached(cache={})
 async def get_speech_processor():
-    return CompositeSpeechProcessor(DhruvaSpeechProcessor(),
-                                    AzureSpeechProcessor(),
-                                    GoogleSpeechProcessor())
+    # cached so that backend latency stats and circuit breakers persist
+    # long voice notes are split before routing, so every chunk can fail over
+    return LongAudioSpeechProcessor(
+        CompositeSpeechProcessor(DhruvaSpeechProcessor(),
+                                 AzureSpeechProcessor(),
+                                 GoogleSpeechProcessor(),
+                                 hedge=os.getenv("SPEECH_PROCESSOR_HEDGE", "false") == "true"))
 
 
+@aiocached(cache={})
 async def get_translator():
     return CompositeTranslator(AzureTranslator(),
                                DhruvaTranslator(),
-                               GoogleTranslator())
+                               GoogleTranslator(),
+                               hedge=os.getenv("TRANSLATOR_HEDGE", "false") == "true")
 
 
 async def get_gpt_index_qa_engine(
@@ -4,7 +4,7 @@ from jose import JWTError
 from jugalbandi.core.caching import aiocached
 from jugalbandi.auth_token.token import decode_token, decode_refresh_token
 from jugalbandi.legal_library import LegalLibrary
-from jugalbandi.storage import GoogleStorage
+from jugalbandi.storage import CachingStorage, GoogleStorage
 from jugalbandi.translator import (
     CompositeTranslator,
     GoogleTranslator,
@@ -12,6 +12,7 @@ from jugalbandi.translator import (
 )
 from jugalbandi.jiva_repository import JivaRepository
 from .model import User
+from .query_classifier import QueryClassifier
 from typing import Annotated
 import os
 import openai
@@ -35,12 +36,41 @@ async def get_jiva_repo() -> JivaRepository:
 async def get_library() -> LegalLibrary:
     bucket_name = os.environ["JIVA_LIBRARY_BUCKET"]
     library_path = os.environ["JIVA_LIBRARY_PATH"]
-    google_storage = GoogleStorage(bucket_name, library_path)
-    return LegalLibrary(id="jiva", store=google_storage)
+    google_storage = GoogleStorage(
+        bucket_name,
+        library_path,
+        listing_cache_ttl=float(os.getenv("STORAGE_LISTING_CACHE_TTL", "30")),
+    )
+    store = CachingStorage(
+        google_storage,
+        os.getenv("STORAGE_CACHE_DIR", "storage_cache"),
+        int(os.getenv("STORAGE_CACHE_MAX_BYTES", str(1024 * 1024 * 1024))),
+    )
+    return LegalLibrary(
+        id="jiva",
+        store=store,
+        local_index_path=os.getenv("LIBRARY_LOCAL_INDEX_PATH", "library_indexes"),
+    )
 
 
+@aiocached(cache={})
+async def get_query_classifier() -> QueryClassifier:
+    # trained in the background by the app lifespan, until then rules and the LLM classify
+    jiva_repo = await get_jiva_repo()
+    return QueryClassifier(
+        classify_query,
+        min_confidence=float(os.getenv("QUERY_CLASSIFIER_MIN_CONFIDENCE", "0.8")),
+        record=jiva_repo.insert_query_classification,
+    )
+
+
+@aiocached(cache={})
 async def get_translator():
-    return CompositeTranslator(GoogleTranslator(), DhruvaTranslator())
+    return CompositeTranslator(
+        GoogleTranslator(),
+        DhruvaTranslator(),
+        hedge=os.getenv("TRANSLATOR_HEDGE", "false") == "true",
+    )
 
 
 async def verify_access_token(
@@ -191,7 +221,7 @@ async def classify_query(query: str) -> str:
         Return only either Descriptive Search or Non Descriptive Search for the given query as the output.
         """
     )
-    res = openai.ChatCompletion.create(
+    res = await openai.ChatCompletion.acreate(
         model="gpt-3.5-turbo",
         messages=[
             {"role": "system", "content": system_rules},
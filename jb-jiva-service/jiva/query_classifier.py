@@ -0,0 +1,136 @@
+import asyncio
+import logging
+import operator
+import re
+from typing import Awaitable, Callable, List, Optional
+from cachetools import LRUCache
+from jugalbandi.core.caching import aiocachedmethod
+from jugalbandi.jiva_repository import JivaRepository
+from jugalbandi.legal_library import SECTION_REGEX
+from sklearn.feature_extraction.text import TfidfVectorizer
+from sklearn.linear_model import LogisticRegression
+from sklearn.pipeline import Pipeline, make_pipeline
+
+logger = logging.getLogger(__name__)
+
+DESCRIPTIVE_SEARCH = "Descriptive Search"
+NON_DESCRIPTIVE_SEARCH = "Non Descriptive Search"
+
+QUESTION_WORDS = {
+    "what", "how", "why", "when", "who", "whom", "whose", "which", "where", "is", "are", "can", "could",
+    "do", "does", "did", "should", "shall", "will", "would", "may", "explain", "describe",
+}
+COMMAND_WORDS = {"give", "find", "get", "show", "open", "list", "search", "display", "fetch"}
+# fewer labelled queries than this, or only one kind of them, and the LLM decides
+MIN_TRAINING_QUERIES = 20
+
+
+def classify_by_rules(query: str) -> Optional[str]:
+    """The type of obvious queries, None when the rules cannot tell"""
+    words = re.findall(r"[a-z]+", query.lower())
+    if not words:
+        return None
+    # before the question words, "What is section 302 of IPC?" asks for the section
+    if SECTION_REGEX.search(query):
+        return NON_DESCRIPTIVE_SEARCH
+    if query.strip().endswith("?") or words[0] in QUESTION_WORDS:
+        return DESCRIPTIVE_SEARCH
+    if words[0] in COMMAND_WORDS:
+        return NON_DESCRIPTIVE_SEARCH
+    return None
+
+
+class QueryClassifier:
+    """
+    Decides between descriptive and non descriptive searches in three
+    stages: rules for the obvious queries, then TF-IDF and logistic
+    regression trained on labelled queries, then the LLM (``fallback``)
+    when the model is less than ``min_confidence`` sure. Results are cached
+    per query, decisions of the LLM are passed to ``record`` so that they
+    can be trained on.
+    """
+
+    def __init__(
+        self,
+        fallback: Callable[[str], Awaitable[str]],
+        min_confidence: float = 0.8,
+        cache_size: int = 4096,
+        record: Optional[Callable[[str, str], Awaitable[None]]] = None,
+    ):
+        self.fallback = fallback
+        self.min_confidence = min_confidence
+        self.record = record
+        self._model: Optional[Pipeline] = None
+        self._cache: LRUCache = LRUCache(maxsize=cache_size)
+
+    @property
+    def trained(self) -> bool:
+        return self._model is not None
+
+    def train(self, queries: List[str], labels: List[str]) -> bool:
+        if len(queries) < MIN_TRAINING_QUERIES or len(set(labels)) < 2:
+            return False
+        model = make_pipeline(
+            TfidfVectorizer(ngram_range=(1, 2), sublinear_tf=True),
+            LogisticRegression(max_iter=1000, class_weight="balanced"),
+        )
+        model.fit(queries, labels)
+        self._model = model
+        self._cache.clear()
+        return True
+
+    async def train_from_logs(self, jiva_repository: JivaRepository) -> bool:
+        # decisions of the LLM, and queries whose document or section result the user confirmed
+        # as right, which were answered by the title and section search
+        queries = []
+        labels = []
+        for row in await jiva_repository.get_query_classifications():
+            queries.append(row["query"])
+            labels.append(row["query_type"])
+        for row in await jiva_repository.get_feedback_queries():
+            if row["document_title"] or row["section_name"]:
+                queries.append(row["query"])
+                labels.append(NON_DESCRIPTIVE_SEARCH)
+        return await asyncio.to_thread(self.train, queries, labels)
+
+    async def keep_trained(
+        self,
+        jiva_repository: JivaRepository,
+        interval: float = 3600.0,
+        retry_interval: float = 60.0,
+    ):
+        """Trains now and then every ``interval`` seconds, failed attempts are retried sooner"""
+        while True:
+            try:
+                trained = await self.train_from_logs(jiva_repository)
+                logger.info(f"query classifier trained: {trained}")
+                await asyncio.sleep(interval)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Could not train the query classifier")
+                await asyncio.sleep(retry_interval)
+
+    def classify_by_model(self, query: str) -> Optional[str]:
+        if self._model is None:
+            return None
+        probabilities = self._model.predict_proba([query])[0]
+        best = probabilities.argmax()
+        if probabilities[best] < self.min_confidence:
+            return None
+        return self._model.classes_[best]
+
+    @aiocachedmethod(operator.attrgetter("_cache"))
+    async def classify(self, query: str) -> str:
+        query_type = classify_by_rules(query) or self.classify_by_model(query)
+        if query_type is not None:
+            return query_type
+        query_type = DESCRIPTIVE_SEARCH
+        if NON_DESCRIPTIVE_SEARCH in await self.fallback(query):
+            query_type = NON_DESCRIPTIVE_SEARCH
+        if self.record is not None:
+            try:
+                await self.record(query, query_type)
+            except Exception:
+                logger.exception("Could not record the query classification")
+        return query_type
@@ -1,10 +1,35 @@
+import asyncio
+from contextlib import asynccontextmanager
 import os
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from jugalbandi.core import BhashiniClient, http_client_lifespan
+
+
+@asynccontextmanager
+async def lifespan(app):
+    from .helper import get_jiva_repo, get_library, get_query_classifier
+
+    async with http_client_lifespan(app):
+        library = await get_library()
+        query_classifier = await get_query_classifier()
+        training = asyncio.create_task(
+            query_classifier.keep_trained(
+                await get_jiva_repo(),
+                interval=float(os.getenv("QUERY_CLASSIFIER_TRAINING_INTERVAL", "3600")),
+            )
+        )
+        try:
+            yield
+        finally:
+            training.cancel()
+            await asyncio.gather(training, return_exceptions=True)
+            await BhashiniClient().shutdown()
+            await library.shutdown()
 
 
 def create_app(**kwargs):
-    app = FastAPI()
+    app = FastAPI(lifespan=lifespan)
     add_cors(app)
     mount_routes(app)
     return app
@@ -1,10 +1,10 @@
+import asyncio
 from io import BytesIO
-import httpx
-import re
 import json
-from typing import Annotated, Optional
-from fastapi import Depends, FastAPI, Response
-from fastapi.responses import JSONResponse
+import tempfile
+from typing import Annotated, AsyncIterator, Optional
+from fastapi import Depends, FastAPI, HTTPException, Response
+from fastapi.responses import JSONResponse, StreamingResponse
 from jugalbandi.jiva_repository import JivaRepository
 from .model import (
     DocumentInfo,
@@ -24,12 +24,13 @@ from .helper import (
   verify_access_token,
   get_library,
   get_translator,
-  classify_query
+  get_query_classifier
 )
+from .query_classifier import NON_DESCRIPTIVE_SEARCH, QueryClassifier
 from .model import User
 from fastapi.middleware.cors import CORSMiddleware
 from jugalbandi.library import DocumentMetaData
-from jugalbandi.legal_library.legal_library import LegalLibrary, ActMetaData
+from jugalbandi.legal_library.legal_library import LegalLibrary, ActMetaData, SECTION_REGEX
 from jugalbandi.translator import Translator
 from jugalbandi.core.language import Language
 from PIL import Image
@@ -70,6 +71,7 @@ async def query(
     authorization: Annotated[User, Depends(verify_access_token)],
     jiva_library: Annotated[LegalLibrary, Depends(get_library)],
     translator: Annotated[Translator, Depends(get_translator)],
+    query_classifier: Annotated[QueryClassifier, Depends(get_query_classifier)],
     query: str,
     # language: Language,
 ):
@@ -77,11 +79,10 @@ async def query(
     language = Language.EN
     if language != Language.EN:
         query = await translator.translate_text(query, language, Language.EN)
-    pattern = re.compile(r"\b[Ss]ec(?:tion)?", re.IGNORECASE)
-    query_type = await classify_query(query)
+    query_type = await query_classifier.classify(query)
     print(query_type)
-    if "Non Descriptive Search" in query_type:
-        matches = re.search(pattern, query)
+    if query_type == NON_DESCRIPTIVE_SEARCH:
+        matches = SECTION_REGEX.search(query)
         if matches:
             responses = await jiva_library.search_sections(query)
             section_response = [
@@ -119,6 +120,20 @@ async def query_testing(
     return {"query": query, "response": response}
 
 
+def _render_page(pdf_path: str, page_no: int) -> bytes:
+    with fitz.open(pdf_path) as pdf_document:
+        if page_no < 1 or page_no > pdf_document.page_count:
+            raise ValueError("Invalid page number")
+
+        page = pdf_document.load_page(page_no - 1)
+        pix = page.get_pixmap()
+        image = Image.frombytes("RGB", [pix.width, pix.height], pix.samples)
+
+    image_buffer = BytesIO()
+    image.save(image_buffer, format="PNG")
+    return image_buffer.getvalue()
+
+
 @user_app.get(
     "/document/{document_id}",
 )
@@ -129,27 +144,34 @@ async def get_document(
     page_number: Optional[str] = None,
 ) -> Response:
     catalog = await jiva_library.catalog()
-    document = catalog[document_id]
-    pdf_url = document.public_url
-    response = httpx.get(pdf_url)
-    buffer = BytesIO(response.content)
+    metadata = catalog.get(document_id)
+    if metadata is None:
+        raise HTTPException(status_code=404, detail="Document not found")
+    document = jiva_library.get_document(document_id)
 
     if page_number is not None:
         page_no = int(page_number)
-        pdf_document = fitz.open(stream=buffer.read(), filetype="pdf")
-        if page_no < 1 or page_no > pdf_document.page_count:
-            raise ValueError("Invalid page number")
+        # fitz needs random access to the pdf, spool it to disk instead of memory
+        with tempfile.NamedTemporaryFile(suffix=".pdf") as pdf_file:
+            await document.download_document(pdf_file.name,
+                                             metadata.original_format)
+            image_bytes = await asyncio.to_thread(_render_page, pdf_file.name, page_no)
+        return Response(content=image_bytes, media_type="image/png")
+    else:
+        chunks = document.stream_document(metadata.original_format)
+        # the status goes out with the first chunk, a missing file or a storage
+        # error has to surface before the response starts
+        try:
+            first_chunk = await anext(chunks, b"")
+        except FileNotFoundError:
+            raise HTTPException(status_code=404, detail="Document not found")
 
-        page = pdf_document.load_page(page_no - 1)
-        pix = page.get_pixmap()
-        image = Image.frombytes("RGB", [pix.width, pix.height], pix.samples)
+        async def _stream() -> AsyncIterator[bytes]:
+            yield first_chunk
+            async for chunk in chunks:
+                yield chunk
 
-        image_buffer = BytesIO()
-        image.save(image_buffer, format="PNG")
-        image_buffer.seek(0)
-        return Response(content=image_buffer.read(), media_type="image/png")
-    else:
-        return Response(content=buffer.read(), media_type="application/pdf")
+        return StreamingResponse(_stream(), media_type="application/pdf")
 
 
 @user_app.get(
@@ -216,10 +238,7 @@ async def get_act_info(
     act_id: str,
 ):
     act_catalog = await jiva_library.act_catalog()
-    acts = act_catalog.values()
-    for act in acts:
-        if act.id == act_id:
-            return act
+    return act_catalog.get(act_id)
 
 
 @user_app.get(
@@ -0,0 +1,67 @@
+import pytest
+from jiva.query_classifier import (
+    DESCRIPTIVE_SEARCH,
+    NON_DESCRIPTIVE_SEARCH,
+    QueryClassifier,
+    classify_by_rules,
+)
+
+
+def test_rules():
+    assert classify_by_rules("Section 302 IPC") == NON_DESCRIPTIVE_SEARCH
+    assert classify_by_rules("sec 41 of the motor vehicles act") == NON_DESCRIPTIVE_SEARCH
+    assert classify_by_rules("What is section 302 of IPC?") == NON_DESCRIPTIVE_SEARCH
+    assert classify_by_rules("Which section IV applies to theft") == NON_DESCRIPTIVE_SEARCH
+    assert classify_by_rules("Give me the stamp act") == NON_DESCRIPTIVE_SEARCH
+    assert classify_by_rules("What is the punishment for theft") == DESCRIPTIVE_SEARCH
+    assert classify_by_rules("punishment for theft?") == DESCRIPTIVE_SEARCH
+    # no section number, the model or the LLM decides
+    assert classify_by_rules("Procedure for a second appeal in civil courts") is None
+    assert classify_by_rules("Rights of secured creditors under the SARFAESI act") is None
+    assert classify_by_rules("punishment for theft") is None
+    # search_sections cannot parse these
+    assert classify_by_rules("sec. 41 of the motor vehicles act") is None
+    assert classify_by_rules("section41 of the motor vehicles act") is None
+    assert classify_by_rules("security deposit under the second schedule") is None
+
+
+def _training_data():
+    queries = [f"motor vehicles act rules {i}" for i in range(15)]
+    queries += [f"procedure for bail in a murder case {i}" for i in range(15)]
+    labels = [NON_DESCRIPTIVE_SEARCH] * 15 + [DESCRIPTIVE_SEARCH] * 15
+    return queries, labels
+
+
+def test_model_threshold():
+    classifier = QueryClassifier(fallback=None, min_confidence=0.6)  # type: ignore
+    assert not classifier.train(["too few"], [DESCRIPTIVE_SEARCH])
+    assert classifier.classify_by_model("motor vehicles act rules") is None
+
+    assert classifier.train(*_training_data())
+    assert classifier.classify_by_model("motor vehicles act rules") == NON_DESCRIPTIVE_SEARCH
+    assert classifier.classify_by_model("bail in a murder case") == DESCRIPTIVE_SEARCH
+    # nothing in common with the training queries
+    assert classifier.classify_by_model("karnataka stamp duty") is None
+
+    classifier.min_confidence = 1.0
+    assert classifier.classify_by_model("motor vehicles act rules") is None
+
+
+@pytest.mark.asyncio
+async def test_llm_fallback_is_cached_and_recorded():
+    fallback_queries = []
+    recorded = []
+
+    async def _fallback(query: str) -> str:
+        fallback_queries.append(query)
+        return "Non Descriptive Search"
+
+    async def _record(query: str, query_type: str):
+        recorded.append((query, query_type))
+
+    classifier = QueryClassifier(_fallback, record=_record)
+    assert await classifier.classify("punishment for theft") == NON_DESCRIPTIVE_SEARCH
+    assert await classifier.classify("punishment for theft") == NON_DESCRIPTIVE_SEARCH
+    assert await classifier.classify("Section 379 IPC") == NON_DESCRIPTIVE_SEARCH
+    assert fallback_queries == ["punishment for theft"]
+    assert recorded == [("punishment for theft", NON_DESCRIPTIVE_SEARCH)]
@@ -10,7 +10,6 @@ from jugalbandi.library import (
 from jugalbandi.storage import GoogleStorage
 from PIL import Image
 from io import BytesIO
-import httpx
 import os
 import fitz
 import asyncio
@@ -24,6 +23,7 @@ from datetime import datetime
 from dotenv import load_dotenv
 from jugalbandi.translator import GoogleTranslator
 from jugalbandi.core.language import Language
+from jugalbandi.core import get_http_client
 
 
 # Function to get metadata from google sheets and convert it to csv file
@@ -120,7 +120,7 @@ async def upload_file(jiva_library: Library, document_file_path: str, document_m
 # Function to upload thumbnail image (1st page of act) to cloud storage
 async def upload_thumbnail(document: Document):
     document_meta_data = await document.read_metadata()
-    response = httpx.get(document_meta_data.public_url)
+    response = await get_http_client().get(document_meta_data.public_url)
     buffer = BytesIO(response.content)
     pdf_document = fitz.open(stream=buffer.read(), filetype="pdf")
     page = pdf_document.load_page(0)
@@ -178,23 +178,25 @@ async def act_uploading_process(jiva_library: Library, csv_file_name: str):
 
     counter = 1
     base_act_path = os.environ["ACTS_PATH"]
-    for meta_data in raw_meta_data:
-        file_path = os.path.join(base_act_path, meta_data["File Name"])
-        document_meta_data = await set_meta_data(meta_data)
-        document = await upload_file(jiva_library, file_path, document_meta_data)
-        print("\nFile Count:", counter)
-        print("Document ID:", document.id)
-        print("Document Title:", document_meta_data.title)
-        await upload_thumbnail(document)
-        await upload_section(document)
-        with open("tools/docs_meta_data.csv", "a", newline="") as csv_output:
-            writer = csv.DictWriter(csv_output, fieldnames=["Document ID", "Document Title", "Document File Name"])
-            writer.writerow({
-                "Document ID": document.id,
-                "Document Title": document_meta_data.title,
-                "Document File Name": document_meta_data.original_file_name,
-            })
-        counter += 1
+    # the catalog snapshot is written once for all the documents
+    async with jiva_library.batch_catalog_updates():
+        for meta_data in raw_meta_data:
+            file_path = os.path.join(base_act_path, meta_data["File Name"])
+            document_meta_data = await set_meta_data(meta_data)
+            document = await upload_file(jiva_library, file_path, document_meta_data)
+            print("\nFile Count:", counter)
+            print("Document ID:", document.id)
+            print("Document Title:", document_meta_data.title)
+            await upload_thumbnail(document)
+            await upload_section(document)
+            with open("tools/docs_meta_data.csv", "a", newline="") as csv_output:
+                writer = csv.DictWriter(csv_output, fieldnames=["Document ID", "Document Title", "Document File Name"])
+                writer.writerow({
+                    "Document ID": document.id,
+                    "Document Title": document_meta_data.title,
+                    "Document File Name": document_meta_data.original_file_name,
+                })
+            counter += 1
 
 
 # Function to translate certain metadata fields to Kannada & Hindi
@@ -202,56 +204,51 @@ async def translate_meta_data(jiva_library: Library, translator: GoogleTranslato
     catalog = await jiva_library.catalog()
     with open("tools/docs_meta_data.csv", "r") as csv_input:
         reader = csv.DictReader(csv_input)
-        counter = 1
-        for row in reader:
-            cat = row["Document ID"]
+        document_ids = [row["Document ID"] for row in reader]
+
+    # title, legal act title and legal ministry of every document are translated
+    # together in batched requests, one set of batches per target language
+    texts = []
+    for cat in document_ids:
+        meta_data = catalog[cat]
+        texts.extend([meta_data.title,
+                      meta_data.extra_data["legal_act_title"],
+                      meta_data.extra_data["legal_ministry"]])
+    kn_translations = await translator.translate_batch(texts, Language.EN, Language.KN)
+    hi_translations = await translator.translate_batch(texts, Language.EN, Language.HI)
+
+    with open("tools/translated_new_meta_data.csv", "a", newline="") as csv_output:
+        writer = csv.DictWriter(csv_output, fieldnames=["Document ID", "Title", "Legal Act Title",
+                                                        "Legal Ministry", "Title in Kannada", "Legal Act Title in Kannada",
+                                                        "Legal Ministry in Kannada", "Title in Hindi", "Legal Act Title in Hindi",
+                                                        "Legal Ministry in Hindi"])
+        for counter, cat in enumerate(document_ids, start=1):
             print("\nFile Count:", counter)
             print("Document ID:", cat)
-            meta_data = catalog[cat]
-            title = meta_data.title
-            legal_act_title = meta_data.extra_data["legal_act_title"]
-            legal_ministry = meta_data.extra_data["legal_ministry"]
-            kn_translated_title = await translator.translate_text(title, Language.EN, Language.KN)
-            hi_translated_title = await translator.translate_text(title, Language.EN, Language.HI)
-            kn_translated_legal_act_title = await translator.translate_text(legal_act_title, Language.EN, Language.KN)
-            hi_translated_legal_act_title = await translator.translate_text(legal_act_title, Language.EN, Language.HI)
-            if legal_ministry != "":
-                kn_translated_legal_ministry = await translator.translate_text(legal_ministry, Language.EN, Language.KN)
-                hi_translated_legal_ministry = await translator.translate_text(legal_ministry, Language.EN, Language.HI)
-            else:
-                kn_translated_legal_ministry = ""
-                hi_translated_legal_ministry = ""
-            with open("tools/translated_new_meta_data.csv", "a", newline="") as csv_output:
-                writer = csv.DictWriter(csv_output, fieldnames=["Document ID", "Title", "Legal Act Title",
-                                                                "Legal Ministry", "Title in Kannada", "Legal Act Title in Kannada",
-                                                                "Legal Ministry in Kannada", "Title in Hindi", "Legal Act Title in Hindi",
-                                                                "Legal Ministry in Hindi"])
-                writer.writerow({
-                    "Document ID": cat,
-                    "Title": title,
-                    "Legal Act Title": legal_act_title,
-                    "Legal Ministry": legal_ministry,
-                    "Title in Kannada": kn_translated_title,
-                    "Legal Act Title in Kannada": kn_translated_legal_act_title,
-                    "Legal Ministry in Kannada": kn_translated_legal_ministry,
-                    "Title in Hindi": hi_translated_title,
-                    "Legal Act Title in Hindi": hi_translated_legal_act_title,
-                    "Legal Ministry in Hindi": hi_translated_legal_ministry
-                })
-            counter += 1
+            offset = (counter - 1) * 3
+            title, legal_act_title, legal_ministry = texts[offset:offset + 3]
+            writer.writerow({
+                "Document ID": cat,
+                "Title": title,
+                "Legal Act Title": legal_act_title,
+                "Legal Ministry": legal_ministry,
+                "Title in Kannada": kn_translations[offset],
+                "Legal Act Title in Kannada": kn_translations[offset + 1],
+                "Legal Ministry in Kannada": kn_translations[offset + 2],
+                "Title in Hindi": hi_translations[offset],
+                "Legal Act Title in Hindi": hi_translations[offset + 1],
+                "Legal Ministry in Hindi": hi_translations[offset + 2]
+            })
 
 
 # Function to update translated metadata fields in DocumentMetaData object for each document and upload it to cloud storage
 async def update_translated_metadata(jiva_library: Library):
     catalog = await jiva_library.catalog()
+    updated_meta_data = []
     with open("tools/translated_new_meta_data.csv", "r") as csv_input:
         reader = csv.DictReader(csv_input)
-        counter = 1
         for row in reader:
             cat = row["Document ID"]
-            print("\nFile Count:", counter)
-            print("Document ID:", cat)
-            document: Document = jiva_library.get_document(cat)
             meta_data = catalog[cat]
             meta_data.translated_data = {
                 "title": {
@@ -267,8 +264,22 @@ async def update_translated_metadata(jiva_library: Library):
                     "Hindi": row["Legal Ministry in Hindi"]
                 }
             }
-            await document.write_metadata(meta_data)
-            counter += 1
+            updated_meta_data.append(meta_data)
+
+    # uploaded with bounded concurrency, failures are reported per document
+    counter = 1
+    async for result in jiva_library.write_metadata_many(updated_meta_data):
+        print("\nFile Count:", counter)
+        print("Metadata File:", result.file_path)
+        if result.error is not None:
+            print("Upload failed:", result.error)
+        counter += 1
+
+
+# Function to recreate the catalog snapshot of the library from the metadata of every document
+async def rebuild_catalog_snapshot(jiva_library: Library):
+    catalog = await jiva_library.rebuild_catalog_snapshot()
+    print("Catalog snapshot documents:", len(catalog))
 
 
 if __name__ == "__main__":
@@ -285,3 +296,5 @@ if __name__ == "__main__":
     # asyncio.run(translate_meta_data(jiva_library=jiva_library, translator=GoogleTranslator()))
     # Run the below command once separately to add translated fields to metadata
     asyncio.run(update_translated_metadata(jiva_library=jiva_library))
+    # Run the below command periodically to reconcile the catalog snapshot with the documents
+    # asyncio.run(rebuild_catalog_snapshot(jiva_library=jiva_library))
@@ -1,3 +1,18 @@
 from .converter import convert_to_wav, convert_to_wav_with_ffmpeg
+from .engine import (
+    convert_bytes_to_wav,
+    convert_file_to_wav,
+    convert_stream_to_wav,
+    encode_wav,
+    pcm_to_wav,
+)
 
-__all__ = ["convert_to_wav", "convert_to_wav_with_ffmpeg"]
+__all__ = [
+    "convert_to_wav",
+    "convert_to_wav_with_ffmpeg",
+    "convert_bytes_to_wav",
+    "convert_file_to_wav",
+    "convert_stream_to_wav",
+    "encode_wav",
+    "pcm_to_wav",
+]
@@ -1,13 +1,22 @@
-import tempfile
 from io import BytesIO
-import subprocess
 from typing import Optional
 from urllib.parse import urlparse
 import os
-import aiofiles
-import aiofiles.os
-import httpx
 from pydub import AudioSegment
+import aiofiles
+from .engine import (
+    HEADER_PEEK_SIZE,
+    convert_file_to_wav,
+    convert_stream_to_wav,
+    needs_seekable_input,
+)
+from .fetcher import (
+    check_audio_file,
+    download_audio_url,
+    get_audio_fetch_settings,
+    stream_audio_file,
+    stream_audio_url,
+)
 
 
 def _is_url(string) -> bool:
@@ -35,10 +44,7 @@ def convert_to_wav(source_url_or_file: str, source_type: Optional[str] = None) -
         source_type = _get_file_extension(source_url_or_file)
 
     if _is_url(source_url_or_file):
-        local_file = tempfile.NamedTemporaryFile(suffix=source_type)
-        response = httpx.get(source_url_or_file)
-        local_file.write(response.content)
-        local_file.seek(0)
+        local_file = download_audio_url(source_url_or_file, suffix="." + source_type)
         local_filename = local_file.name
     else:
         local_filename = source_url_or_file
@@ -56,42 +62,26 @@ def convert_to_wav(source_url_or_file: str, source_type: Optional[str] = None) -
 
 
 async def convert_to_wav_with_ffmpeg(
-    source_url_or_file: str, source_type: Optional[str] = None
+    source_url_or_file: str,
+    source_type: Optional[str] = None,
+    max_bytes: Optional[int] = None,
+    max_duration: Optional[float] = None,
 ) -> bytes:
-    local_file = None
+    # ffmpeg detects the input format itself. It cannot read mp4 and the like
+    # from a pipe, these are recognized by source_type (the file extension by
+    # default) or their header and given to ffmpeg as a file.
     if not source_type:
         source_type = _get_file_extension(source_url_or_file)
-
+    if max_duration is None:
+        max_duration = get_audio_fetch_settings().audio_max_duration
     if _is_url(source_url_or_file):
-        local_file = tempfile.NamedTemporaryFile(suffix="." + source_type)
-        response = httpx.get(source_url_or_file)
-        local_file.write(response.content)
-        local_file.seek(0)
-        local_filename = local_file.name
-    else:
-        local_filename = source_url_or_file
-
-    wav_filename = os.path.basename(os.path.splitext(local_filename)[0] + ".wav")
-    command = (
-        f"ffmpeg -i {local_filename}"
-        f" -acodec pcm_s16le -ar 16000 -ac 1 {wav_filename}"
-    )
-    subprocess.run(command, shell=True)
-
-    async with aiofiles.open(wav_filename, "rb") as wav_file:
-        audio_data = await wav_file.read()
-
-    await aiofiles.os.remove(wav_filename)
-    if local_file:
-        local_file.close()
-
-    return audio_data
-
-
-def convert_wav_bytes_to_mp3_bytes(wav_bytes: bytes) -> bytes:
-    wav_file = BytesIO(wav_bytes)
-    wav_audio = AudioSegment.from_file(wav_file, format="wav")
-    wav_audio = wav_audio.set_frame_rate(44100)
-    mp3_file = BytesIO()
-    wav_audio.export(mp3_file, format="mp3")
-    return mp3_file.getvalue()
+        chunks = stream_audio_url(source_url_or_file, max_bytes)
+        return await convert_stream_to_wav(chunks, max_duration, source_type)
+
+    check_audio_file(source_url_or_file, max_bytes)
+    async with aiofiles.open(source_url_or_file, "rb") as source_file:
+        header = await source_file.read(HEADER_PEEK_SIZE)
+    if needs_seekable_input(header, source_type):
+        return await convert_file_to_wav(source_url_or_file, max_duration)
+    chunks = stream_audio_file(source_url_or_file, max_bytes)
+    return await convert_stream_to_wav(chunks, max_duration, source_type)
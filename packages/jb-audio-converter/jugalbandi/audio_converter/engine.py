@@ -0,0 +1,307 @@
+import asyncio
+from io import BytesIO
+import logging
+import os
+import tempfile
+from typing import AsyncIterator, List, Optional, Tuple
+import wave
+import aiofiles
+from aiofiles import os as aiofiles_os
+from jugalbandi.core.errors import IncorrectInputException, InternalServerException
+from jugalbandi.core.media_format import AudioFormat
+
+logger = logging.getLogger(__name__)
+
+SAMPLE_RATE = 16000
+CHANNELS = 1
+SAMPLE_WIDTH = 2  # pcm_s16le
+HEADER_PEEK_SIZE = 4096
+# ffmpeg has to seek in these containers, their index (the moov atom) is
+# often written after the audio
+SEEKABLE_INPUT_TYPES = {"mp4", "m4a", "3gp", "3gpp", "mov"}
+
+_ffmpeg_semaphore: Optional[asyncio.Semaphore] = None
+
+
+def _get_ffmpeg_semaphore() -> asyncio.Semaphore:
+    # ffmpeg is CPU bound, running more processes than cores only adds latency
+    global _ffmpeg_semaphore
+    if _ffmpeg_semaphore is None:
+        max_processes = int(
+            os.getenv("FFMPEG_MAX_PROCESSES", str(os.cpu_count() or 1))
+        )
+        _ffmpeg_semaphore = asyncio.Semaphore(max_processes)
+    return _ffmpeg_semaphore
+
+
+def pcm_to_wav(
+    pcm_data: bytes,
+    sample_rate: int = SAMPLE_RATE,
+    channels: int = CHANNELS,
+    sample_width: int = SAMPLE_WIDTH,
+) -> bytes:
+    wav_file = BytesIO()
+    with wave.open(wav_file, "wb") as writer:
+        writer.setnchannels(channels)
+        writer.setsampwidth(sample_width)
+        writer.setframerate(sample_rate)
+        writer.writeframes(pcm_data)
+    return wav_file.getvalue()
+
+
+def _wav_format(header: bytes) -> Optional[Tuple[int, int, int]]:
+    """(sample rate, channels, sample width) of a PCM wav header, if it is one"""
+    try:
+        with wave.open(BytesIO(header), "rb") as reader:
+            return (
+                reader.getframerate(),
+                reader.getnchannels(),
+                reader.getsampwidth(),
+            )
+    except (wave.Error, EOFError):
+        # compressed wav (WAVE_FORMAT_EXTENSIBLE etc.), or not a wav at all
+        return None
+
+
+def is_target_wav(header: bytes) -> bool:
+    return _wav_format(header) == (SAMPLE_RATE, CHANNELS, SAMPLE_WIDTH)
+
+
+def needs_seekable_input(header: bytes, source_type: Optional[str] = None) -> bool:
+    # ISO base media files (mp4, m4a, 3gp, ...) start with an "ftyp" box
+    return (source_type or "").lower() in SEEKABLE_INPUT_TYPES or (
+        header[4:8] == b"ftyp"
+    )
+
+
+async def _close(chunks: AsyncIterator[bytes]):
+    # stops a download that ffmpeg no longer reads from
+    aclose = getattr(chunks, "aclose", None)
+    if aclose is not None:
+        await aclose()
+
+
+async def _peek(
+    chunks: AsyncIterator[bytes], size: int
+) -> Tuple[bytes, AsyncIterator[bytes]]:
+    head = b""
+    async for chunk in chunks:
+        head += chunk
+        if len(head) >= size:
+            break
+
+    async def _rest() -> AsyncIterator[bytes]:
+        try:
+            if head:
+                yield head
+            async for chunk in chunks:
+                yield chunk
+        finally:
+            await _close(chunks)
+
+    return head, _rest()
+
+
+async def run_ffmpeg(chunks: AsyncIterator[bytes], *output_args: str) -> bytes:
+    """
+    Streams ``chunks`` into ffmpeg over stdin and returns what it writes to
+    stdout. At most one ffmpeg process per CPU core runs at a time.
+    """
+    return await _run_ffmpeg("pipe:0", chunks, output_args)
+
+
+async def run_ffmpeg_file(file_path: str, *output_args: str) -> bytes:
+    """Like ``run_ffmpeg``, for files ffmpeg has to seek in"""
+    return await _run_ffmpeg(file_path, None, output_args)
+
+
+async def _run_ffmpeg(
+    input_path: str,
+    chunks: Optional[AsyncIterator[bytes]],
+    output_args: Tuple[str, ...],
+) -> bytes:
+    async with _get_ffmpeg_semaphore():
+        try:
+            process = await asyncio.create_subprocess_exec(
+                "ffmpeg",
+                "-hide_banner",
+                "-loglevel",
+                "error",
+                "-i",
+                input_path,
+                *output_args,
+                "pipe:1",
+                stdin=(
+                    asyncio.subprocess.DEVNULL
+                    if chunks is None
+                    else asyncio.subprocess.PIPE
+                ),
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.PIPE,
+            )
+        except FileNotFoundError as exc:
+            raise InternalServerException("ffmpeg is not installed") from exc
+
+        async def _feed():
+            if chunks is None:
+                return
+            assert process.stdin is not None
+            try:
+                async for chunk in chunks:
+                    process.stdin.write(chunk)
+                    await process.stdin.drain()
+            except (BrokenPipeError, ConnectionResetError):
+                # ffmpeg stopped reading, either it has all it needs or
+                # the error is on stderr
+                pass
+            finally:
+                process.stdin.close()
+                await _close(chunks)
+
+        try:
+            _, output, error = await asyncio.gather(
+                _feed(),
+                process.stdout.read(),  # type: ignore
+                process.stderr.read(),  # type: ignore
+            )
+            return_code = await process.wait()
+        except BaseException:
+            if process.returncode is None:
+                process.kill()
+                await process.wait()
+            raise
+
+    if return_code != 0:
+        raise InternalServerException(
+            f"ffmpeg failed with exit code {return_code}: "
+            f"{error.decode(errors='ignore').strip()}"
+        )
+    return output
+
+
+def _max_pcm_bytes(max_duration: float) -> int:
+    return int(max_duration * SAMPLE_RATE) * CHANNELS * SAMPLE_WIDTH
+
+
+def _too_long(max_duration: float) -> IncorrectInputException:
+    return IncorrectInputException(
+        f"Audio is longer than {max_duration:g} seconds"
+    )
+
+
+def _pcm_output_args(max_duration: Optional[float]) -> List[str]:
+    # ffmpeg cannot seek back on a pipe to fill in the wav header sizes,
+    # so read raw PCM and write the header here
+    output_args = [
+        "-f",
+        "s16le",
+        "-acodec",
+        "pcm_s16le",
+        "-ar",
+        str(SAMPLE_RATE),
+        "-ac",
+        str(CHANNELS),
+    ]
+    if max_duration is not None:
+        # decode one second past the limit, enough to tell that it is too long
+        # without converting all of it
+        output_args = ["-t", f"{max_duration + 1:g}"] + output_args
+    return output_args
+
+
+def _pcm_to_wav(pcm_data: bytes, max_duration: Optional[float]) -> bytes:
+    if max_duration is not None and len(pcm_data) > _max_pcm_bytes(max_duration):
+        raise _too_long(max_duration)
+    return pcm_to_wav(pcm_data)
+
+
+async def convert_stream_to_wav(
+    chunks: AsyncIterator[bytes],
+    max_duration: Optional[float] = None,
+    source_type: Optional[str] = None,
+) -> bytes:
+    """
+    Converts any audio ffmpeg understands to 16 kHz mono pcm_s16le wav.
+    Audio longer than ``max_duration`` seconds is rejected.
+
+    ffmpeg starts once the header has arrived and converts while the rest
+    streams in, except for containers it has to seek in (``source_type`` or
+    the header tells), which are spooled to a temp file first.
+    """
+    head, chunks = await _peek(chunks, HEADER_PEEK_SIZE)
+    if is_target_wav(head):
+        wav_data = b"".join([chunk async for chunk in chunks])
+        if max_duration is not None:
+            with wave.open(BytesIO(wav_data), "rb") as reader:
+                if reader.getnframes() > max_duration * SAMPLE_RATE:
+                    raise _too_long(max_duration)
+        return wav_data
+
+    if needs_seekable_input(head, source_type):
+        return await _convert_spooled_to_wav(chunks, max_duration)
+    pcm_data = await run_ffmpeg(chunks, *_pcm_output_args(max_duration))
+    return _pcm_to_wav(pcm_data, max_duration)
+
+
+async def _convert_spooled_to_wav(
+    chunks: AsyncIterator[bytes], max_duration: Optional[float]
+) -> bytes:
+    fd, file_path = tempfile.mkstemp(suffix=".audio")
+    os.close(fd)
+    try:
+        async with aiofiles.open(file_path, "wb") as f:
+            async for chunk in chunks:
+                await f.write(chunk)
+        return await convert_file_to_wav(file_path, max_duration)
+    finally:
+        await _close(chunks)
+        await aiofiles_os.remove(file_path)
+
+
+async def convert_file_to_wav(
+    file_path: str, max_duration: Optional[float] = None
+) -> bytes:
+    """``convert_stream_to_wav`` for files ffmpeg has to seek in, e.g. mp4"""
+    pcm_data = await run_ffmpeg_file(file_path, *_pcm_output_args(max_duration))
+    return _pcm_to_wav(pcm_data, max_duration)
+
+
+async def convert_bytes_to_wav(
+    audio_data: bytes,
+    max_duration: Optional[float] = None,
+    source_type: Optional[str] = None,
+) -> bytes:
+    async def _chunks() -> AsyncIterator[bytes]:
+        yield audio_data
+
+    return await convert_stream_to_wav(_chunks(), max_duration, source_type)
+
+
+# speech bitrates, the sample rate of the input is kept
+_ENCODER_ARGS = {
+    AudioFormat.MP3: ["-f", "mp3", "-codec:a", "libmp3lame", "-b:a", "32k"],
+    AudioFormat.OGG_OPUS: [
+        "-f",
+        "ogg",
+        "-codec:a",
+        "libopus",
+        "-b:a",
+        "24k",
+        "-application",
+        "voip",
+    ],
+}
+
+
+async def encode_wav(wav_data: bytes, output_format: AudioFormat) -> bytes:
+    """
+    Encodes wav audio to ``output_format``. Encoding runs in an ffmpeg
+    process, off the event loop and within the ffmpeg concurrency limit.
+    """
+    if output_format == AudioFormat.WAV:
+        return wav_data
+
+    async def _chunks() -> AsyncIterator[bytes]:
+        yield wav_data
+
+    return await run_ffmpeg(_chunks(), *_ENCODER_ARGS[output_format])
@@ -0,0 +1,126 @@
+import os
+import tempfile
+from typing import IO, AsyncIterator, Optional
+import aiofiles
+import httpx
+from cachetools import cached
+from pydantic import BaseSettings, Field
+from jugalbandi.core import get_http_client
+from jugalbandi.core.errors import IncorrectInputException
+
+CHUNK_SIZE = 64 * 1024
+
+# some storage buckets and CDNs serve audio with a generic content type
+_ALLOWED_CONTENT_TYPES = [
+    "application/octet-stream",
+    "binary/octet-stream",
+    "application/ogg",
+]
+
+
+class AudioFetchSettings(BaseSettings):
+    audio_max_bytes: int = Field(25 * 1024 * 1024, env="AUDIO_MAX_BYTES")
+    audio_max_duration: float = Field(300.0, env="AUDIO_MAX_DURATION")
+
+
+@cached(cache={})
+def get_audio_fetch_settings() -> AudioFetchSettings:
+    return AudioFetchSettings()
+
+
+def _check_content_type(content_type: Optional[str]):
+    if not content_type:
+        return
+    media_type = content_type.split(";")[0].strip().lower()
+    if (
+        media_type.startswith("audio/")
+        or media_type.startswith("video/")
+        or media_type in _ALLOWED_CONTENT_TYPES
+    ):
+        return
+    raise IncorrectInputException(f"Unsupported audio content type: {media_type}")
+
+
+def _check_content_length(content_length: Optional[str], max_bytes: int):
+    if content_length is not None and int(content_length) > max_bytes:
+        raise IncorrectInputException(
+            f"Audio file is larger than {max_bytes} bytes"
+        )
+
+
+def _check_response(response: httpx.Response, url: str, max_bytes: int):
+    if response.status_code != 200:
+        raise IncorrectInputException(
+            f"Could not download audio from {url}, "
+            f"status_code: {response.status_code}"
+        )
+    _check_content_type(response.headers.get("content-type"))
+    _check_content_length(response.headers.get("content-length"), max_bytes)
+
+
+class _ByteCounter:
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.total = 0
+
+    def add(self, chunk: bytes):
+        self.total += len(chunk)
+        if self.total > self.max_bytes:
+            # servers may send no or a wrong content length
+            raise IncorrectInputException(
+                f"Audio file is larger than {self.max_bytes} bytes"
+            )
+
+
+async def stream_audio_url(
+    url: str, max_bytes: Optional[int] = None
+) -> AsyncIterator[bytes]:
+    """
+    Yields the body of ``url`` as it arrives. The download is aborted as
+    soon as the response turns out not to be audio or to exceed ``max_bytes``.
+    """
+    if max_bytes is None:
+        max_bytes = get_audio_fetch_settings().audio_max_bytes
+    counter = _ByteCounter(max_bytes)
+    async with get_http_client().stream("GET", url) as response:
+        _check_response(response, url, max_bytes)
+        async for chunk in response.aiter_bytes(CHUNK_SIZE):
+            counter.add(chunk)
+            yield chunk
+
+
+def check_audio_file(file_path: str, max_bytes: Optional[int] = None):
+    if max_bytes is None:
+        max_bytes = get_audio_fetch_settings().audio_max_bytes
+    _check_content_length(str(os.path.getsize(file_path)), max_bytes)
+
+
+async def stream_audio_file(
+    file_path: str, max_bytes: Optional[int] = None
+) -> AsyncIterator[bytes]:
+    check_audio_file(file_path, max_bytes)
+    async with aiofiles.open(file_path, "rb") as source_file:
+        while chunk := await source_file.read(CHUNK_SIZE):
+            yield chunk
+
+
+def download_audio_url(
+    url: str, max_bytes: Optional[int] = None, suffix: Optional[str] = None
+) -> IO[bytes]:
+    """Blocking variant of ``stream_audio_url`` that spools into a temp file"""
+    if max_bytes is None:
+        max_bytes = get_audio_fetch_settings().audio_max_bytes
+    counter = _ByteCounter(max_bytes)
+    local_file = tempfile.NamedTemporaryFile(suffix=suffix)
+    try:
+        with httpx.stream("GET", url) as response:
+            _check_response(response, url, max_bytes)
+            for chunk in response.iter_bytes(CHUNK_SIZE):
+                counter.add(chunk)
+                local_file.write(chunk)
+    except BaseException:
+        local_file.close()
+        raise
+    local_file.flush()
+    local_file.seek(0)
+    return local_file
@@ -1,9 +1,17 @@
 import pytest
 import os
+import subprocess
 from jugalbandi.audio_converter.converter import (
     convert_to_wav,
     convert_to_wav_with_ffmpeg,
 )
+from jugalbandi.audio_converter.engine import (
+    convert_bytes_to_wav,
+    encode_wav,
+    needs_seekable_input,
+    pcm_to_wav,
+)
+from jugalbandi.core.media_format import AudioFormat
 
 test_dir = os.path.dirname(__file__)
 TEST_FILE_PATH = "https://storage.googleapis.com/jugalbandi"
@@ -39,3 +47,47 @@ async def test_audio_conversion_of_file_url_with_ffmpeg():
     file_url = f"{TEST_FILE_PATH}/generic_qa/music_files/english_voice.mp3"
     wav_data = await convert_to_wav_with_ffmpeg(file_url)
     assert wav_data is not None and type(wav_data) == bytes
+
+
+@pytest.mark.asyncio
+async def test_wav_in_target_format_skips_ffmpeg():
+    wav_data = pcm_to_wav(b"\x00\x01" * 16000)
+    assert await convert_bytes_to_wav(wav_data) == wav_data
+
+
+@pytest.mark.asyncio
+async def test_encode_wav():
+    wav_data = pcm_to_wav(b"\x00\x01" * 16000)
+    assert await encode_wav(wav_data, AudioFormat.WAV) == wav_data
+
+    mp3_data = await encode_wav(wav_data, AudioFormat.MP3)
+    # an ID3 tag or an MPEG frame sync
+    assert mp3_data[:3] == b"ID3" or mp3_data[:2] in (b"\xff\xfb", b"\xff\xf3")
+    assert len(mp3_data) < len(wav_data)
+
+    opus_data = await encode_wav(wav_data, AudioFormat.OGG_OPUS)
+    assert opus_data[:4] == b"OggS"
+
+
+def test_needs_seekable_input():
+    assert needs_seekable_input(b"", "M4A")
+    assert needs_seekable_input(b"\x00\x00\x00\x20ftypisom", None)
+    assert not needs_seekable_input(b"OggS\x00\x02", "ogg")
+    assert not needs_seekable_input(b"", None)
+
+
+@pytest.mark.asyncio
+async def test_audio_conversion_of_m4a_file(tmp_path):
+    wav_path = tmp_path / "audio.wav"
+    wav_path.write_bytes(pcm_to_wav(b"\x00\x01" * 16000))
+    # written to a file, ffmpeg puts the moov atom after the audio
+    m4a_path = tmp_path / "audio.m4a"
+    subprocess.run(
+        ["ffmpeg", "-loglevel", "error", "-i", str(wav_path), str(m4a_path)],
+        check=True,
+    )
+    wav_data = await convert_to_wav_with_ffmpeg(str(m4a_path))
+    assert wav_data[:4] == b"RIFF"
+
+    wav_data = await convert_bytes_to_wav(m4a_path.read_bytes())
+    assert wav_data[:4] == b"RIFF"
@@ -1,4 +1,4 @@
-from .media_format import MediaFormat
+from .media_format import AudioFormat, MediaFormat
 from .caching import aiocached, aiocachedmethod
 from .language import Language
 from .errors import (
@@ -10,9 +10,22 @@ from .errors import (
 )
 from .speech_processor import SpeechProcessor
 from .singleton import SingletonMeta
+from .http_client import (
+    HttpClientRegistry,
+    get_http_client,
+    http_client_lifespan,
+)
+from .bhashini import BhashiniClient, BhashiniPipelineConfig
+from .routing import (
+    AdaptiveRouter,
+    BackendStats,
+    CircuitBreaker,
+    is_backend_failure,
+)
 
 
 __all__ = [
+    "AudioFormat",
     "MediaFormat",
     "Language",
     "aiocached",
@@ -24,4 +37,13 @@ __all__ = [
     "ServiceUnavailableException",
     "SpeechProcessor",
     "SingletonMeta",
+    "HttpClientRegistry",
+    "get_http_client",
+    "http_client_lifespan",
+    "BhashiniClient",
+    "BhashiniPipelineConfig",
+    "AdaptiveRouter",
+    "BackendStats",
+    "CircuitBreaker",
+    "is_backend_failure",
 ]
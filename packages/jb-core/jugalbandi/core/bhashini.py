@@ -0,0 +1,195 @@
+import asyncio
+import json
+import logging
+import os
+import time
+from typing import Dict, Optional, Set, Tuple
+
+import httpx
+from pydantic import BaseModel
+
+from .errors import InternalServerException
+from .http_client import get_http_client
+from .singleton import SingletonMeta
+
+logger = logging.getLogger(__name__)
+
+BHASHINI_CONFIG_URL = (
+    "https://meity-auth.ulcacontrib.org/ulca/apis/v0/model/getModelsPipeline"
+)
+BHASHINI_INFERENCE_URL = (
+    "https://dhruva-api.bhashini.gov.in/services/inference/pipeline"
+)
+BHASHINI_SPEECH_PIPELINE_ID = "64392f96daac500b55c543cd"
+
+PipelineKey = Tuple[str, str, Optional[str]]
+
+
+class BhashiniPipelineConfig(BaseModel):
+    task: str
+    source_language: str
+    target_language: Optional[str] = None
+    service_id: str
+    inference_url: str
+    inference_api_key_name: str
+    inference_api_key_value: str
+    fetched_at: float = 0.0
+
+    @classmethod
+    def from_response(
+        cls, task: str, response: Dict, fetched_at: float
+    ) -> "BhashiniPipelineConfig":
+        language = response["languages"][0]
+        endpoint = response["pipelineInferenceAPIEndPoint"]
+        target_languages = language.get("targetLanguageList") or [None]
+        return cls(
+            task=task,
+            source_language=language["sourceLanguage"],
+            target_language=target_languages[0],
+            service_id=response["pipelineResponseConfig"][0]["config"][0][
+                "serviceId"
+            ],
+            inference_url=endpoint.get("callbackUrl") or BHASHINI_INFERENCE_URL,
+            inference_api_key_name=endpoint["inferenceApiKey"]["name"],
+            inference_api_key_value=endpoint["inferenceApiKey"]["value"],
+            fetched_at=fetched_at,
+        )
+
+    def headers(self) -> Dict[str, str]:
+        return {
+            "Accept": "*/*",
+            self.inference_api_key_name: self.inference_api_key_value,
+            "Content-Type": "application/json",
+        }
+
+
+class BhashiniClient(metaclass=SingletonMeta):
+    """
+    Process wide Bhashini (Dhruva) client shared by the translator and the
+    speech processor.
+
+    Pipeline configs returned by ``getModelsPipeline`` are cached per
+    (task, source, target). Once a config is older than ``refresh_after``
+    seconds it is still served, but a refresh is started in the background;
+    only configs older than ``config_ttl`` are fetched inline.
+    """
+
+    def __init__(self, config_ttl: float = 6 * 3600, refresh_after: float = 3600):
+        self.user_id = os.getenv("BHASHINI_USER_ID")
+        self.api_key = os.getenv("BHASHINI_API_KEY")
+        self.translation_pipeline_id = os.getenv("BHASHINI_PIPELINE_ID")
+        self.config_ttl = config_ttl
+        self.refresh_after = refresh_after
+        self._configs: Dict[PipelineKey, BhashiniPipelineConfig] = {}
+        self._pending: Dict[PipelineKey, asyncio.Task] = {}
+        self._background_tasks: Set[asyncio.Task] = set()
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        return get_http_client("bhashini", http2=True)
+
+    def _config_payload(
+        self, task: str, source_language: str, target_language: Optional[str]
+    ) -> Dict:
+        language = {"sourceLanguage": source_language}
+        if task in ["asr", "tts"]:
+            pipeline_id = BHASHINI_SPEECH_PIPELINE_ID
+        else:
+            language["targetLanguage"] = target_language  # type: ignore
+            pipeline_id = self.translation_pipeline_id  # type: ignore
+        return {
+            "pipelineTasks": [{"taskType": task, "config": {"language": language}}],
+            "pipelineRequestConfig": {"pipelineId": pipeline_id},
+        }
+
+    async def _fetch_config(self, key: PipelineKey) -> BhashiniPipelineConfig:
+        task, source_language, target_language = key
+        headers = {
+            "userID": self.user_id,
+            "ulcaApiKey": self.api_key,
+            "Content-Type": "application/json",
+        }
+        response = await self.client.post(
+            BHASHINI_CONFIG_URL,
+            headers=headers,  # type: ignore
+            content=json.dumps(
+                self._config_payload(task, source_language, target_language)
+            ),
+        )
+        if response.status_code != 200:
+            raise InternalServerException(
+                f"Bhashini config request failed with response.text: "
+                f"{response.text} and status_code: {response.status_code}"
+            )
+        config = BhashiniPipelineConfig.from_response(
+            task, response.json(), time.monotonic()
+        )
+        self._configs[key] = config
+        return config
+
+    def _load_config(self, key: PipelineKey) -> asyncio.Task:
+        # concurrent callers for the same key share one in-flight request
+        task = self._pending.get(key)
+        if task is None:
+            task = asyncio.create_task(self._fetch_config(key))
+            self._pending[key] = task
+            task.add_done_callback(lambda _: self._pending.pop(key, None))
+        return task
+
+    def _refresh_in_background(self, key: PipelineKey):
+        if key in self._pending:
+            return
+
+        def _done(task: asyncio.Task):
+            self._background_tasks.discard(task)
+            if not task.cancelled() and task.exception() is not None:
+                logger.warning(
+                    "background refresh of bhashini config %s failed: %s",
+                    key,
+                    task.exception(),
+                )
+
+        task = self._load_config(key)
+        self._background_tasks.add(task)
+        task.add_done_callback(_done)
+
+    async def pipeline_config(
+        self,
+        task: str,
+        source_language: str,
+        target_language: Optional[str] = None,
+    ) -> BhashiniPipelineConfig:
+        key = (task, source_language, target_language)
+        config = self._configs.get(key)
+        if config is not None:
+            age = time.monotonic() - config.fetched_at
+            if age < self.refresh_after:
+                return config
+            if age < self.config_ttl:
+                self._refresh_in_background(key)
+                return config
+
+        return await asyncio.shield(self._load_config(key))
+
+    async def infer(self, config: BhashiniPipelineConfig, payload: Dict) -> Dict:
+        response = await self.client.post(
+            config.inference_url,
+            headers=config.headers(),
+            content=json.dumps(payload),
+        )
+        if response.status_code != 200:
+            if response.status_code in [401, 403]:
+                # the inference key may have been rotated, fetch a new config
+                # on the next call
+                for key, cached_config in list(self._configs.items()):
+                    if cached_config is config:
+                        self._configs.pop(key, None)
+            raise InternalServerException(
+                f"Request failed with response.text: {response.text} and "
+                f"status_code: {response.status_code}"
+            )
+        return response.json()
+
+    async def shutdown(self):
+        for task in list(self._background_tasks):
+            task.cancel()
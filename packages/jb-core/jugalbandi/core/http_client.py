@@ -0,0 +1,97 @@
+from contextlib import asynccontextmanager
+import logging
+from typing import Any, Dict
+
+import httpx
+from cachetools import cached
+from pydantic import BaseSettings, Field
+
+from .singleton import SingletonMeta
+
+logger = logging.getLogger(__name__)
+
+
+class HttpClientSettings(BaseSettings):
+    http_max_connections: int = Field(100, env="HTTP_MAX_CONNECTIONS")
+    http_max_keepalive_connections: int = Field(
+        20, env="HTTP_MAX_KEEPALIVE_CONNECTIONS"
+    )
+    http_keepalive_expiry: float = Field(60.0, env="HTTP_KEEPALIVE_EXPIRY")
+    http_connect_timeout: float = Field(10.0, env="HTTP_CONNECT_TIMEOUT")
+    http_timeout: float = Field(30.0, env="HTTP_TIMEOUT")
+
+
+@cached(cache={})
+def get_http_client_settings() -> HttpClientSettings:
+    return HttpClientSettings()
+
+
+class HttpClientRegistry(metaclass=SingletonMeta):
+    """
+    Registry of named, long lived ``httpx.AsyncClient`` instances.
+
+    Every client keeps a keep-alive connection pool per host, so outbound
+    calls to the same service reuse TLS sessions and resolved addresses
+    instead of paying for them on every request. Services should call
+    ``startup`` / ``shutdown`` from their application lifespan, see
+    ``http_client_lifespan``.
+    """
+
+    def __init__(self):
+        self._clients: Dict[str, httpx.AsyncClient] = {}
+
+    def _new_client(self, **options: Any) -> httpx.AsyncClient:
+        settings = get_http_client_settings()
+        options.setdefault(
+            "limits",
+            httpx.Limits(
+                max_connections=settings.http_max_connections,
+                max_keepalive_connections=settings.http_max_keepalive_connections,
+                keepalive_expiry=settings.http_keepalive_expiry,
+            ),
+        )
+        options.setdefault(
+            "timeout",
+            httpx.Timeout(
+                settings.http_timeout, connect=settings.http_connect_timeout
+            ),
+        )
+        return httpx.AsyncClient(**options)
+
+    def get(self, name: str = "default", **options: Any) -> httpx.AsyncClient:
+        """
+        Return the client registered under ``name``, creating it on first use.
+        ``options`` are passed to ``httpx.AsyncClient`` and only take effect
+        when the client is created.
+        """
+        client = self._clients.get(name)
+        if client is None or client.is_closed:
+            client = self._new_client(**options)
+            self._clients[name] = client
+        return client
+
+    async def startup(self):
+        self.get()
+
+    async def shutdown(self):
+        clients = list(self._clients.items())
+        self._clients.clear()
+        for name, client in clients:
+            try:
+                await client.aclose()
+            except Exception:
+                logger.exception(f"error closing http client {name}")
+
+
+def get_http_client(name: str = "default", **options: Any) -> httpx.AsyncClient:
+    return HttpClientRegistry().get(name, **options)
+
+
+@asynccontextmanager
+async def http_client_lifespan(app):
+    registry = HttpClientRegistry()
+    await registry.startup()
+    try:
+        yield
+    finally:
+        await registry.shutdown()
@@ -4,3 +4,11 @@ from enum import Enum
 class MediaFormat(str, Enum):
     TEXT = "Text"
     VOICE = "Voice"
+
+
+class AudioFormat(str, Enum):
+    """Encodings for synthesized speech, the value doubles as file extension"""
+
+    MP3 = "mp3"
+    OGG_OPUS = "ogg"
+    WAV = "wav"
@@ -0,0 +1,309 @@
+import asyncio
+from collections import deque
+from enum import Enum
+import logging
+import math
+import time
+from typing import Any, Awaitable, Callable, Dict, Iterator, List, Optional, Sequence
+import httpx
+
+from .errors import IncorrectInputException, ServiceUnavailableException
+
+logger = logging.getLogger(__name__)
+
+
+def _status_code(exc: BaseException) -> Optional[int]:
+    if isinstance(exc, httpx.HTTPStatusError):
+        return exc.response.status_code
+    # jugalbandi errors have a status_code, the google api errors a code
+    for name in ["status_code", "code"]:
+        status_code = getattr(exc, name, None)
+        if isinstance(status_code, int):
+            return status_code
+    return None
+
+
+def is_backend_failure(exc: BaseException) -> bool:
+    """
+    Whether ``exc`` says that the backend is down or unreachable (transport
+    errors, timeouts, 5xx) rather than that the request was bad
+    """
+    if isinstance(exc, (httpx.TransportError, ConnectionError, TimeoutError)):
+        return True
+    status_code = _status_code(exc)
+    return status_code is not None and status_code >= 500
+
+
+class BackendStats:
+    """Exponentially weighted latency / error rate of a single backend."""
+
+    def __init__(self, alpha: float = 0.2, window: int = 100):
+        self.alpha = alpha
+        self.ewma_latency: Optional[float] = None
+        self.error_rate = 0.0
+        self.samples = 0
+        self._latencies: deque = deque(maxlen=window)
+
+    def _update_error_rate(self, error: float):
+        self.error_rate = self.alpha * error + (1 - self.alpha) * self.error_rate
+
+    def record_success(self, latency: float):
+        self.samples += 1
+        self._latencies.append(latency)
+        if self.ewma_latency is None:
+            self.ewma_latency = latency
+        else:
+            self.ewma_latency = (
+                self.alpha * latency + (1 - self.alpha) * self.ewma_latency
+            )
+        self._update_error_rate(0.0)
+
+    def record_failure(self):
+        self.samples += 1
+        self._update_error_rate(1.0)
+
+    def latency_percentile(self, percentile: float) -> Optional[float]:
+        if not self._latencies:
+            return None
+        latencies = sorted(self._latencies)
+        index = min(len(latencies) - 1, math.ceil(percentile * len(latencies)) - 1)
+        return latencies[max(index, 0)]
+
+    def score(self) -> Optional[float]:
+        # latency penalised by the error rate, lower is better
+        if self.ewma_latency is None:
+            return None
+        return self.ewma_latency * (1 + 4 * self.error_rate)
+
+
+class CircuitState(str, Enum):
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+
+class CircuitBreaker:
+    """
+    Opens after ``failure_threshold`` consecutive failures. After
+    ``reset_timeout`` seconds a single trial call is let through (half open);
+    its outcome closes the breaker again or re-opens it.
+
+    ``allow`` tells whether a call may be made; the call itself is claimed
+    with ``on_call`` right before it starts, which fails once another call
+    has taken the trial. A trial that ends without telling whether the
+    backend works is given back with ``release_trial``.
+    """
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = CircuitState.CLOSED
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        self._trial_running = False
+
+    def allow(self) -> bool:
+        if self.state == CircuitState.CLOSED:
+            return True
+        if self.state == CircuitState.OPEN:
+            if time.monotonic() - self.opened_at < self.reset_timeout:
+                return False
+            self.state = CircuitState.HALF_OPEN
+            self._trial_running = False
+        return not self._trial_running
+
+    def on_call(self) -> bool:
+        if self.state == CircuitState.OPEN:
+            return False
+        if self.state == CircuitState.HALF_OPEN:
+            if self._trial_running:
+                return False
+            self._trial_running = True
+        return True
+
+    def release_trial(self):
+        self._trial_running = False
+
+    def record_success(self):
+        self.state = CircuitState.CLOSED
+        self.consecutive_failures = 0
+        self._trial_running = False
+
+    def record_failure(self):
+        self.consecutive_failures += 1
+        self._trial_running = False
+        if (
+            self.state == CircuitState.HALF_OPEN
+            or self.consecutive_failures >= self.failure_threshold
+        ):
+            if self.state != CircuitState.OPEN:
+                logger.warning("circuit opened after %s failures",
+                               self.consecutive_failures)
+            self.state = CircuitState.OPEN
+            self.opened_at = time.monotonic()
+
+
+class AdaptiveRouter:
+    """
+    Routes a call over an ordered list of interchangeable backends.
+
+    Backends are tried in their configured order, except that backends whose
+    error-penalised EWMA latency is more than ``slow_factor`` times the best
+    one are demoted. Backends with an open circuit breaker are skipped; once
+    it is half open, a single call at a time tries the backend again.
+    A failure immediately moves on to the next backend. Only failures of the
+    backend itself (``is_failure``) count against its stats and breaker;
+    IncorrectInputException is raised right away, the request is at fault.
+    With ``hedge`` set, the
+    next backend is also started when the current one has not answered within
+    its p95 latency, and the first success wins. Hedging costs extra calls and
+    is off by default.
+    """
+
+    def __init__(
+        self,
+        hedge: bool = False,
+        hedge_delay: float = 2.0,
+        min_hedge_delay: float = 0.05,
+        min_samples: int = 10,
+        slow_factor: float = 3.0,
+        failure_threshold: int = 5,
+        reset_timeout: float = 30.0,
+        is_failure: Callable[[BaseException], bool] = is_backend_failure,
+    ):
+        self.hedge = hedge
+        self.hedge_delay = hedge_delay
+        self.min_hedge_delay = min_hedge_delay
+        self.min_samples = min_samples
+        self.slow_factor = slow_factor
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.is_failure = is_failure
+        self.stats: Dict[int, BackendStats] = {}
+        self.breakers: Dict[int, CircuitBreaker] = {}
+
+    def stats_for(self, backend: Any) -> BackendStats:
+        return self.stats.setdefault(id(backend), BackendStats())
+
+    def breaker_for(self, backend: Any) -> CircuitBreaker:
+        return self.breakers.setdefault(
+            id(backend),
+            CircuitBreaker(self.failure_threshold, self.reset_timeout),
+        )
+
+    def order(self, backends: Sequence[Any]) -> List[Any]:
+        """The backends that may be called, in the order to try them"""
+        available = [
+            backend for backend in backends if self.breaker_for(backend).allow()
+        ]
+        scores = {}
+        for backend in available:
+            stats = self.stats_for(backend)
+            if stats.samples >= self.min_samples:
+                scores[id(backend)] = stats.score()
+        known_scores = [score for score in scores.values() if score is not None]
+        best = min(known_scores) if known_scores else None
+
+        def slow(backend) -> bool:
+            score = scores.get(id(backend))
+            return (
+                best is not None
+                and score is not None
+                and score > self.slow_factor * best
+            )
+
+        return sorted(available, key=slow)
+
+    def _hedge_delay(self, backend: Any) -> float:
+        stats = self.stats_for(backend)
+        p95 = stats.latency_percentile(0.95)
+        if stats.samples < self.min_samples or p95 is None:
+            return self.hedge_delay
+        return max(p95, self.min_hedge_delay)
+
+    async def _timed_call(
+        self, backend: Any, operation: Callable[[Any], Awaitable[Any]], trial: bool
+    ) -> Any:
+        stats = self.stats_for(backend)
+        breaker = self.breaker_for(backend)
+        start = time.monotonic()
+        try:
+            result = await operation(backend)
+        except asyncio.CancelledError:
+            if trial:
+                breaker.release_trial()
+            raise
+        except Exception as exc:
+            if self.is_failure(exc):
+                stats.record_failure()
+                breaker.record_failure()
+            elif trial:
+                breaker.release_trial()
+            raise
+        stats.record_success(time.monotonic() - start)
+        breaker.record_success()
+        return result
+
+    async def call(
+        self,
+        backends: Sequence[Any],
+        operation: Callable[[Any], Awaitable[Any]],
+        error_message: str,
+    ) -> Any:
+        remaining: Iterator[Any] = iter(self.order(backends))
+        pending: Dict[asyncio.Task, Any] = {}
+        excs: List[Exception] = []
+        last_started: Optional[Any] = None
+
+        def start_next() -> bool:
+            nonlocal last_started
+            # a breaker may have opened, or given its trial to another call,
+            # since the backends were ordered
+            backend = next(remaining, None)
+            while backend is not None and not self.breaker_for(backend).on_call():
+                backend = next(remaining, None)
+            if backend is None:
+                return False
+            trial = self.breaker_for(backend).state == CircuitState.HALF_OPEN
+            task = asyncio.create_task(self._timed_call(backend, operation, trial))
+            pending[task] = backend
+            last_started = backend
+            return True
+
+        start_next()
+        exhausted = False
+        try:
+            while pending:
+                timeout = None
+                if self.hedge and not exhausted:
+                    timeout = self._hedge_delay(last_started)
+                done, _ = await asyncio.wait(
+                    pending.keys(),
+                    timeout=timeout,
+                    return_when=asyncio.FIRST_COMPLETED,
+                )
+                if not done:
+                    # hedge: the current backend is slower than usual
+                    exhausted = not start_next()
+                    continue
+
+                for task in done:
+                    pending.pop(task)
+                    exc = task.exception()
+                    if exc is None:
+                        return task.result()
+                    if isinstance(exc, IncorrectInputException):
+                        # every backend would reject it
+                        raise exc
+                    excs.append(exc)  # type: ignore
+                    # fall back right away instead of waiting for a hedge
+                    exhausted = not start_next()
+        finally:
+            for task in pending:
+                task.cancel()
+            if pending:
+                await asyncio.gather(*pending.keys(), return_exceptions=True)
+
+        if not excs:
+            excs.append(ServiceUnavailableException("No backend available"))
+        raise ExceptionGroup(error_message, excs)
@@ -5,9 +5,17 @@ from .repository import (
     AsyncReader,
     WrapSyncReader,
     DocumentFormat,
+    CollectionManifest,
 )
+from .janitor import LocalStoreJanitor
 
-from jugalbandi.storage import Storage, NullStorage, LocalStorage, GoogleStorage
+from jugalbandi.storage import (
+    Storage,
+    NullStorage,
+    LocalStorage,
+    GoogleStorage,
+    CachingStorage,
+)
 
 __all__ = [
     "DocumentRepository",
@@ -17,7 +25,10 @@ __all__ = [
     "WrapSyncReader",
     "Storage",
     "GoogleStorage",
+    "CachingStorage",
     "LocalStorage",
     "NullStorage",
     "DocumentFormat",
+    "CollectionManifest",
+    "LocalStoreJanitor",
 ]
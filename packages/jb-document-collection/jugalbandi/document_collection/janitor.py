@@ -0,0 +1,215 @@
+import asyncio
+from contextlib import asynccontextmanager, suppress
+import logging
+import os
+import shutil
+import time
+from typing import AsyncIterator, Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# below the local store, versioned copies of the collection indexes
+LOCAL_INDEX_FOLDER = "__indexes__"
+# below the local store, a file per collection touched while it is in use
+IN_USE_FOLDER = "__in_use__"
+
+
+def _folder_usage(folder: str) -> Tuple[int, float]:
+    """Size in bytes and latest modification time of the files below folder"""
+    size = 0
+    modified = 0.0
+    for dirpath, _, filenames in os.walk(folder):
+        for filename in filenames:
+            try:
+                stat = os.stat(os.path.join(dirpath, filename))
+            except FileNotFoundError:
+                continue
+            size += stat.st_size
+            modified = max(modified, stat.st_mtime)
+    return size, modified
+
+
+def _touch(path: str):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "a"):
+        pass
+    os.utime(path)
+
+
+def _modified(path: str) -> Optional[float]:
+    try:
+        return os.stat(path).st_mtime
+    except FileNotFoundError:
+        return None
+
+
+class LocalStoreJanitor:
+    """
+    Keeps the local copies of collections (uploaded files and downloaded
+    indexes) within ``max_bytes``.
+
+    Collections are used through ``use``, which touches a marker file of
+    the collection when the use starts and ends, and every half
+    ``grace_period`` in between. Workers sharing the local store see each
+    other's markers: a collection whose marker was touched within
+    ``grace_period`` seconds is not evicted. After a use, at most every
+    ``sweep_interval`` seconds, the disk usage is measured and whole
+    collections are removed, least recently used first, until the store is
+    within budget. Evicted collections are downloaded again from the remote
+    store when they are next needed.
+    """
+
+    def __init__(
+        self,
+        base_dir: str,
+        max_bytes: int,
+        sweep_interval: float = 60.0,
+        grace_period: float = 300.0,
+        on_evict: Optional[Callable[[str, int], None]] = None,
+    ):
+        self.base_dir = base_dir
+        self.max_bytes = max_bytes
+        self.sweep_interval = sweep_interval
+        self.grace_period = grace_period
+        self.on_evict = on_evict
+        self.used_bytes = 0
+        self.evictions = 0
+        self.evicted_bytes = 0
+        self._in_use: Dict[str, int] = {}
+        self._marking: Dict[str, asyncio.Task] = {}
+        self._evicting: Dict[str, asyncio.Future] = {}
+        self._last_sweep = 0.0
+        self._sweep_task: Optional[asyncio.Task] = None
+        self._sweep_lock = asyncio.Lock()
+
+    def _collection_folders(self, collection_id: str) -> List[str]:
+        return [
+            os.path.join(self.base_dir, collection_id),
+            os.path.join(self.base_dir, LOCAL_INDEX_FOLDER, collection_id),
+        ]
+
+    def _marker(self, collection_id: str) -> str:
+        return os.path.join(self.base_dir, IN_USE_FOLDER, collection_id)
+
+    def _disk_usage(self) -> Dict[str, Tuple[int, float]]:
+        usage: Dict[str, Tuple[int, float]] = {}
+        for parent in [self.base_dir, os.path.join(self.base_dir, LOCAL_INDEX_FOLDER)]:
+            try:
+                entries = list(os.scandir(parent))
+            except FileNotFoundError:
+                continue
+            for entry in entries:
+                if not entry.is_dir() or entry.name in (
+                    LOCAL_INDEX_FOLDER,
+                    IN_USE_FOLDER,
+                ):
+                    continue
+                size, modified = _folder_usage(entry.path)
+                previous_size, previous_modified = usage.get(entry.name, (0, 0.0))
+                usage[entry.name] = (
+                    previous_size + size,
+                    max(previous_modified, modified),
+                )
+        return usage
+
+    @asynccontextmanager
+    async def use(self, collection_id: str) -> AsyncIterator[None]:
+        evicting = self._evicting.get(collection_id)
+        if evicting is not None:
+            # let the removal finish before the collection is filled again
+            await asyncio.shield(evicting)
+        await self._mark(collection_id)
+        self._in_use[collection_id] = self._in_use.get(collection_id, 0) + 1
+        if collection_id not in self._marking and self.grace_period > 0:
+            self._marking[collection_id] = asyncio.create_task(
+                self._keep_marked(collection_id)
+            )
+        try:
+            yield
+        finally:
+            self._in_use[collection_id] -= 1
+            if self._in_use[collection_id] == 0:
+                del self._in_use[collection_id]
+                marking = self._marking.pop(collection_id, None)
+                if marking is not None:
+                    marking.cancel()
+            await self._mark(collection_id)
+            self._schedule_sweep()
+
+    async def _mark(self, collection_id: str):
+        try:
+            await asyncio.to_thread(_touch, self._marker(collection_id))
+        except OSError:
+            logger.exception(f"could not mark collection {collection_id}")
+
+    async def _keep_marked(self, collection_id: str):
+        # uses longer than the grace period stay visible to other workers
+        while True:
+            await asyncio.sleep(self.grace_period / 2)
+            await self._mark(collection_id)
+
+    def _schedule_sweep(self):
+        if self._sweep_task is not None and not self._sweep_task.done():
+            return
+        if time.monotonic() - self._last_sweep < self.sweep_interval:
+            return
+        self._sweep_task = asyncio.create_task(self.sweep())
+
+    async def sweep(self):
+        async with self._sweep_lock:
+            await self._sweep()
+
+    async def _sweep(self):
+        self._last_sweep = time.monotonic()
+        try:
+            usage = await asyncio.to_thread(self._disk_usage)
+        except OSError:
+            logger.exception(f"could not measure {self.base_dir}")
+            return
+        self.used_bytes = sum(size for size, _ in usage.values())
+        if self.used_bytes <= self.max_bytes:
+            return
+
+        # collections never used through a janitor count from their last
+        # modification
+        access = await asyncio.to_thread(
+            lambda: {
+                collection_id: _modified(self._marker(collection_id)) or modified
+                for collection_id, (_, modified) in usage.items()
+            }
+        )
+        for collection_id in sorted(usage, key=access.__getitem__):
+            if self.used_bytes <= self.max_bytes:
+                break
+            if collection_id in self._in_use:
+                continue
+            size = usage[collection_id][0]
+            if not await self._evict(collection_id):
+                continue
+            self.used_bytes -= size
+            self.evictions += 1
+            self.evicted_bytes += size
+            if self.on_evict is not None:
+                self.on_evict(collection_id, size)
+
+    async def _evict(self, collection_id: str) -> bool:
+        marker = self._marker(collection_id)
+
+        def _remove() -> bool:
+            # checked last, another worker may have started using it
+            marked = _modified(marker)
+            if marked is not None and time.time() - marked < self.grace_period:
+                return False
+            logger.info(f"evicting local copy of collection {collection_id}")
+            for folder in self._collection_folders(collection_id):
+                shutil.rmtree(folder, ignore_errors=True)
+            with suppress(FileNotFoundError):
+                os.remove(marker)
+            return True
+
+        removal = asyncio.ensure_future(asyncio.to_thread(_remove))
+        self._evicting[collection_id] = removal
+        try:
+            return await removal
+        finally:
+            self._evicting.pop(collection_id, None)
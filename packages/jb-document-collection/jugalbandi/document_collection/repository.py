@@ -1,20 +1,47 @@
 import asyncio
+from contextlib import asynccontextmanager
 from enum import Enum
-from io import BytesIO
-from typing import Any, AsyncIterator, Dict, List, Protocol
+import hashlib
+from typing import (
+    IO,
+    Any,
+    AsyncIterator,
+    Awaitable,
+    Callable,
+    Dict,
+    List,
+    Optional,
+    Protocol,
+    Tuple,
+)
 import os
+import random
+import tempfile
 import uuid
 import re
 import logging
+from weakref import WeakValueDictionary
+from cachetools import TTLCache
 from pydantic import BaseModel
 from zipfile import ZipFile, ZipInfo
-from jugalbandi.storage import Storage
+from jugalbandi.core.errors import InternalServerException
+from jugalbandi.storage import (
+    IndexMaterializer,
+    Storage,
+    combined_version,
+    publish_index,
+    read_index_pointer,
+)
+from .janitor import LOCAL_INDEX_FOLDER, LocalStoreJanitor
 
 logger = logging.getLogger(__name__)
 
 
+SPOOL_CHUNK_SIZE = 1024 * 1024
+
+
 class AsyncReader(Protocol):
-    async def read(self) -> bytes:
+    async def read(self, size: int = -1) -> bytes:
         pass
 
 
@@ -22,8 +49,8 @@ class WrapSyncReader:
     def __init__(self, file_like: Any):
         self.file_like = file_like
 
-    async def read(self) -> bytes:
-        return self.file_like.read()
+    async def read(self, size: int = -1) -> bytes:
+        return self.file_like.read(size)
 
 
 class DocumentSourceFile:
@@ -37,14 +64,17 @@ class DocumentSourceFile:
     async def read_content(self):
         return await self.reader.read()
 
-
-class ZipFileReader:
-    def __init__(self, zf: ZipFile, fileinfo: ZipInfo):
-        self.zf = zf
-        self.fileinfo = fileinfo
-
-    async def read(self) -> bytes:
-        return self.zf.read(self.fileinfo)
+    async def spool(self) -> IO[bytes]:
+        """The content in a temporary file, read in chunks"""
+        spool_file = tempfile.TemporaryFile()
+        try:
+            while chunk := await self.reader.read(SPOOL_CHUNK_SIZE):
+                await asyncio.to_thread(spool_file.write, chunk)
+        except BaseException:
+            spool_file.close()
+            raise
+        spool_file.seek(0)
+        return spool_file
 
 
 class DocumentFormat(Enum):
@@ -52,12 +82,66 @@ class DocumentFormat(Enum):
     TEXT = "txt"
 
 
-class DataFileInfo(BaseModel):
-    default_file_name: str
-    extensions: List[str]
+class ManifestFile(BaseModel):
+    # unknown for files of collections created before the manifest
+    size: Optional[int] = None
+    sha256: Optional[str] = None
+
+    @classmethod
+    def from_content(cls, content: bytes) -> "ManifestFile":
+        return cls(size=len(content), sha256=hashlib.sha256(content).hexdigest())
+
+
+class ManifestDocument(BaseModel):
+    source: ManifestFile
+    # derived files by DocumentFormat value, e.g. the extracted text
+    formats: Dict[str, ManifestFile] = {}
+
+
+class ManifestIndex(BaseModel):
+    version: str = ""
+    files: Dict[str, ManifestFile] = {}
+    # published with publish_index, the files are below the version folder
+    versioned: bool = False
+
+    def update_version(self):
+        digest = hashlib.sha256()
+        for filename, file in sorted(self.files.items()):
+            digest.update(f"{filename}:{file.sha256}\n".encode("utf-8"))
+        self.version = digest.hexdigest()[:16]
+
+
+class CollectionManifest(BaseModel):
+    # source documents by filename, in upload order
+    documents: Dict[str, ManifestDocument] = {}
+    indexes: Dict[str, ManifestIndex] = {}
 
 
 INDEX_FILE_REGEX = re.compile(r"^index\..*")
+MANIFEST_FILE_NAME = "manifest.json"
+# attempts of a manifest update that loses to writers in other processes
+MANIFEST_UPDATE_ATTEMPTS = 8
+
+
+class _ManifestCache:
+    """
+    Manifests by collection id, with a lock per collection serializing the
+    manifest updates of all DocumentCollection objects for that id within
+    this process. Across processes, updates are conditional writes.
+    """
+
+    def __init__(self, maxsize: int = 1024, ttl: float = 300):
+        self.manifests: TTLCache = TTLCache(maxsize=maxsize, ttl=ttl)
+        # (version, remote paths) of indexes not recorded in the manifest
+        self.legacy_indexes: TTLCache = TTLCache(maxsize=maxsize, ttl=ttl)
+        self._locks: WeakValueDictionary[str, asyncio.Lock] = WeakValueDictionary()
+
+    def lock(self, collection_id: str) -> asyncio.Lock:
+        lock = self._locks.get(collection_id)
+        if lock is None:
+            lock = asyncio.Lock()
+            self._locks[collection_id] = lock
+        return lock
 
 
 class DocumentCollection:
@@ -66,18 +150,33 @@ class DocumentCollection:
         collection_id: str,
         local_store: Storage,
         remote_store: Storage,
+        _manifest_cache: Optional[_ManifestCache] = None,
+        _index_materializer: Optional[IndexMaterializer] = None,
+        _janitor: Optional[LocalStoreJanitor] = None,
     ):
         self._id = collection_id
         self.local_store = local_store
         self.remote_store = remote_store
-        self.data_files: Dict[str, DataFileInfo] = {}
-        self.index_files: Dict[str, List[str]] = {}
-        self.dir: List[str] = []
+        self._manifest_cache = _manifest_cache or _ManifestCache(maxsize=1)
+        self._index_materializer = _index_materializer or IndexMaterializer(
+            local_store.path(LOCAL_INDEX_FOLDER)
+        )
+        self._janitor = _janitor
+        self._manifest_lock = self._manifest_cache.lock(collection_id)
 
     @property
     def id(self):
         return self._id
 
+    @asynccontextmanager
+    async def in_use(self) -> AsyncIterator[None]:
+        """Keeps the local copy of the collection from being evicted"""
+        if self._janitor is None:
+            yield
+            return
+        async with self._janitor.use(self._id):
+            yield
+
     def _collection_path(self):
         return self.local_store.path(self._id)
 
@@ -95,68 +194,192 @@ class DocumentCollection:
             file_suffix = f"{os.path.splitext(file_suffix)[0]}.{format.value}"
             return f"{self._id}/{file_suffix}"
 
-    async def _load_directory(self):
+    def _manifest_filename(self) -> str:
+        return f"{self._id}/{MANIFEST_FILE_NAME}"
+
+    async def _load_directory(self) -> CollectionManifest:
+        """Manifest of a collection created before manifests, from a listing"""
+        files = set()
         async for file in self.remote_store.list_files(self.id):
-            if self._is_index_file(file):
-                index_name = os.path.dirname(file)
-                base = os.path.basename(file)
-                if index_name not in self.index_files:
-                    self.index_files[index_name] = [base]
-                else:
-                    self.index_files[index_name].append(base)
-            else:
-                parts = os.path.splitext(file)
-                base = parts[0]
-                ext = parts[1]
-
-                if base not in self.data_files:
-                    self.data_files[base] = DataFileInfo(
-                        default_file_name=file, extensions=[ext]
-                    )
-                else:
-                    dfi = self.data_files[base]
-                    if dfi.default_file_name.endswith(".txt"):
-                        dfi.default_file_name = file
+            if not self._is_index_file(file) and file != MANIFEST_FILE_NAME:
+                files.add(file)
+        text_ext = f".{DocumentFormat.TEXT.value}"
+        bases = {os.path.splitext(file)[0] for file in files}
+        text_bases = {base for base in bases if f"{base}{text_ext}" in files}
+        source_files = [file for file in files if not file.endswith(text_ext)]
+        source_bases = {os.path.splitext(file)[0] for file in source_files}
+        # text files without another source were uploaded as text
+        source_files += [
+            f"{base}{text_ext}" for base in text_bases if base not in source_bases
+        ]
+
+        manifest = CollectionManifest()
+        for file in sorted(source_files):
+            base, ext = os.path.splitext(file)
+            formats = {}
+            if ext != text_ext and base in text_bases:
+                formats[DocumentFormat.TEXT.value] = ManifestFile()
+            manifest.documents[file] = ManifestDocument(
+                source=ManifestFile(), formats=formats
+            )
+        return manifest
+
+    async def _read_manifest(self) -> Optional[CollectionManifest]:
+        manifest, _ = await self._read_manifest_with_version()
+        return manifest
+
+    async def _read_manifest_with_version(
+        self,
+    ) -> Tuple[Optional[CollectionManifest], Optional[str]]:
+        try:
+            content, version = await self.remote_store.read_file_with_version(
+                self._manifest_filename()
+            )
+        except FileNotFoundError:
+            return None, None
+        if not content:
+            return None, version
+        return CollectionManifest.parse_raw(content), version
+
+    async def manifest(self) -> CollectionManifest:
+        """
+        The collection manifest, read once and cached. Collections without a
+        manifest get one built from a directory listing and written back.
+        """
+        manifests = self._manifest_cache.manifests
+        manifest = manifests.get(self._id)
+        if manifest is not None:
+            return manifest
+        async with self._manifest_lock:
+            manifest = manifests.get(self._id)
+            if manifest is not None:
+                return manifest
+            manifest = await self._read_manifest()
+            if manifest is None:
+                manifest = await self._load_directory()
+                if manifest.documents and not await self._write_manifest(
+                    manifest, None
+                ):
+                    # created by another process meanwhile
+                    manifest = await self._read_manifest() or manifest
+            manifests[self._id] = manifest
+            return manifest
+
+    async def _write_manifest(
+        self, manifest: CollectionManifest, version: Optional[str]
+    ) -> bool:
+        # a single object write, readers see either the old or the new manifest
+        written = await self.remote_store.write_file_if_version(
+            self._manifest_filename(), manifest.json().encode("utf-8"), version
+        )
+        if written:
+            self._manifest_cache.manifests[self._id] = manifest
+        return written
+
+    async def _update_manifest(self, update: Callable[[CollectionManifest], None]):
+        async with self._manifest_lock:
+            for attempt in range(MANIFEST_UPDATE_ATTEMPTS):
+                # always the stored manifest, another process may have updated it
+                manifest, version = await self._read_manifest_with_version()
+                if manifest is None:
+                    # not written yet, e.g. the empty manifest of a new collection
+                    cached = self._manifest_cache.manifests.get(self._id)
+                    if cached is not None:
+                        manifest = cached.copy(deep=True)
                     else:
-                        dfi.extensions.append(ext)
-
-            self.dir = [
-                file_info.default_file_name for file_info in self.data_files.values()
-            ]
-
-    async def _add_data_file(self, file: DocumentSourceFile):
-        content = await file.read_content()
-        target_file_name = self._filename(file.filename())
-        await self.local_store.write_file(target_file_name, content)
-        await self.remote_store.write_file(target_file_name, content)
+                        manifest = await self._load_directory()
+                update(manifest)
+                if await self._write_manifest(manifest, version):
+                    return
+                await asyncio.sleep(random.uniform(0, 0.05 * 2**attempt))
+        self._manifest_cache.manifests.pop(self._id, None)
+        raise InternalServerException(
+            f"Could not update the manifest of collection {self._id}"
+        )
 
-    async def _init_from_zip(self, zip_src_file: DocumentSourceFile):
-        zip_contents = await zip_src_file.read_content()
-        with ZipFile(BytesIO(zip_contents), "r") as zf:
-            async with asyncio.TaskGroup() as task_group:
+    @staticmethod
+    def _is_supported_zip_entry(file_info: ZipInfo) -> bool:
+        # decided on the zip directory alone, skipped entries are never
+        # decompressed
+        filename = file_info.filename
+        if file_info.is_dir() or filename.startswith("__MACOSX/"):
+            return False
+        if os.path.basename(filename).startswith("."):
+            # .DS_Store and other hidden files
+            return False
+        if file_info.flag_bits & 0x1:
+            # encrypted
+            return False
+        return not filename.lower().endswith(".zip")
+
+    async def _add_zip_entries(
+        self,
+        zip_src_file: DocumentSourceFile,
+        add_entry: Callable[
+            [str, Callable[[], Awaitable[bytes]]], Awaitable[asyncio.Task]
+        ],
+    ):
+        # the archive is spooled to disk, only the entries being stored are
+        # held in memory
+        with await zip_src_file.spool() as spool_file:
+            with await asyncio.to_thread(ZipFile, spool_file, "r") as zf:
+                tasks = []
                 for file_info in zf.infolist():
-                    filename = file_info.filename
-                    if filename.startswith("__MACOSX/") or filename.endswith(
-                            ".DS_Store"):
+                    if not self._is_supported_zip_entry(file_info):
+                        logger.info(f"skipping zip entry {file_info.filename}")
                         continue
 
-                    zip_source_file = DocumentSourceFile(
-                        filename, ZipFileReader(zf, file_info)
-                    )
+                    async def _read(file_info: ZipInfo = file_info) -> bytes:
+                        return await asyncio.to_thread(zf.read, file_info)
 
-                    task_group.create_task(self._add_data_file(zip_source_file))
+                    tasks.append(await add_entry(file_info.filename, _read))
+                # the archive stays open until its entries are stored
+                if tasks:
+                    await asyncio.wait(tasks)
+
+    async def init_from_files(
+        self, files: List[DocumentSourceFile], max_concurrency: int = 8
+    ):
+        added: Dict[str, ManifestFile] = {}
+        semaphore = asyncio.Semaphore(max_concurrency)
 
-    async def init_from_files(self, files: List[DocumentSourceFile]):
         async with asyncio.TaskGroup() as task_group:
+
+            async def _store(filename: str, read: Callable[[], Awaitable[bytes]]):
+                try:
+                    content = await read()
+                    target_file_name = self._filename(filename)
+                    await asyncio.gather(
+                        self.local_store.write_file(target_file_name, content),
+                        self.remote_store.write_file(target_file_name, content),
+                    )
+                    added[filename] = ManifestFile.from_content(content)
+                finally:
+                    semaphore.release()
+
+            async def _add_entry(
+                filename: str, read: Callable[[], Awaitable[bytes]]
+            ) -> asyncio.Task:
+                # waits for a free slot before the next entry is read
+                await semaphore.acquire()
+                return task_group.create_task(_store(filename, read))
+
             for file in files:
                 if file.filename().endswith(".zip"):
-                    task_group.create_task(self._init_from_zip(file))
+                    await self._add_zip_entries(file, _add_entry)
                 else:
-                    task_group.create_task(self._add_data_file(file))
+                    await _add_entry(file.filename(), file.read_content)
+
+        def _add_documents(manifest: CollectionManifest):
+            for filename in sorted(added):
+                manifest.documents[filename] = ManifestDocument(source=added[filename])
+
+        # one manifest write for the whole upload
+        await self._update_manifest(_add_documents)
 
     async def list_files(self) -> AsyncIterator[str]:
-        await self._load_directory()
-        for file in self.dir:
+        manifest = await self.manifest()
+        for file in list(manifest.documents):
             yield file
 
     async def read_file(
@@ -173,9 +396,66 @@ class DocumentCollection:
         content: bytes,
         format: DocumentFormat = DocumentFormat.DEFAULT,
     ) -> bytes:
-        return await self.remote_store.write_file(
+        result = await self.remote_store.write_file(
             self._filename(filename, format), content
         )
+        if self._is_index_file(filename):
+            # legacy location of index files, not a document
+            return result
+        await self._record_files({filename: ManifestFile.from_content(content)}, format)
+        return result
+
+    async def write_files(
+        self,
+        contents: Dict[str, bytes],
+        format: DocumentFormat = DocumentFormat.DEFAULT,
+        max_concurrency: Optional[int] = None,
+    ):
+        """
+        Writes many files, e.g. the text of every document, and records them
+        with one manifest update
+        """
+        filenames = {
+            self._filename(filename, format): filename for filename in contents
+        }
+        written: Dict[str, ManifestFile] = {}
+        errors = []
+        async for result in self.remote_store.write_many(
+            (
+                (file_path, contents[filename])
+                for file_path, filename in filenames.items()
+            ),
+            max_concurrency,
+        ):
+            filename = filenames[result.file_path]
+            if result.error is not None:
+                errors.append(result.error)
+            elif not self._is_index_file(filename):
+                written[filename] = ManifestFile.from_content(contents[filename])
+        if written:
+            await self._record_files(written, format)
+        if errors:
+            raise ExceptionGroup(
+                f"Could not write {len(errors)} files of collection {self._id}", errors
+            )
+
+    async def _record_files(
+        self, files: Dict[str, ManifestFile], format: DocumentFormat
+    ):
+        def _add_files(manifest: CollectionManifest):
+            for filename, manifest_file in files.items():
+                if format == DocumentFormat.DEFAULT:
+                    document = manifest.documents.get(filename)
+                    if document is None:
+                        manifest.documents[filename] = ManifestDocument(
+                            source=manifest_file
+                        )
+                    else:
+                        document.source = manifest_file
+                elif filename in manifest.documents:
+                    manifest.documents[filename].formats[format.value] = manifest_file
+
+        await self._update_manifest(_add_files)
 
     async def write_audio_file(
         self,
@@ -199,6 +479,13 @@ class DocumentCollection:
         target_file_name = self._filename(filename, format)
         return await self.remote_store.make_public(target_file_name)
 
+    async def public_urls(
+        self, filenames: List[str], format: DocumentFormat = DocumentFormat.DEFAULT
+    ) -> List[str]:
+        return await self.remote_store.make_public_many(
+            [self._filename(filename, format) for filename in filenames]
+        )
+
     def _index_folder(self, indexer: str):
         return f"{self._id}/{indexer}"
 
@@ -208,34 +495,165 @@ class DocumentCollection:
     def _index_filename_fallback(self, indexer: str, file_suffix: str) -> str:
         return self._filename(file_suffix)
 
-    async def download_index_files(self, indexer: str, *filenames: str) -> str:
+    def _published_index_folder(self, indexer: str) -> str:
+        return f"{self._id}/indexes/{indexer}"
+
+    def _published_index_filename(
+        self, indexer: str, version: str, file_suffix: str
+    ) -> str:
+        return f"{self._published_index_folder(indexer)}/{version}/{file_suffix}"
+
+    async def _unrecorded_index_files(
+        self, indexer: str, filenames: Tuple[str, ...]
+    ) -> Tuple[str, Dict[str, str]]:
+        key = (self._id, indexer, filenames)
+        cached = self._manifest_cache.legacy_indexes.get(key)
+        if cached is not None:
+            return cached
+
+        pointer = await read_index_pointer(
+            self.remote_store, self._published_index_folder(indexer)
+        )
+        if pointer is not None and all(
+            filename in pointer.files for filename in filenames
+        ):
+            published = (
+                pointer.version,
+                {
+                    filename: self._published_index_filename(
+                        indexer, pointer.version, filename
+                    )
+                    for filename in filenames
+                },
+            )
+            self._manifest_cache.legacy_indexes[key] = published
+            return published
+
+        # written before indexes were published, each file on its own
+        files = {}
         for filename in filenames:
             index_file_name = self._index_filename(indexer, filename)
-            content = await self.read_index_file(indexer, filename)
-            await self.local_store.write_file(index_file_name, content)
+            if not await self.remote_store.file_exists(index_file_name):
+                index_file_name = self._index_filename_fallback(indexer, filename)
+                if not await self.remote_store.file_exists(index_file_name):
+                    raise FileNotFoundError(f"file {filename} not found")
+            files[filename] = index_file_name
+
+        version = combined_version(
+            [
+                await self.remote_store.file_version(file_path)
+                for file_path in files.values()
+            ]
+        )
+        if version is None:
+            # no versions in this store, tell versions apart by content
+            contents = []
+            async for result in self.remote_store.read_many(files.values()):
+                if result.error is not None:
+                    raise result.error
+                contents.append((result.file_path, result.content))
+            version = combined_version(
+                [hashlib.sha256(content).hexdigest() for _, content in sorted(contents)]
+            )
+        self._manifest_cache.legacy_indexes[key] = (version, files)
+        return version, files  # type: ignore
+
+    async def _resolve_index(
+        self, indexer: str, filenames: Tuple[str, ...]
+    ) -> Tuple[str, Dict[str, str]]:
+        """Version of an index and the remote paths of its files"""
+        index = (await self.manifest()).indexes.get(indexer)
+        if index is None or not all(filename in index.files for filename in filenames):
+            return await self._unrecorded_index_files(indexer, filenames)
+        if index.versioned:
+            return index.version, {
+                filename: self._published_index_filename(
+                    indexer, index.version, filename
+                )
+                for filename in filenames
+            }
+        return index.version, {
+            filename: self._index_filename(indexer, filename) for filename in filenames
+        }
+
+    async def materialize_index(self, indexer: str, *filenames: str) -> str:
+        """
+        Local directory with the current version of the index files. Each
+        version is downloaded once into its own directory, repeat calls for
+        an unchanged index return the directory without any I/O.
+        """
+        version, files = await self._resolve_index(indexer, filenames)
+        async with self.in_use():
+            return await self._index_materializer.materialize(
+                self._index_folder(indexer), version, self.remote_store, files
+            )
+
+    async def download_index_files(self, indexer: str, *filenames: str) -> str:
+        _, files = await self._resolve_index(indexer, filenames)
+        local_names = {}
+        for filename, remote_file_name in files.items():
+            index_file_name = self._index_filename(indexer, filename)
+            if not await self.local_store.file_exists(index_file_name):
+                local_names[remote_file_name] = index_file_name
+
+        async for result in self.remote_store.read_many(local_names):
+            if result.error is not None:
+                raise result.error
+            await self.local_store.write_file(
+                local_names[result.file_path], result.content  # type: ignore
+            )
         return self._index_folder(indexer)
 
+    async def index_version(self, indexer: str) -> Optional[str]:
+        index = (await self.manifest()).indexes.get(indexer)
+        return index.version if index is not None else None
+
     async def read_index_file(self, indexer: str, filename: str) -> bytes:
-        index_file_name = self._index_filename(indexer, filename)
-        index_file_name_fallback = self._index_filename_fallback(indexer, filename)
-        if not await self.local_store.file_exists(index_file_name):
-            if await self.remote_store.file_exists(index_file_name):
-                content = await self.remote_store.read_file(index_file_name)
-            elif await self.remote_store.file_exists(index_file_name_fallback):
-                content = await self.remote_store.read_file(index_file_name_fallback)
-            else:
-                raise FileNotFoundError(f"file {filename} not found")
-        else:
-            content = await self.local_store.read_file(index_file_name)
+        _, files = await self._resolve_index(indexer, (filename,))
+        return await self.remote_store.read_file(files[filename])
+
+    async def publish_index(self, indexer: str, files: Dict[str, bytes]) -> str:
+        """
+        Publishes all files of an index as one new version: the files go to
+        ``indexes/<indexer>/<version>/`` and only then the ``CURRENT``
+        pointer and the manifest are switched to it. Returns the version.
+        """
+        version = await publish_index(
+            self.remote_store, self._published_index_folder(indexer), files
+        )
+        index = ManifestIndex(
+            files={
+                filename: ManifestFile.from_content(content)
+                for filename, content in files.items()
+            },
+            versioned=True,
+        )
+        index.update_version()
+
+        def _set_index(manifest: CollectionManifest):
+            manifest.indexes[indexer] = index
 
-        return content
+        await self._update_manifest(_set_index)
+        return version
 
     async def write_index_file(
         self, indexer: str, filename: str, content: bytes
     ) -> bytes:
-        return await self.remote_store.write_file(
+        """Writes a single index file in place, prefer ``publish_index``"""
+        result = await self.remote_store.write_file(
             self._index_filename(indexer, filename), content
         )
+        manifest_file = ManifestFile.from_content(content)
+
+        def _add_index_file(manifest: CollectionManifest):
+            index = manifest.indexes.get(indexer)
+            if index is None or index.versioned:
+                index = manifest.indexes[indexer] = ManifestIndex()
+            index.files[filename] = manifest_file
+            index.update_version()
+
+        await self._update_manifest(_add_index_file)
+        return result
 
     def local_index_folder(self, indexer: str) -> str:
         return os.path.join(
@@ -252,19 +670,40 @@ class DocumentRepository:
         self,
         local_store: Storage,
         remote_store: Storage,
+        janitor: Optional[LocalStoreJanitor] = None,
     ):
         self.local_store = local_store
         self.remote_store = remote_store
+        # shared by the DocumentCollection objects handed out for each request
+        self._manifest_cache = _ManifestCache()
+        self._index_materializer = IndexMaterializer(
+            local_store.path(LOCAL_INDEX_FOLDER)
+        )
+        self.janitor = janitor
 
     def new_collection(self) -> DocumentCollection:
         uuid_number = str(uuid.uuid1())
         new_collection = DocumentCollection(
-            uuid_number, self.local_store, self.remote_store
+            uuid_number,
+            self.local_store,
+            self.remote_store,
+            self._manifest_cache,
+            self._index_materializer,
+            self.janitor,
         )
+        # nothing to list for a collection that does not exist yet
+        self._manifest_cache.manifests[uuid_number] = CollectionManifest()
         return new_collection
 
     def get_collection(self, doc_id: str) -> DocumentCollection:
-        return DocumentCollection(doc_id, self.local_store, self.remote_store)
+        return DocumentCollection(
+            doc_id,
+            self.local_store,
+            self.remote_store,
+            self._manifest_cache,
+            self._index_materializer,
+            self.janitor,
+        )
 
     async def shutdown(self):
         await self.remote_store.shutdown()
@@ -60,6 +60,16 @@ async def local_only_repo():
         )
 
 
+@pytest_asyncio.fixture()
+async def local_remote_repo():
+    with tempfile.TemporaryDirectory() as local_dir:
+        with tempfile.TemporaryDirectory() as remote_dir:
+            yield DocumentRepository(
+                local_store=LocalStorage(local_dir),
+                remote_store=LocalStorage(remote_dir),
+            )
+
+
 @pytest_asyncio.fixture()
 async def zip_source_random():
     zip_contents = fake.zip(num_files=fake.pyint(min_value=1, max_value=5))
@@ -1,8 +1,16 @@
+import asyncio
 import logging
 from typing import Dict, Tuple
-from jugalbandi.document_collection.repository import DocumentSourceFile
+from io import BytesIO
+from zipfile import ZipFile
+from jugalbandi.document_collection.repository import DocumentSourceFile, WrapSyncReader
 import os
-from jugalbandi.document_collection import DocumentRepository
+import shutil
+from jugalbandi.document_collection import (
+    DocumentFormat,
+    DocumentRepository,
+    LocalStoreJanitor,
+)
 
 test_dir = os.path.dirname(__file__)
 
@@ -93,3 +101,199 @@ async def test_index_download(
     ) as f:
         content = f.read()
         assert content == exp_content
+
+
+async def test_manifest(
+    local_remote_repo: DocumentRepository,
+    zip_source_random: Tuple[Dict[str, bytes], DocumentSourceFile],
+):
+    exp_values, zip_src_file = zip_source_random
+    doc_collection = local_remote_repo.new_collection()
+    await doc_collection.init_from_files([zip_src_file])
+    for filename in exp_values:
+        await doc_collection.write_file(filename, b"text", DocumentFormat.TEXT)
+    await doc_collection.write_index_file("langchain", "index.faiss", b"index")
+
+    # a fresh repository reads the manifest written above
+    repo = DocumentRepository(
+        local_remote_repo.local_store, local_remote_repo.remote_store
+    )
+    manifest = await repo.get_collection(doc_collection.id).manifest()
+    assert sorted(manifest.documents) == sorted(exp_values)
+    for filename, content in exp_values.items():
+        document = manifest.documents[filename]
+        assert document.source.size == len(content)
+        assert document.formats[DocumentFormat.TEXT.value].size == 4
+    assert manifest.indexes["langchain"].version != ""
+
+
+async def test_manifest_backfill(local_remote_repo: DocumentRepository):
+    remote_store = local_remote_repo.remote_store
+    await remote_store.write_file("legacy/a.pdf", b"pdf")
+    await remote_store.write_file("legacy/a.txt", b"text")
+    await remote_store.write_file("legacy/b.txt", b"text")
+
+    doc_collection = local_remote_repo.get_collection("legacy")
+    filenames = [filename async for filename in doc_collection.list_files()]
+    assert filenames == ["a.pdf", "b.txt"]
+    assert await remote_store.file_exists("legacy/manifest.json")
+
+
+async def test_manifest_concurrent_updates(local_remote_repo: DocumentRepository):
+    collection_id = local_remote_repo.new_collection().id
+    # two workers with their own manifest caches, as two processes would have
+    collections = [
+        DocumentRepository(
+            local_remote_repo.local_store, local_remote_repo.remote_store
+        ).get_collection(collection_id)
+        for _ in range(4)
+    ]
+    # updates read the stored manifest from here on, not a directory listing
+    await collections[0].write_file("0.pdf", b"pdf")
+    await asyncio.gather(
+        *[
+            collections[i % 4].write_file(f"{i}.pdf", b"pdf")
+            for i in range(1, 20)
+        ]
+    )
+    await collections[0].write_files(
+        {f"{i}.pdf": b"text" for i in range(20)}, DocumentFormat.TEXT
+    )
+
+    repo = DocumentRepository(
+        local_remote_repo.local_store, local_remote_repo.remote_store
+    )
+    manifest = await repo.get_collection(collection_id).manifest()
+    assert sorted(manifest.documents) == sorted(f"{i}.pdf" for i in range(20))
+    for document in manifest.documents.values():
+        assert document.formats[DocumentFormat.TEXT.value].size == 4
+
+
+async def test_materialize_index(local_remote_repo: DocumentRepository):
+    doc_collection = local_remote_repo.new_collection()
+    await doc_collection.write_index_file("langchain", "index.faiss", b"first")
+    await doc_collection.write_index_file("langchain", "index.pkl", b"pickle")
+
+    folders = await asyncio.gather(
+        *[
+            doc_collection.materialize_index("langchain", "index.faiss", "index.pkl")
+            for _ in range(5)
+        ]
+    )
+    assert len(set(folders)) == 1
+    assert sorted(os.listdir(folders[0])) == ["index.faiss", "index.pkl"]
+
+    # a new version lands in its own directory
+    await doc_collection.write_index_file("langchain", "index.faiss", b"second")
+    folder = await doc_collection.materialize_index(
+        "langchain", "index.faiss", "index.pkl"
+    )
+    assert folder != folders[0]
+    with open(os.path.join(folder, "index.faiss"), "rb") as f:
+        assert f.read() == b"second"
+
+    # removed behind the repository's back, by another worker's janitor
+    shutil.rmtree(folder)
+    assert await doc_collection.materialize_index(
+        "langchain", "index.faiss", "index.pkl"
+    ) == folder
+    assert sorted(os.listdir(folder)) == ["index.faiss", "index.pkl"]
+
+
+async def test_publish_index(local_remote_repo: DocumentRepository):
+    doc_collection = local_remote_repo.new_collection()
+    first = await doc_collection.publish_index(
+        "langchain", {"index.faiss": b"faiss1", "index.pkl": b"pkl1"}
+    )
+    second = await doc_collection.publish_index(
+        "langchain", {"index.faiss": b"faiss2", "index.pkl": b"pkl2"}
+    )
+    assert first != second
+    assert await doc_collection.index_version("langchain") == second
+
+    # a reader without the manifest follows the CURRENT pointer
+    os.remove(
+        local_remote_repo.remote_store.path(f"{doc_collection.id}/manifest.json")
+    )
+    repo = DocumentRepository(
+        local_remote_repo.local_store, local_remote_repo.remote_store
+    )
+    folder = await repo.get_collection(doc_collection.id).materialize_index(
+        "langchain", "index.faiss", "index.pkl"
+    )
+    assert os.path.basename(folder) == second
+    with open(os.path.join(folder, "index.pkl"), "rb") as f:
+        assert f.read() == b"pkl2"
+
+
+async def test_zip_skips_unsupported_entries(local_remote_repo: DocumentRepository):
+    zip_contents = BytesIO()
+    with ZipFile(zip_contents, "w") as zf:
+        zf.writestr("docs/", b"")
+        zf.writestr("docs/act.pdf", b"act")
+        zf.writestr("docs/.DS_Store", b"")
+        zf.writestr("__MACOSX/docs/._act.pdf", b"")
+        zf.writestr("docs/nested.zip", b"")
+    zip_contents.seek(0)
+
+    doc_collection = local_remote_repo.new_collection()
+    await doc_collection.init_from_files(
+        [DocumentSourceFile("upload.zip", WrapSyncReader(zip_contents))]
+    )
+    filenames = [filename async for filename in doc_collection.list_files()]
+    assert filenames == ["docs/act.pdf"]
+    assert await doc_collection.read_file("docs/act.pdf") == b"act"
+
+
+async def test_janitor_evicts_least_recently_used(
+    local_remote_repo: DocumentRepository,
+):
+    local_store = local_remote_repo.local_store
+    janitor = LocalStoreJanitor(
+        local_store.path(""), max_bytes=150, sweep_interval=0, grace_period=0
+    )
+    repo = DocumentRepository(local_store, local_remote_repo.remote_store, janitor)
+    old_collection = repo.new_collection()
+    new_collection = repo.new_collection()
+    await old_collection.publish_index("langchain", {"index.faiss": b"o" * 100})
+    await new_collection.publish_index("langchain", {"index.faiss": b"n" * 100})
+
+    old_folder = await old_collection.materialize_index("langchain", "index.faiss")
+    await new_collection.materialize_index("langchain", "index.faiss")
+    await janitor.sweep()
+    assert janitor.evictions == 1
+    assert not os.path.exists(old_folder)
+
+    # an evicted index is downloaded again on its next use
+    async with old_collection.in_use():
+        folder = await old_collection.materialize_index("langchain", "index.faiss")
+        await janitor.sweep()
+        assert os.path.exists(os.path.join(folder, "index.faiss"))
+    assert janitor.evictions == 2
+
+
+async def test_janitor_spares_collections_used_by_other_workers(
+    local_remote_repo: DocumentRepository,
+):
+    local_store = local_remote_repo.local_store
+    # two workers sharing the local store
+    janitors = [
+        LocalStoreJanitor(local_store.path(""), max_bytes=50, sweep_interval=60)
+        for _ in range(2)
+    ]
+    repo = DocumentRepository(local_store, local_remote_repo.remote_store, janitors[0])
+    doc_collection = repo.new_collection()
+    await doc_collection.publish_index("langchain", {"index.faiss": b"i" * 100})
+
+    async with doc_collection.in_use():
+        folder = await doc_collection.materialize_index("langchain", "index.faiss")
+        await janitors[1].sweep()
+    # used moments ago
+    await janitors[1].sweep()
+    assert janitors[1].evictions == 0
+    assert os.path.exists(folder)
+
+    janitors[1].grace_period = 0
+    await janitors[1].sweep()
+    assert janitors[1].evictions == 1
+    assert not os.path.exists(folder)
@@ -95,6 +95,12 @@ class JivaRepository:
                     created_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
                     FOREIGN KEY (email_id) REFERENCES users (email_id)
                 );
+                CREATE TABLE IF NOT EXISTS query_classification_logs (
+                    id SERIAL PRIMARY KEY,
+                    query TEXT,
+                    query_type TEXT,
+                    created_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+                );
                 CREATE TABLE IF NOT EXISTS retriever_testing_logs (
                     id SERIAL PRIMARY KEY,
                     query TEXT,
@@ -191,6 +197,34 @@ class JivaRepository:
                 email_id,
             )
 
+    async def get_feedback_queries(self, limit: int = 5000):
+        engine = await self._get_engine()
+        async with engine.acquire() as connection:
+            return await connection.fetch(
+                """
+                SELECT query, document_title, section_name
+                FROM query_response_feeback
+                WHERE query IS NOT NULL AND feedback IS TRUE
+                ORDER BY id DESC
+                LIMIT $1;
+                """,
+                limit,
+            )
+
+    async def get_query_classifications(self, limit: int = 5000):
+        engine = await self._get_engine()
+        async with engine.acquire() as connection:
+            return await connection.fetch(
+                """
+                SELECT query, query_type
+                FROM query_classification_logs
+                WHERE query IS NOT NULL
+                ORDER BY id DESC
+                LIMIT $1;
+                """,
+                limit,
+            )
+
     async def insert_user(self,
                           name: str,
                           email_id: str,
@@ -465,6 +499,19 @@ class JivaRepository:
                 response
             )
 
+    async def insert_query_classification(self, query: str, query_type: str):
+        engine = await self._get_engine()
+        async with engine.acquire() as connection:
+            await connection.execute(
+                """
+                INSERT INTO query_classification_logs
+                (query, query_type)
+                VALUES ($1, $2)
+                """,
+                query,
+                query_type,
+            )
+
     async def insert_retriever_testing_logs(self,
                                             query: str,
                                             response: str):
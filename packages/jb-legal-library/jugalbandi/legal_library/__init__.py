@@ -1,3 +1,25 @@
-from .legal_library import LegalLibrary, LegalDocumentType, Jurisdiction, LegalKeys
+from .abbreviations import (
+    AbbreviationExpander,
+    ABBREVIATION_VARIANTS,
+    LEGAL_ABBREVIATIONS,
+)
+from .legal_library import (
+    CatalogIndex,
+    LegalLibrary,
+    LegalDocumentType,
+    Jurisdiction,
+    LegalKeys,
+    SECTION_REGEX,
+)
 
-__all__ = ["LegalLibrary", "LegalDocumentType", "Jurisdiction", "LegalKeys"]
+__all__ = [
+    "AbbreviationExpander",
+    "ABBREVIATION_VARIANTS",
+    "LEGAL_ABBREVIATIONS",
+    "CatalogIndex",
+    "LegalLibrary",
+    "LegalDocumentType",
+    "Jurisdiction",
+    "LegalKeys",
+    "SECTION_REGEX",
+]
@@ -0,0 +1,124 @@
+import operator
+import re
+from typing import Awaitable, Callable, Dict, List, Optional
+from cachetools import LRUCache
+from jugalbandi.core import aiocachedmethod
+
+LEGAL_ABBREVIATIONS: Dict[str, str] = {
+    "IPC": "Indian Penal Code",
+    "CrPC": "Code of Criminal Procedure",
+    "CPC": "Code of Civil Procedure",
+    "IEA": "Indian Evidence Act",
+    "BNS": "Bharatiya Nyaya Sanhita",
+    "BNSS": "Bharatiya Nagarik Suraksha Sanhita",
+    "BSA": "Bharatiya Sakshya Adhiniyam",
+    "RTI": "Right to Information",
+    "MV Act": "Motor Vehicles Act",
+    "MVA": "Motor Vehicles Act",
+    "IT Act": "Information Technology Act",
+    "NI Act": "Negotiable Instruments Act",
+    "NDPS": "Narcotic Drugs and Psychotropic Substances",
+    "POCSO": "Protection of Children from Sexual Offences",
+    "SC/ST Act": "Scheduled Castes and the Scheduled Tribes "
+    "(Prevention of Atrocities) Act",
+    "DV Act": "Protection of Women from Domestic Violence Act",
+    "UAPA": "Unlawful Activities (Prevention) Act",
+    "PMLA": "Prevention of Money Laundering Act",
+    "FEMA": "Foreign Exchange Management Act",
+    "RERA": "Real Estate (Regulation and Development) Act",
+    "IBC": "Insolvency and Bankruptcy Code",
+    "GST": "Goods and Services Tax",
+    "KLR Act": "Karnataka Land Revenue Act",
+    "FIR": "First Information Report",
+    "PIL": "Public Interest Litigation",
+}
+
+# other spellings of the abbreviations above, matched as written. Lower case
+# only where it is not also an English word ("it act", "fir" and "pil" stay).
+# All caps spellings ("CRPC", "MV ACT") are matched without being listed.
+ABBREVIATION_VARIANTS: Dict[str, str] = {
+    "Crpc": "CrPC",
+    "crpc": "CrPC",
+    "ipc": "IPC",
+    "cpc": "CPC",
+    "bnss": "BNSS",
+    "ndps": "NDPS",
+    "pocso": "POCSO",
+    "uapa": "UAPA",
+    "pmla": "PMLA",
+    "rera": "RERA",
+    "rti": "RTI",
+    "MV act": "MV Act",
+    "IT act": "IT Act",
+    "NI act": "NI Act",
+    "DV act": "DV Act",
+}
+
+# "C.P.C." -> "CPC", before abbreviations are looked up
+DOTTED_ABBREVIATION_REGEX = re.compile(r"\b((?:[A-Za-z]\.){2,})")
+ALL_CAPS_TOKEN_REGEX = re.compile(r"\b[A-Z][A-Z/]*[A-Z]\b")
+# section numbers are often roman numerals
+ROMAN_NUMERAL_REGEX = re.compile(
+    r"^M{0,3}(CM|CD|D?C{0,3})(XC|XL|L?X{0,3})(IX|IV|V?I{0,3})$"
+)
+
+
+class AbbreviationExpander:
+    """
+    Expands the abbreviations of a query from a dictionary with one compiled
+    regex. The LLM (``fallback``) is asked only when all caps tokens that are
+    not in the dictionary remain. Results are memoized per query.
+
+    Matching is case sensitive, so that words like "it" or "fir" are left
+    alone; other spellings have to be listed in ``variants``.
+    """
+
+    def __init__(
+        self,
+        abbreviations: Dict[str, str] = LEGAL_ABBREVIATIONS,
+        variants: Dict[str, str] = ABBREVIATION_VARIANTS,
+        fallback: Optional[Callable[[str], Awaitable[str]]] = None,
+        cache_size: int = 4096,
+    ):
+        self.fallback = fallback
+        self._expansions = {
+            abbreviation.upper(): expansion
+            for abbreviation, expansion in abbreviations.items()
+        }
+        self._expansions.update(abbreviations)
+        self._expansions.update(
+            (variant, abbreviations[abbreviation])
+            for variant, abbreviation in variants.items()
+            if abbreviation in abbreviations
+        )
+        # longest first, "IT Act" is preferred over a shorter match
+        alternatives = sorted(self._expansions, key=len, reverse=True)
+        self._regex = re.compile(
+            r"(?<![\w/])("
+            + "|".join(re.escape(abbreviation) for abbreviation in alternatives)
+            + r")(?![\w/])"
+        )
+        self._cache: LRUCache = LRUCache(maxsize=cache_size)
+
+    def expand_known(self, query: str) -> str:
+        query = DOTTED_ABBREVIATION_REGEX.sub(
+            lambda match: match.group(1).replace(".", ""), query
+        )
+        return self._regex.sub(
+            lambda match: self._expansions[match.group(1)], query
+        )
+
+    def unknown_abbreviations(self, query: str) -> List[str]:
+        return [
+            token
+            for token in ALL_CAPS_TOKEN_REGEX.findall(query)
+            if token not in self._expansions
+            and not ROMAN_NUMERAL_REGEX.match(token)
+        ]
+
+    @aiocachedmethod(operator.attrgetter("_cache"))
+    async def expand(self, query: str) -> str:
+        expanded = self.expand_known(query)
+        if self.fallback is not None and self.unknown_abbreviations(expanded):
+            return await self.fallback(expanded)
+        return expanded
@@ -64,6 +64,12 @@ def read_library_folder(lib_folder: str = "lib") -> List[LibraryImport]:
 
 
 async def import_act_docs(legal_library: LegalLibrary, lib_folder: str = "lib"):
+    # the catalog snapshot is written once for all the documents
+    async with legal_library.batch_catalog_updates():
+        await _import_act_docs(legal_library, lib_folder)
+
+
+async def _import_act_docs(legal_library: LegalLibrary, lib_folder: str):
     lib_entries = read_library_folder(lib_folder)
 
     for lib_entry in lib_entries:
@@ -1,18 +1,23 @@
+import asyncio
 from enum import Enum
-import operator
-from typing import Dict, List, Optional
+from collections import defaultdict
+import gzip
+import logging
+import math
+import random
+import time
+from typing import Dict, List, Optional, Tuple
 from datetime import date
 from pydantic import BaseModel
 from jugalbandi.library import DocumentMetaData, Library, DocumentSection
 from jugalbandi.storage import Storage
-from cachetools import TTLCache
-from jugalbandi.core import aiocachedmethod
+from cachetools import LRUCache, cached
 from jugalbandi.core.errors import (
     IncorrectInputException,
     InternalServerException,
 )
 from jugalbandi.jiva_repository import JivaRepository
-from sklearn.feature_extraction.text import TfidfVectorizer
+from .abbreviations import AbbreviationExpander
 from langchain.vectorstores.faiss import FAISS
 from langchain.embeddings.openai import OpenAIEmbeddings
 from langchain.docstore.document import Document
@@ -21,14 +26,22 @@ import os
 import openai
 import json
 import roman
-import numpy as np
 import tiktoken
 
 
+logger = logging.getLogger(__name__)
+
+
 class InvalidActMetaData(Exception):
     pass
 
 
+@cached(cache=LRUCache(maxsize=4))
+def _load_vector_db(index_folder_path: str) -> FAISS:
+    # index folders are versioned and never change once published
+    return FAISS.load_local(index_folder_path, OpenAIEmbeddings())
+
+
 class LegalDocumentType(Enum):
     ACT = "act"
     AMENDMENT = "amendment"
@@ -110,30 +123,249 @@ class ActMetaData(BaseModel):
         )
 
 
+class CatalogIndex:
+    """Lookups over one version of the library catalog, built in one pass"""
+
+    def __init__(self, catalog: Dict[str, DocumentMetaData]):
+        self.catalog = catalog
+        self.titles: Dict[str, List[str]] = defaultdict(list)
+        self.acts: Dict[str, ActMetaData] = {}
+        self.document_acts: Dict[str, str] = {}
+        self.jurisdiction_years: Dict[Tuple[str, str], List[str]] = defaultdict(list)
+
+        for doc_id, doc_md in catalog.items():
+            self.titles[doc_md.title].append(doc_id)
+            act_id = ActMetaData.get_act_id(doc_md)
+            if act_id is None:
+                continue
+            act_md = self.acts.get(act_id)
+            if act_md is None:
+                try:
+                    act_md = ActMetaData.from_document_metadata(doc_md)
+                except (InvalidActMetaData, ValueError) as e:
+                    # the document is still found by its title, without an act
+                    logger.warning(f"Invalid act metadata of document {doc_id}: {e}")
+                    continue
+                self.acts[act_id] = act_md
+            act_md.add_document(doc_md)
+            self.document_acts[doc_id] = act_id
+            self.jurisdiction_years[(act_md.jurisdiction.value, act_md.year)].append(
+                doc_id
+            )
+
+    def documents_with_title(self, title: str) -> List[DocumentMetaData]:
+        return [self.catalog[doc_id] for doc_id in self.titles.get(title, [])]
+
+    def act_of_document(self, doc_id: str) -> Optional[ActMetaData]:
+        act_id = self.document_acts.get(doc_id)
+        return None if act_id is None else self.acts[act_id]
+
+    def documents_of(self, jurisdiction: str, year: str) -> List[DocumentMetaData]:
+        return [
+            self.catalog[doc_id]
+            for doc_id in self.jurisdiction_years.get((jurisdiction, year), [])
+        ]
+
+
+# gzipped JSON, document id -> normalized section number -> (full section
+# name, section name, start page) for the sections.json of every document
+SECTION_INDEX_FILE = "__catalog__/sections.json.gz"
+# attempts of a section index update that loses to concurrent writers
+SECTION_INDEX_UPDATE_ATTEMPTS = 8
+# seconds before a sections.json that could not be read is tried again
+SECTION_READ_RETRY_INTERVAL = 600.0
+
+# "Section 12", "sec 302A" (number 302), "Section IV"; queries of search_sections
+# have to match it, the query classifier uses it to recognize them
+SECTION_REGEX = re.compile(r"(?i:\bsec(?:tion)?) (\d+|[IVXLCDM]+)[A-Za-z]{0,3}\b")
+
+SectionEntry = Tuple[str, str, int]
+SectionIndex = Dict[str, Dict[str, SectionEntry]]
+
+
+def _normalize_section_number(section_number) -> str:
+    return str(section_number).strip().upper()
+
+
+def _document_section_entries(content: bytes) -> Dict[str, SectionEntry]:
+    entries: Dict[str, SectionEntry] = {}
+    for section in json.loads(content.decode("utf-8")):
+        # the first section with a number wins, as in a scan of the file
+        entries.setdefault(
+            _normalize_section_number(section["Section number"]),
+            (
+                section["Full section name"],
+                section["Section name"],
+                section["Start page"],
+            ),
+        )
+    return entries
+
+
 class LegalLibrary(Library):
-    def __init__(self, id: str, store: Storage):
-        super(LegalLibrary, self).__init__(id, store)
-        self._act_cache: TTLCache = TTLCache(2, 900)
+    def __init__(
+        self, id: str, store: Storage, local_index_path: Optional[str] = None
+    ):
+        super(LegalLibrary, self).__init__(id, store, local_index_path)
+        self._catalog_index: Optional[CatalogIndex] = None
+        self._section_index: Optional[SectionIndex] = None
+        self._section_index_catalog: Optional[Dict[str, DocumentMetaData]] = None
+        self._section_index_load: Optional[
+            Tuple[Dict[str, DocumentMetaData], asyncio.Task]
+        ] = None
+        # document id -> time.monotonic() of the last failed read
+        self._section_read_failures: Dict[str, float] = {}
         self.jiva_repository = JivaRepository()
+        self._abbreviation_expander = AbbreviationExpander(
+            fallback=self._abbreviate_query
+        )
 
-    @aiocachedmethod(operator.attrgetter("_act_cache"))
-    async def act_catalog(self) -> Dict[str, ActMetaData]:
+    async def catalog_index(self) -> CatalogIndex:
         catalog = await self.catalog()
-        act_catalog: Dict[str, ActMetaData] = {}
+        # rebuilt only when the catalog is loaded again
+        if self._catalog_index is None or self._catalog_index.catalog is not catalog:
+            self._catalog_index = CatalogIndex(catalog)
+        return self._catalog_index
 
-        for _, doc_md in catalog.items():
-            act_id = ActMetaData.get_act_id(doc_md)
-
-            if act_id is not None:
-                if act_id in act_catalog:
-                    act_md = act_catalog[act_id]
-                    act_md.add_document(doc_md)
-                else:
-                    act_md = ActMetaData.from_document_metadata(doc_md)
-                    act_md.add_document(doc_md)
-                    act_catalog[act_id] = act_md
+    async def act_catalog(self) -> Dict[str, ActMetaData]:
+        return (await self.catalog_index()).acts
+
+    async def section_index(self) -> SectionIndex:
+        """
+        Sections of every document in the catalog, loaded from one object.
+        Documents that are not in it yet are read once and added.
+        Concurrent callers wait on one load.
+        """
+        catalog = await self.catalog()
+        if (
+            self._section_index is not None
+            and self._section_index_catalog is catalog
+        ):
+            return self._section_index
+
+        load = self._section_index_load
+        if load is None or load[0] is not catalog:
+            load = (catalog, asyncio.create_task(self._load_section_index(catalog)))
+            self._section_index_load = load
+            load[1].add_done_callback(
+                lambda task: self._section_index_loaded(load, task)  # type: ignore
+            )
+        return await asyncio.shield(load[1])
+
+    def _section_index_loaded(
+        self,
+        load: Tuple[Dict[str, DocumentMetaData], asyncio.Task],
+        task: asyncio.Task,
+    ):
+        if self._section_index_load is not load:
+            # invalidated by _sections_written while loading
+            return
+        self._section_index_load = None
+        if not task.cancelled() and task.exception() is None:
+            self._section_index = task.result()
+            self._section_index_catalog = load[0]
+
+    async def _load_section_index(
+        self, catalog: Dict[str, DocumentMetaData]
+    ) -> SectionIndex:
+        section_index, version = await self._read_section_index()
+        now = time.monotonic()
+        missing = [
+            doc_id
+            for doc_id in catalog
+            if doc_id not in section_index
+            and now - self._section_read_failures.get(doc_id, -math.inf)
+            >= SECTION_READ_RETRY_INTERVAL
+        ]
+        removed = [doc_id for doc_id in section_index if doc_id not in catalog]
+        for doc_id in removed:
+            del section_index[doc_id]
+
+        added = False
+        file_paths = {
+            self._file_path(f"{doc_id}/sections.json"): doc_id for doc_id in missing
+        }
+        async for result in self.store.read_many(file_paths):
+            doc_id = file_paths[result.file_path]
+            try:
+                if result.error is not None:
+                    raise result.error
+                section_index[doc_id] = _document_section_entries(
+                    result.content  # type: ignore
+                )
+            except FileNotFoundError:
+                section_index[doc_id] = {}
+            except Exception as e:
+                # left out of the index, and not read again on every load
+                self._section_read_failures[doc_id] = now
+                logger.error(f"Could not read the sections of document {doc_id}: {e}")
+                continue
+            self._section_read_failures.pop(doc_id, None)
+            added = True
+
+        if added or removed:
+            # a concurrent writer wins, its index is completed on its next load
+            await self._write_section_index(section_index, version)
+        return section_index
+
+    async def _read_section_index(self) -> Tuple[SectionIndex, Optional[str]]:
+        try:
+            content, version = await self.store.read_file_with_version(
+                self._file_path(SECTION_INDEX_FILE)
+            )
+        except FileNotFoundError:
+            return {}, None
+        if version is None or not content:
+            return {}, None
+        section_index = {
+            doc_id: {number: tuple(entry) for number, entry in entries.items()}
+            for doc_id, entries in json.loads(gzip.decompress(content)).items()
+        }
+        return section_index, version  # type: ignore
+
+    async def _write_section_index(
+        self, section_index: SectionIndex, version: Optional[str]
+    ) -> bool:
+        content = gzip.compress(
+            json.dumps(section_index, separators=(",", ":")).encode("utf-8")
+        )
+        return await self.store.write_file_if_version(
+            self._file_path(SECTION_INDEX_FILE), content, version
+        )
 
-        return act_catalog
+    async def _sections_written(self, document_id: str):
+        # dropped from the index, the new sections are read on the next load
+        self._section_index = None
+        self._section_index_load = None
+        self._section_read_failures.pop(document_id, None)
+        for attempt in range(SECTION_INDEX_UPDATE_ATTEMPTS):
+            section_index, version = await self._read_section_index()
+            if document_id not in section_index:
+                return
+            del section_index[document_id]
+            if await self._write_section_index(section_index, version):
+                return
+            await asyncio.sleep(random.uniform(0, 0.05 * 2**attempt))
+        logger.error(f"Could not update the section index of library {self.id}")
+
+    def _document_section(
+        self,
+        section_index: SectionIndex,
+        section_number: str,
+        document_metadata: DocumentMetaData,
+    ) -> Optional[DocumentSection]:
+        entry = section_index.get(document_metadata.id, {}).get(
+            _normalize_section_number(section_number)
+        )
+        if entry is None:
+            return None
+        full_section_name, section_name, start_page = entry
+        return DocumentSection(
+            section_id=full_section_name,
+            section_name=section_name,
+            start_page=start_page,
+            metadata=document_metadata,
+        )
 
     async def _abbreviate_query(self, query: str):
         openai.api_key = os.environ["OPENAI_API_KEY"]
@@ -142,7 +374,7 @@ class LegalLibrary(Library):
                     "the abbreviations present in the given sentence. "
                     "Do not change anything else in the given sentence."
                 )
-        result = openai.ChatCompletion.create(
+        result = await openai.ChatCompletion.acreate(
                 model="gpt-4",
                 messages=[
                     {"role": "system", "content": system_rules},
@@ -152,7 +384,8 @@ class LegalLibrary(Library):
         return result["choices"][0]["message"]["content"]
 
     async def _preprocess_query(self, query: str) -> str:
-        query = await self._abbreviate_query(query)
+        # the LLM only sees queries with abbreviations not in the dictionary
+        query = await self._abbreviation_expander.expand(query)
         words = ["Give me", "Give", "Find me", "Find", "Get me", "Get",
                  "Tell me", "Tell"]
         for word in words:
@@ -171,19 +404,6 @@ class LegalLibrary(Library):
                 raise IncorrectInputException("Incorrect section number format")
         return str(result)
 
-    async def _get_document_section(self, section_number: str,
-                                    document_id: str, document_metadata:
-                                    DocumentMetaData) -> DocumentSection:
-        document = self.get_document(document_id)
-        byte_sections = await document.read_sections()
-        sections = json.loads(byte_sections.decode('utf-8'))
-        for section in sections:
-            if section["Section number"] == section_number:
-                return DocumentSection(section_id=section["Full section name"],
-                                       section_name=section["Section name"],
-                                       start_page=section["Start page"],
-                                       metadata=document_metadata)
-
     async def _generate_response(self, docs: List[Document], query: str,
                                  email_id: str, past_conversations_history: bool):
         contexts = [document.page_content for document in docs]
@@ -230,71 +450,55 @@ class LegalLibrary(Library):
 
     async def search_titles(self, query: str) -> List[DocumentMetaData]:
         processed_query = await self._preprocess_query(query)
-        processed_query = processed_query.strip()
-        catalog = await self.catalog()
-        titles_list = [catalog[cat].title for cat in catalog]
+        return await self._search_processed_titles(processed_query.strip())
 
-        vectorizer = TfidfVectorizer()
-        tfidf_matrix = vectorizer.fit_transform(titles_list)
-        title_vector = vectorizer.transform([processed_query])
-        cosine_similarities = tfidf_matrix.dot(title_vector.T).toarray().flatten()
-        top_3_indices = np.argsort(cosine_similarities)[-3:][::-1]
+    async def _search_processed_titles(
+        self, processed_query: str
+    ) -> List[DocumentMetaData]:
+        catalog_index = await self.catalog_index()
+        title_index = await self.title_index()
 
         result = []
-        for i in top_3_indices:
-            title = titles_list[i]
-            for cat in catalog:
-                if catalog[cat].title == title:
-                    result.append(catalog[cat])
+        for title, _ in title_index.search(processed_query, 3):
+            result.extend(catalog_index.documents_with_title(title))
 
         return result
 
     async def search_sections(self, query: str):
         processed_query = await self._preprocess_query(query)
         processed_query = processed_query.strip()
-        pattern = re.compile(r'\b[Ss]ec(?:tion)? (\d+|[IVXLCDM]+[A-Z]{0,3})',
-                             re.IGNORECASE)
-        matches = re.search(pattern, processed_query)
+        matches = SECTION_REGEX.search(processed_query)
         if matches:
             section_number = matches.group(1)
-            split_string = pattern.split(processed_query)
+            split_string = SECTION_REGEX.split(processed_query)
             split_string = list(filter(lambda x: x != "" and x != section_number,
                                        split_string))
             title = split_string[0].strip()
             title = re.sub(r'(?i)of', "", title)
             section_number = await self._preprocess_section_number(section_number)
-            documents_metadata = await self.search_titles(title)
+            # the title is part of the already preprocessed query
+            documents_metadata = await self._search_processed_titles(title.strip())
             document_metadata = documents_metadata[0]
             document_id = document_metadata.id
+            section_index = await self.section_index()
             document_sections = []
-            document_sections.append(await self._get_document_section(
-                                                                section_number,
-                                                                document_id,
-                                                                document_metadata))
+            document_sections.append(self._document_section(section_index,
+                                                            section_number,
+                                                            document_metadata))
 
             if document_sections[0] is None:
                 raise InternalServerException("Cannot find section and page number")
 
-            act_id = (document_metadata.extra_data["legal_act_jurisdiction"] + "-" +
-                      document_metadata.extra_data["legal_act_no"] + "-" +
-                      document_metadata.extra_data["legal_act_year"])
-
-            act_catalog = await self.act_catalog()
-            acts = act_catalog.values()
-            for act in acts:
-                if act.id == act_id:
-                    relevant_act = act
-                    break
+            catalog_index = await self.catalog_index()
+            relevant_act = catalog_index.act_of_document(document_id)
+            if relevant_act is None:
+                return document_sections
 
             for act_document in relevant_act.documents:
-                new_document_id = act_document.id
-                if new_document_id != document_id:
-                    new_document = self.get_document(new_document_id)
-                    new_document_metadata = await new_document.read_metadata()
-                    document_sections.append(await self._get_document_section(
-                                                                section_number,
-                                                                new_document_id,
-                                                                new_document_metadata))
+                if act_document.id != document_id:
+                    document_sections.append(self._document_section(section_index,
+                                                                    section_number,
+                                                                    act_document))
 
             return document_sections
         else:
@@ -303,8 +507,8 @@ class LegalLibrary(Library):
     async def test_response(self, query: str):
         processed_query = await self._preprocess_query(query)
         processed_query = processed_query.strip()
-        await self.download_index_files("index.faiss", "index.pkl")
-        vector_db = FAISS.load_local("indexes", OpenAIEmbeddings())
+        index_folder_path = await self.download_index_files("index.faiss", "index.pkl")
+        vector_db = _load_vector_db(index_folder_path)
         docs = vector_db.similarity_search(query=query, k=10)
 
         contexts = []
@@ -352,8 +556,8 @@ class LegalLibrary(Library):
     async def general_search(self, query: str, email_id: str):
         processed_query = await self._preprocess_query(query)
         processed_query = processed_query.strip()
-        await self.download_index_files("index.faiss", "index.pkl")
-        vector_db = FAISS.load_local("indexes", OpenAIEmbeddings())
+        index_folder_path = await self.download_index_files("index.faiss", "index.pkl")
+        vector_db = _load_vector_db(index_folder_path)
         docs = vector_db.similarity_search(query=query, k=10)
         return await self._generate_response(docs=docs, query=processed_query,
                                              email_id=email_id,
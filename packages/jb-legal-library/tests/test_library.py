@@ -1,6 +1,15 @@
+import asyncio
+import json
 import logging
 from jugalbandi.library import Library, DocumentMetaData, DocumentFormat
+from jugalbandi.legal_library import AbbreviationExpander, CatalogIndex, LegalLibrary
 from jugalbandi.legal_library.csv_import import import_act_docs
+from jugalbandi.legal_library.legal_library import (
+    SECTION_INDEX_FILE,
+    _document_section_entries,
+    _normalize_section_number,
+)
+from jugalbandi.storage import LocalStorage
 
 
 async def test_library_import(
@@ -28,3 +37,156 @@ async def test_library_import(
     list = await jiva_library.catalog()
     for md in list:
         logging.info(list[md])
+
+
+def test_catalog_index():
+    def _metadata(doc_id: str, title: str, act_no: str) -> DocumentMetaData:
+        return DocumentMetaData(
+            id=doc_id,
+            title=title,
+            original_file_name=f"{doc_id}.pdf",
+            original_format=DocumentFormat.PDF,
+            extra_data={
+                "legal_act_jurisdiction": "center",
+                "legal_act_no": act_no,
+                "legal_act_year": "1988",
+            },
+        )
+
+    catalog = {
+        "d1": _metadata("d1", "Motor Vehicles Act", "59"),
+        "d2": _metadata("d2", "Motor Vehicles Rules", "59"),
+        "d3": _metadata("d3", "Motor Vehicles Act", "60"),
+    }
+    catalog_index = CatalogIndex(catalog)
+    assert [md.id for md in catalog_index.documents_with_title(
+        "Motor Vehicles Act")] == ["d1", "d3"]
+    act = catalog_index.act_of_document("d2")
+    assert act is not None and act.id == "center-59-1988"
+    assert [md.id for md in act.documents] == ["d1", "d2"]
+    assert len(catalog_index.documents_of("center", "1988")) == 3
+
+    # an unknown jurisdiction leaves the document without an act, not the index
+    catalog["d4"] = _metadata("d4", "Stamp Act", "34")
+    catalog["d4"].extra_data["legal_act_jurisdiction"] = "goa"
+    catalog_index = CatalogIndex(catalog)
+    assert [md.id for md in catalog_index.documents_with_title("Stamp Act")] == ["d4"]
+    assert catalog_index.act_of_document("d4") is None
+    assert catalog_index.act_of_document("d1") is not None
+
+
+async def test_abbreviations_fall_back_only_for_unknown_ones():
+    fallback_queries = []
+
+    async def _fallback(query: str) -> str:
+        fallback_queries.append(query)
+        return query
+
+    expander = AbbreviationExpander(fallback=_fallback)
+    assert await expander.expand("Section 302 of I.P.C.") == (
+        "Section 302 of Indian Penal Code"
+    )
+    assert await expander.expand("section IV of crpc") == (
+        "section IV of Code of Criminal Procedure"
+    )
+    await expander.expand("What is XYZ")
+    await expander.expand("What is XYZ")
+    assert fallback_queries == ["What is XYZ"]
+
+
+def test_abbreviations_leave_common_words_alone():
+    expander = AbbreviationExpander()
+    for query in [
+        "does it act on me",
+        "what is a fir",
+        "is there a pil for this",
+        "how do i get gst refund",
+    ]:
+        assert expander.expand_known(query) == query
+    assert expander.expand_known("IT Act and Crpc") == (
+        "Information Technology Act and Code of Criminal Procedure"
+    )
+    assert expander.expand_known("MV ACT") == "Motor Vehicles Act"
+
+
+def _sections(*numbers) -> bytes:
+    return json.dumps(
+        [
+            {
+                "Section number": number,
+                "Full section name": f"Section {number}",
+                "Section name": f"name {number}",
+                "Start page": page,
+            }
+            for page, number in enumerate(numbers, start=1)
+        ]
+    ).encode("utf-8")
+
+
+def test_document_section_entries():
+    assert _normalize_section_number(" 12a ") == "12A"
+    assert _normalize_section_number(5) == "5"
+    entries = _document_section_entries(_sections("12a", " 12A", 5, "iv"))
+    # the first of two sections with the same number wins
+    assert entries == {
+        "12A": ("Section 12a", "name 12a", 1),
+        "5": ("Section 5", "name 5", 3),
+        "IV": ("Section iv", "name iv", 4),
+    }
+
+
+class _SectionsStorage(LocalStorage):
+    def __init__(self, base_dir: str):
+        super().__init__(base_dir)
+        self.section_reads = 0
+        self.failing = set()
+
+    async def read_file(self, file_suffix: str) -> bytes:
+        if file_suffix.endswith("/sections.json"):
+            self.section_reads += 1
+            if file_suffix in self.failing:
+                raise OSError("storage unavailable")
+        return await super().read_file(file_suffix)
+
+
+async def test_section_index(tmp_path):
+    def _metadata(title: str) -> DocumentMetaData:
+        return DocumentMetaData(
+            title=title,
+            original_file_name=f"{title}.pdf",
+            original_format=DocumentFormat.PDF,
+        )
+
+    store = _SectionsStorage(str(tmp_path))
+    library = LegalLibrary("lib", store)
+    first = await library.add_document(_metadata("first"), b"pdf")
+    second = await library.add_document(_metadata("second"), b"pdf")
+    broken = await library.add_document(_metadata("broken"), b"pdf")
+    await first.write_sections(_sections("1", "2a"))
+    store.failing.add(f"lib/{broken.id}/sections.json")
+
+    # concurrent callers share one load, each document is read once
+    await library.catalog()
+    indexes = await asyncio.gather(*[library.section_index() for _ in range(5)])
+    assert all(index is indexes[0] for index in indexes)
+    assert store.section_reads == 3
+    assert indexes[0][first.id]["2A"] == ("Section 2a", "name 2a", 2)
+    assert indexes[0][second.id] == {}
+    assert broken.id not in indexes[0]
+
+    # a reload neither reads the failed document again nor rewrites the index
+    version = await store.file_version(f"lib/{SECTION_INDEX_FILE}")
+    library._directory_cache.clear()
+    await library.section_index()
+    assert store.section_reads == 3
+    assert await store.file_version(f"lib/{SECTION_INDEX_FILE}") == version
+
+    # written sections replace the stored ones, in every library
+    await second.write_sections(_sections("7"))
+    assert (await library.section_index())[second.id] == {
+        "7": ("Section 7", "name 7", 1)
+    }
+    other_library = LegalLibrary("lib", store)
+    assert (await other_library.section_index())[second.id] == {
+        "7": ("Section 7", "name 7", 1)
+    }
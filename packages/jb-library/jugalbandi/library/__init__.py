@@ -8,6 +8,7 @@ from .library import (
     DocumentSupportingMetadata,
 )
 from .sections import SectionPdf
+from .title_search import TitleSearchIndex
 
 
 __all__ = [
@@ -19,4 +20,5 @@ __all__ = [
     "DocumentMetaData",
     "DocumentSupportingMetadata",
     "SectionPdf",
+    "TitleSearchIndex",
 ]
@@ -1,16 +1,37 @@
 import asyncio
+from contextlib import asynccontextmanager
 from enum import Enum
+import gzip
+import json
 import operator
-from typing import Dict, Optional
+import os
+import random
+import tempfile
+from typing import (
+    AsyncIterator,
+    Callable,
+    Dict,
+    Iterable,
+    List,
+    Optional,
+    Tuple,
+)
 import uuid
 import aiofiles
 from pydantic import BaseModel
 from datetime import date, datetime
-from jugalbandi.storage import Storage
+from jugalbandi.storage import (
+    BulkResult,
+    IndexMaterializer,
+    Storage,
+    combined_version,
+    publish_index,
+    read_index_pointer,
+)
 from jugalbandi.core import aiocachedmethod
 from cachetools import TTLCache, cachedmethod
 import logging
-from aiofiles import os as aiofiles_os
+from .title_search import TitleSearchIndex, titles_version
 
 
 logger = logging.getLogger(__name__)
@@ -62,12 +83,67 @@ class DocumentSection(BaseModel):
     metadata: DocumentMetaData
 
 
+# gzipped JSON lines, the document id and DocumentMetaData of every document
+CATALOG_SNAPSHOT_FILE = "__catalog__/catalog.jsonl.gz"
+# attempts of a snapshot update that loses to concurrent writers
+CATALOG_UPDATE_ATTEMPTS = 8
+
+Catalog = Dict[str, DocumentMetaData]
+
+
+def _encode_catalog(catalog: Catalog) -> bytes:
+    lines = [
+        json.dumps({"doc_id": doc_id, "metadata": json.loads(catalog[doc_id].json())})
+        for doc_id in sorted(catalog)
+    ]
+    return gzip.compress("\n".join(lines).encode("utf-8"))
+
+
+def _decode_catalog(content: bytes) -> Catalog:
+    catalog: Catalog = {}
+    for line in gzip.decompress(content).decode("utf-8").splitlines():
+        if line:
+            entry = json.loads(line)
+            catalog[entry["doc_id"]] = DocumentMetaData.parse_obj(entry["metadata"])
+    return catalog
+
+
 class Library:
-    def __init__(self, id: str, store: Storage):
+    """
+    Documents below ``{id}/{document id}/`` of the store.
+
+    Next to the ``metadata.json`` of every document, the library keeps a
+    snapshot of all the metadata in one object, ``{id}/__catalog__/``, so
+    that the catalog is loaded with one read. Writes of metadata and
+    removals of documents update the snapshot with an optimistic version
+    check; ``rebuild_catalog_snapshot`` recreates it from the documents.
+    Inside ``batch_catalog_updates`` the updates are collected and the
+    snapshot is written once at the end.
+
+    The library index files are downloaded below ``local_index_path``,
+    ``LIBRARY_LOCAL_INDEX_PATH`` by default; older versions are removed
+    when a new version is downloaded.
+    """
+
+    def __init__(
+        self, id: str, store: Storage, local_index_path: Optional[str] = None
+    ):
         self.id = id
         self.store = store
         self._directory_cache: TTLCache = TTLCache(maxsize=2, ttl=900)
         self._task_manager_store_cache: TTLCache = TTLCache(maxsize=2, ttl=900)
+        self._index_version_cache: TTLCache = TTLCache(maxsize=2, ttl=300)
+        if local_index_path is None:
+            local_index_path = os.getenv(
+                "LIBRARY_LOCAL_INDEX_PATH",
+                os.path.join(tempfile.gettempdir(), "library_indexes"),
+            )
+        self._index_materializer = IndexMaterializer(
+            local_index_path, remove_superseded=True
+        )
+        self._title_index: Optional[TitleSearchIndex] = None
+        self._title_index_catalog: Optional[Catalog] = None
+        self._catalog_updates: Optional[List[Callable[[Catalog], None]]] = None
 
     def _file_path(self, file_suffix: str):
         return f"{self.id}/{file_suffix}"
@@ -81,23 +157,134 @@ class Library:
     async def _make_public(self, file_path: str):
         return await self.store.make_public(file_path)
 
-    @aiocachedmethod(operator.attrgetter("_directory_cache"))
-    async def catalog(self):
-        cat: Dict[str, DocumentMetaData] = {}  # type: ignore
-
-        async def _add_metadata(doc_id):
-            if doc_id != "indexes":
-                document = self.get_document(doc_id)
-                metadata = await document.read_metadata()
-                cat[doc_id] = metadata
+    def _metadata_file_path(self, document_id: str) -> str:
+        return self._file_path(f"{document_id}/metadata.json")
 
-        async with asyncio.TaskGroup() as taskgroup:
-            async for doc_id in self.store.list_subfolders(self.id):
-                if not doc_id.startswith("__"):
-                    taskgroup.create_task(_add_metadata(doc_id))
+    @aiocachedmethod(operator.attrgetter("_directory_cache"))
+    async def catalog(self) -> Catalog:
+        snapshot = await self._read_catalog_snapshot()
+        if snapshot is not None:
+            return snapshot[0]
+
+        # no snapshot yet, it is created from the documents
+        return await self.rebuild_catalog_snapshot()
+
+    async def _read_catalog_snapshot(self) -> Optional[Tuple[Catalog, str]]:
+        try:
+            content, version = await self.store.read_file_with_version(
+                self._file_path(CATALOG_SNAPSHOT_FILE)
+            )
+        except FileNotFoundError:
+            return None
+        if version is None or not content:
+            return None
+        return _decode_catalog(content), version
+
+    async def _write_catalog_snapshot(
+        self, catalog: Catalog, version: Optional[str]
+    ) -> bool:
+        written = await self.store.write_file_if_version(
+            self._file_path(CATALOG_SNAPSHOT_FILE), _encode_catalog(catalog), version
+        )
+        if written:
+            self._directory_cache.clear()
+        return written
+
+    async def _update_catalog_snapshot(self, update: Callable[[Catalog], None]):
+        if self._catalog_updates is not None:
+            self._catalog_updates.append(update)
+            return
+        for attempt in range(CATALOG_UPDATE_ATTEMPTS):
+            snapshot = await self._read_catalog_snapshot()
+            if snapshot is None:
+                # created with everything on the next catalog()
+                self._directory_cache.clear()
+                return
+            catalog, version = snapshot
+            update(catalog)
+            if await self._write_catalog_snapshot(catalog, version):
+                return
+            await asyncio.sleep(random.uniform(0, 0.05 * 2**attempt))
+        # the document files are written, rebuild_catalog_snapshot repairs it
+        self._directory_cache.clear()
+        logger.error(f"Could not update the catalog snapshot of library {self.id}")
+
+    @asynccontextmanager
+    async def batch_catalog_updates(self) -> AsyncIterator[None]:
+        """
+        Collects the catalog snapshot updates of the metadata writes and
+        removals inside the block and applies them with one snapshot write
+        when it exits, for bulk imports. The catalog read inside the block
+        does not have the collected updates yet.
+        """
+        if self._catalog_updates is not None:
+            # nested in another batch, which writes the snapshot
+            yield
+            return
+        self._catalog_updates = []
+        try:
+            yield
+        finally:
+            updates, self._catalog_updates = self._catalog_updates, None
+            if updates:
+
+                def _apply(catalog: Catalog):
+                    for update in updates:
+                        update(catalog)
+
+                # the document files are written even if the block failed
+                await self._update_catalog_snapshot(_apply)
+
+    async def _catalog_from_documents(self) -> Catalog:
+        cat: Catalog = {}
+        doc_ids = {}
+        async for doc_id in self.store.list_subfolders(self.id):
+            if doc_id != "indexes" and not doc_id.startswith("__"):
+                doc_ids[self._metadata_file_path(doc_id)] = doc_id
+
+        errors = []
+        async for result in self.store.read_many(doc_ids):
+            if result.error is not None:
+                errors.append(result.error)
+            else:
+                metadata = DocumentMetaData.parse_raw(result.content)  # type: ignore
+                cat[doc_ids[result.file_path]] = metadata
+        if errors:
+            raise ExceptionGroup("Could not read the library catalog", errors)
 
         return cat
 
+    async def rebuild_catalog_snapshot(self) -> Catalog:
+        """
+        Recreates the catalog snapshot from the metadata of every document,
+        for a periodic reconciliation job. Returns the catalog.
+        """
+        for attempt in range(CATALOG_UPDATE_ATTEMPTS):
+            version = await self.store.file_version(
+                self._file_path(CATALOG_SNAPSHOT_FILE)
+            )
+            catalog = await self._catalog_from_documents()
+            if await self._write_catalog_snapshot(catalog, version):
+                return catalog
+            await asyncio.sleep(random.uniform(0, 0.05 * 2**attempt))
+        logger.error(f"Could not rebuild the catalog snapshot of library {self.id}")
+        return catalog
+
+    async def title_index(self) -> TitleSearchIndex:
+        """
+        Search index over the distinct titles of the catalog. It is fitted
+        once per set of titles, off the event loop.
+        """
+        catalog = await self.catalog()
+        if self._title_index is not None and self._title_index_catalog is catalog:
+            return self._title_index
+        titles = sorted({metadata.title for metadata in catalog.values()})
+        version = titles_version(titles)
+        if self._title_index is None or self._title_index.version != version:
+            self._title_index = await asyncio.to_thread(TitleSearchIndex, titles)
+        self._title_index_catalog = catalog
+        return self._title_index
+
     async def document_exists(self, document_id: str):
         catalog = await self.catalog()
         return document_id in catalog
@@ -112,22 +299,84 @@ class Library:
         return document
 
     async def remove_document(self, document_id: str):
-        return await self.store.remove_file(self._file_path(document_id))
-
-    async def download_index_files(self, *filenames: str):
-        if not await aiofiles_os.path.exists("indexes"):
-            await aiofiles_os.makedirs("indexes", exist_ok=True)
-        for filename in filenames:
-            temp_file_path = "indexes/" + filename
-            if not await aiofiles_os.path.exists(temp_file_path):
-                index_file_name = self._file_path(temp_file_path)
-                file_content = await self._download(index_file_name)
-                async with aiofiles.open(temp_file_path, "wb") as f:
-                    await f.write(file_content)
+        await self.store.remove_file(self._file_path(document_id))
+        await self._update_catalog_snapshot(
+            lambda catalog: catalog.pop(document_id, None)  # type: ignore
+        )
+
+    async def _record_metadata(self, metadata: Dict[str, DocumentMetaData]):
+        await self._update_catalog_snapshot(lambda catalog: catalog.update(metadata))
+
+    async def write_metadata_many(
+        self, metadata: Iterable[DocumentMetaData]
+    ) -> AsyncIterator[BulkResult]:
+        """
+        Writes the metadata of many documents with bounded concurrency and
+        then updates the catalog snapshot once
+        """
+        items: Dict[str, DocumentMetaData] = {}
+
+        def _items():
+            for item in metadata:
+                file_path = self._metadata_file_path(item.id)
+                items[file_path] = item
+                yield file_path, bytes(item.json(), "utf-8")
+
+        written: Dict[str, DocumentMetaData] = {}
+        async for result in self.store.write_many(_items()):
+            if result.error is None:
+                item = items[result.file_path]
+                written[item.id] = item
+            yield result
+        if written:
+            await self._record_metadata(written)
+
+    async def publish_index(self, files: Dict[str, bytes]) -> str:
+        """
+        Publishes the library index files as one new version below
+        ``indexes/<version>/`` and then points ``indexes/CURRENT`` at it
+        """
+        version = await publish_index(self.store, self._file_path("indexes"), files)
+        self._index_version_cache.clear()
+        return version
+
+    @aiocachedmethod(operator.attrgetter("_index_version_cache"))
+    async def _index_files(self, *filenames: str) -> Tuple[str, Dict[str, str]]:
+        folder = self._file_path("indexes")
+        pointer = await read_index_pointer(self.store, folder)
+        if pointer is not None and all(
+            filename in pointer.files for filename in filenames
+        ):
+            return pointer.version, {
+                filename: f"{folder}/{pointer.version}/{filename}"
+                for filename in filenames
+            }
+
+        # written before indexes were published, directly in the folder
+        files = {filename: f"{folder}/{filename}" for filename in filenames}
+        versions = [
+            await self.store.file_version(file_path) for file_path in files.values()
+        ]
+        # stores without versions keep the first download
+        return combined_version(versions) or "unversioned", files
+
+    async def download_index_files(self, *filenames: str) -> str:
+        """
+        Local directory with the current version of the library index files,
+        downloaded once per version
+        """
+        version, files = await self._index_files(*filenames)
+        return await self._index_materializer.materialize(
+            self.id, version, self.store, files
+        )
 
     def get_document(self, document_id: str):
         return Document(self, document_id)
 
+    async def _sections_written(self, document_id: str):
+        """Called after the sections of a document are written"""
+        pass
+
     @cachedmethod(operator.attrgetter("_task_manager_store_cache"))
     def get_task_manager_store(self, task_manager_name: str) -> Storage:
         return self.store.new_store(self._file_path(f"__tasks__/{task_manager_name}"))
@@ -243,6 +492,7 @@ class Document:
             file_type=LibraryFileType.METADATA,
         )
         self._metadata_cache.clear()
+        await self._library._record_metadata({self.id: metadata})
 
     @aiocachedmethod(operator.attrgetter("_metadata_cache"))
     async def read_metadata(self) -> DocumentMetaData:
@@ -261,10 +511,30 @@ class Document:
         format: Optional[DocumentFormat] = None,
         local_file_path: Optional[str] = None,
     ):
-        content = await self._read(document_format=format)
         if local_file_path is not None:
-            async with aiofiles.open(local_file_path, "wb") as f:
-                await f.write(content)
+            await self.download_document(local_file_path, format)
+        else:
+            await self._read(document_format=format)
+
+    async def stream_document(
+        self,
+        format: Optional[DocumentFormat] = None,
+        start: int = 0,
+        end: Optional[int] = None,
+    ) -> AsyncIterator[bytes]:
+        file_path = await self._default_file_path(format)
+        async for chunk in self._library.store.read_range(file_path, start, end):
+            yield chunk
+
+    async def download_document(
+        self,
+        local_file_path: str,
+        format: Optional[DocumentFormat] = None,
+    ):
+        # streamed to disk, the document is never held in memory as a whole
+        async with aiofiles.open(local_file_path, "wb") as f:
+            async for chunk in self.stream_document(format):
+                await f.write(chunk)
 
     async def write_supporting_document(
         self,
@@ -291,10 +561,11 @@ class Document:
         )
 
     async def write_sections(self, content: bytes):
-        return await self._write(
+        await self._write(
             content,
             file_type=LibraryFileType.SECTIONS,
         )
+        await self._library._sections_written(self.id)
 
     async def read_sections(self):
         return await self._read(
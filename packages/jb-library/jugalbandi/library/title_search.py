@@ -0,0 +1,51 @@
+import hashlib
+from typing import Iterable, List, Tuple
+import numpy as np
+from sklearn.feature_extraction.text import TfidfVectorizer
+from sklearn.pipeline import FeatureUnion
+from sklearn.preprocessing import normalize
+
+
+def titles_version(titles: Iterable[str]) -> str:
+    digest = hashlib.sha256()
+    for title in sorted(titles):
+        digest.update(f"{title}\n".encode("utf-8"))
+    return digest.hexdigest()[:16]
+
+
+class TitleSearchIndex:
+    """
+    TF-IDF over titles, fitted once. Word unigrams and bigrams are combined
+    with character n-grams within words, so misspelt queries still match.
+    A query is one sparse dot product with the title matrix and a partial
+    sort of the scores.
+
+    The fitted vectorizers are not persisted, pickles of scikit-learn
+    objects do not survive version upgrades and fitting takes milliseconds.
+    """
+
+    def __init__(self, titles: List[str]):
+        self.titles = titles
+        self.version = titles_version(titles)
+        self._vectorizer = FeatureUnion(
+            [
+                ("words", TfidfVectorizer(ngram_range=(1, 2))),
+                ("chars", TfidfVectorizer(analyzer="char_wb", ngram_range=(2, 4))),
+            ]
+        )
+        try:
+            self._matrix = normalize(self._vectorizer.fit_transform(titles))
+        except ValueError:
+            # no titles, or none with anything to index
+            self._matrix = None
+
+    def search(self, query: str, k: int = 3) -> List[Tuple[str, float]]:
+        """The k best matching titles with their cosine similarity, best first"""
+        if self._matrix is None or k <= 0:
+            return []
+        query_vector = normalize(self._vectorizer.transform([query]))
+        scores = (self._matrix @ query_vector.T).toarray().ravel()
+        k = min(k, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top], kind="stable")]
+        return [(self.titles[i], float(scores[i])) for i in top]
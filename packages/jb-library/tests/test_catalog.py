@@ -0,0 +1,125 @@
+import asyncio
+import os
+from jugalbandi.library import DocumentFormat, DocumentMetaData, Library
+from jugalbandi.library.library import CATALOG_SNAPSHOT_FILE
+from jugalbandi.storage import LocalStorage
+
+
+def _metadata(title: str) -> DocumentMetaData:
+    return DocumentMetaData(
+        title=title,
+        original_file_name=f"{title}.pdf",
+        original_format=DocumentFormat.PDF,
+    )
+
+
+async def _fresh_catalog(store: LocalStorage):
+    return await Library("lib", store).catalog()
+
+
+async def test_concurrent_metadata_writes_are_not_lost(tmp_path):
+    store = LocalStorage(str(tmp_path))
+    library = Library("lib", store)
+    documents = [
+        await library.add_document(_metadata(f"t{i}"), b"pdf") for i in range(12)
+    ]
+    # creates the snapshot, which the writes below all update
+    assert len(await library.catalog()) == 12
+
+    # every worker has its own Library, as in a multi-process deployment
+    libraries = [Library("lib", store) for _ in range(4)]
+    await asyncio.gather(
+        *[
+            libraries[i % 4]
+            .get_document(document.id)
+            .write_metadata(_metadata(f"new{i}").copy(update={"id": document.id}))
+            for i, document in enumerate(documents)
+        ]
+    )
+    catalog = await _fresh_catalog(store)
+    assert sorted(metadata.title for metadata in catalog.values()) == sorted(
+        f"new{i}" for i in range(12)
+    )
+
+
+async def test_remove_document(tmp_path):
+    store = LocalStorage(str(tmp_path))
+    library = Library("lib", store)
+    kept = await library.add_document(_metadata("kept"), b"pdf")
+    removed = await library.add_document(_metadata("removed"), b"pdf")
+
+    await library.remove_document(removed.id)
+    assert list(await library.catalog()) == [kept.id]
+    assert list(await _fresh_catalog(store)) == [kept.id]
+
+
+async def test_rebuild_catalog_snapshot(tmp_path):
+    store = LocalStorage(str(tmp_path))
+    library = Library("lib", store)
+    document = await library.add_document(_metadata("a"), b"pdf")
+    assert list(await library.catalog()) == [document.id]
+
+    # metadata written around the snapshot, by an older version of the code
+    other = _metadata("b")
+    other.id = "other"
+    await store.write_file(f"lib/{other.id}/metadata.json", other.json().encode())
+    assert list(await _fresh_catalog(store)) == [document.id]
+
+    catalog = await library.rebuild_catalog_snapshot()
+    assert sorted(catalog) == sorted([document.id, other.id])
+    assert sorted(await _fresh_catalog(store)) == sorted([document.id, other.id])
+
+    # without a snapshot the catalog is rebuilt on first use
+    await store.remove_file(f"lib/{CATALOG_SNAPSHOT_FILE}")
+    assert sorted(await _fresh_catalog(store)) == sorted([document.id, other.id])
+    assert await store.file_exists(f"lib/{CATALOG_SNAPSHOT_FILE}")
+
+
+class CountingStorage(LocalStorage):
+    def __init__(self, base_dir: str):
+        super().__init__(base_dir)
+        self.snapshot_writes = 0
+
+    async def write_file_if_version(self, file_suffix, file_content, version):
+        self.snapshot_writes += 1
+        return await super().write_file_if_version(file_suffix, file_content, version)
+
+
+async def test_batch_catalog_updates(tmp_path):
+    store = CountingStorage(str(tmp_path))
+    library = Library("lib", store)
+    removed = await library.add_document(_metadata("removed"), b"pdf")
+    await library.catalog()
+    store.snapshot_writes = 0
+
+    async with library.batch_catalog_updates():
+        documents = [
+            await library.add_document(_metadata(f"t{i}"), b"pdf") for i in range(5)
+        ]
+        await documents[0].write_metadata(
+            _metadata("updated").copy(update={"id": documents[0].id})
+        )
+        await library.remove_document(removed.id)
+        assert store.snapshot_writes == 0
+    assert store.snapshot_writes == 1
+
+    catalog = await _fresh_catalog(store)
+    assert sorted(metadata.title for metadata in catalog.values()) == [
+        "t1", "t2", "t3", "t4", "updated"
+    ]
+
+
+async def test_superseded_index_versions_are_removed(tmp_path):
+    store = LocalStorage(str(tmp_path / "store"))
+    local_index_path = str(tmp_path / "indexes")
+    library = Library("lib", store, local_index_path)
+
+    first = await library.publish_index({"index.faiss": b"first"})
+    first_folder = await library.download_index_files("index.faiss")
+    assert first_folder == os.path.join(local_index_path, "lib", first)
+
+    second = await library.publish_index({"index.faiss": b"second"})
+    second_folder = await library.download_index_files("index.faiss")
+    with open(os.path.join(second_folder, "index.faiss"), "rb") as f:
+        assert f.read() == b"second"
+    assert os.listdir(os.path.join(local_index_path, "lib")) == [second]
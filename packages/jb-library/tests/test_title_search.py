@@ -0,0 +1,26 @@
+from jugalbandi.library import TitleSearchIndex
+
+
+def test_search_orders_by_score():
+    index = TitleSearchIndex(
+        [
+            "The Motor Vehicles Act, 1988",
+            "The Indian Penal Code, 1860",
+            "The Karnataka Motor Vehicles Taxation Act, 1957",
+        ]
+    )
+    results = index.search("motor vehicles act", 2)
+    assert [title for title, _ in results] == [
+        "The Motor Vehicles Act, 1988",
+        "The Karnataka Motor Vehicles Taxation Act, 1957",
+    ]
+    assert results[0][1] >= results[1][1] > 0
+    # misspelt
+    assert index.search("indain penal cod", 1)[0][0] == "The Indian Penal Code, 1860"
+
+
+def test_search_limits():
+    index = TitleSearchIndex(["The Stamp Act", "The Indian Penal Code"])
+    assert len(index.search("stamp", 5)) == 2
+    assert index.search("stamp", 0) == []
+    assert TitleSearchIndex([]).search("stamp") == []
@@ -30,8 +30,9 @@ class GPTIndexer(Indexer):
             index = VectorStoreIndex.from_documents(documents)
             index_content = index.storage_context.to_dict()
             index_str = json.dumps(index_content)
-            await document_collection.write_index_file("gpt-index", "index.json",
-                                                       bytes(index_str, "utf-8"))
+            await document_collection.publish_index(
+                "gpt-index", {"index.json": bytes(index_str, "utf-8")}
+            )
         except openai.error.RateLimitError as e:
             raise ServiceUnavailableException(
                 f"OpenAI API request exceeded rate limit: {e}"
@@ -54,10 +55,11 @@ class LangchainIndexer(Indexer):
     async def index(self, doc_collection: DocumentCollection):
         source_chunks = []
         counter = 0
-        async for filename in doc_collection.list_files():
+        filenames = [filename async for filename in doc_collection.list_files()]
+        public_text_urls = await doc_collection.public_urls(filenames,
+                                                            DocumentFormat.TEXT)
+        for filename, public_text_url in zip(filenames, public_text_urls):
             content = await doc_collection.read_file(filename, DocumentFormat.TEXT)
-            public_text_url = await doc_collection.public_url(filename,
-                                                              DocumentFormat.TEXT)
             content = content.decode('utf-8')
             content = content.replace("\\n", "\n")
             for chunk in self.splitter.split_text(content):
@@ -93,12 +95,10 @@ class LangchainIndexer(Indexer):
             # save in temporary directory
             search_index.save_local(temp_dir)
 
-            async with aiofiles.open(f"{temp_dir}/index.pkl", "rb") as f:
-                content = await f.read()
-                await doc_collection.write_index_file("langchain", "index.pkl",
-                                                      content)
+            index_files = {}
+            for filename in ["index.pkl", "index.faiss"]:
+                async with aiofiles.open(f"{temp_dir}/{filename}", "rb") as f:
+                    index_files[filename] = await f.read()
 
-            async with aiofiles.open(f"{temp_dir}/index.faiss", "rb") as f:
-                content = await f.read()
-                await doc_collection.write_index_file("langchain", "index.faiss",
-                                                      content)
+        # both files become visible to readers together
+        await doc_collection.publish_index("langchain", index_files)
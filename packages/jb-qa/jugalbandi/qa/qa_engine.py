@@ -8,7 +8,7 @@ from jugalbandi.speech_processor import SpeechProcessor
 from jugalbandi.translator import Translator
 from jugalbandi.audio_converter import convert_to_wav_with_ffmpeg
 from jugalbandi.core.language import Language
-from jugalbandi.core.media_format import MediaFormat
+from jugalbandi.core.media_format import AudioFormat, MediaFormat
 from jugalbandi.core.errors import IncorrectInputException
 from .query_with_gptindex import querying_with_gptindex
 from .query_with_langchain import (
@@ -50,11 +50,13 @@ class GPTIndexQAEngine:
         self,
         document_collection: DocumentCollection,
         speech_processor: SpeechProcessor,
-        translator: Translator
+        translator: Translator,
+        audio_format: AudioFormat = AudioFormat.MP3,
     ):
         self.document_collection = document_collection
         self.speech_processor = speech_processor
         self.translator = translator
+        self.audio_format = audio_format
 
     async def query(
         self,
@@ -94,9 +96,10 @@ class GPTIndexQAEngine:
 
         if is_voice:
             audio_content = await self.speech_processor.text_to_speech(
-                answer, input_language)
+                answer, input_language, output_format=self.audio_format)
             time_stamp = time.strftime("%Y%m%d-%H%M%S")
-            filename = "output_audio_files/audio-output-" + time_stamp + ".mp3"
+            filename = ("output_audio_files/audio-output-" + time_stamp + "."
+                        + self.audio_format.value)
             await self.document_collection.write_audio_file(filename, audio_content)
             audio_output_url = await self.document_collection.audio_file_public_url(
                 filename)
@@ -115,11 +118,13 @@ class LangchainQAEngine:
         speech_processor: SpeechProcessor,
         translator: Translator,
         model: LangchainQAModel,
+        audio_format: AudioFormat = AudioFormat.MP3,
     ):
         self.document_collection = document_collection
         self.speech_processor = speech_processor
         self.translator = translator
         self.model = model
+        self.audio_format = audio_format
         self.models_dict = {
             LangchainQAModel.GPT3: lambda a, b, c, d, e:
             querying_with_langchain(a, b),
@@ -172,9 +177,10 @@ class LangchainQAEngine:
 
         if is_voice:
             audio_content = await self.speech_processor.text_to_speech(
-                answer, input_language)
+                answer, input_language, output_format=self.audio_format)
             time_stamp = time.strftime("%Y%m%d-%H%M%S")
-            filename = "output_audio_files/audio-output-" + time_stamp + ".mp3"
+            filename = ("output_audio_files/audio-output-" + time_stamp + "."
+                        + self.audio_format.value)
             await self.document_collection.write_audio_file(filename, audio_content)
             audio_output_url = await self.document_collection.audio_file_public_url(
                 filename)
@@ -1,16 +1,25 @@
+import os
 import openai
 import json
+from cachetools import LRUCache, cached
 from llama_index import load_index_from_storage, StorageContext
 from jugalbandi.core.errors import InternalServerException, ServiceUnavailableException
 from jugalbandi.document_collection import DocumentCollection
 
 
-async def querying_with_gptindex(document_collection: DocumentCollection, query: str):
-    index_content = await document_collection.read_index_file("gpt-index", "index.json")
-    index_content = index_content.decode('utf-8')
-    index_dict = json.loads(index_content)
+@cached(cache=LRUCache(maxsize=16))
+def _load_index(index_folder_path: str):
+    # index folders are versioned and never change once published
+    with open(os.path.join(index_folder_path, "index.json"), "r") as f:
+        index_dict = json.load(f)
     storage_context = StorageContext.from_dict(index_dict)
-    index = load_index_from_storage(storage_context=storage_context)
+    return load_index_from_storage(storage_context=storage_context)
+
+
+async def querying_with_gptindex(document_collection: DocumentCollection, query: str):
+    index_folder_path = await document_collection.materialize_index("gpt-index",
+                                                                    "index.json")
+    index = _load_index(index_folder_path)
     query_engine = index.as_query_engine()
     try:
         response = query_engine.query(query)
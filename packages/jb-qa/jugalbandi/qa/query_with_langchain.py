@@ -1,4 +1,5 @@
 from typing import List
+from cachetools import LRUCache, cached
 import openai
 from langchain.chains.qa_with_sources import load_qa_with_sources_chain
 from langchain.embeddings.openai import OpenAIEmbeddings
@@ -17,6 +18,12 @@ from jugalbandi.core.errors import (
 from jugalbandi.document_collection import DocumentCollection
 
 
+@cached(cache=LRUCache(maxsize=16))
+def _load_search_index(index_folder_path: str) -> FAISS:
+    # index folders are versioned and never change once published
+    return FAISS.load_local(index_folder_path, OpenAIEmbeddings())  # type: ignore
+
+
 async def rephrased_question(user_query: str):
     template = (
         """Write the same question as user input and """
@@ -60,12 +67,11 @@ async def latent_semantic_analysis(response: str, documents: List):
 
 
 async def querying_with_langchain(document_collection: DocumentCollection, query: str):
-    await document_collection.download_index_files("langchain", "index.faiss",
-                                                   "index.pkl")
-    index_folder_path = document_collection.local_index_folder("langchain")
+    index_folder_path = await document_collection.materialize_index(
+        "langchain", "index.faiss", "index.pkl"
+    )
     try:
-        search_index = FAISS.load_local(index_folder_path,
-                                        OpenAIEmbeddings())  # type: ignore
+        search_index = _load_search_index(index_folder_path)
         chain = load_qa_with_sources_chain(
             OpenAI(temperature=0), chain_type="map_reduce"  # type: ignore
         )
@@ -100,12 +106,11 @@ async def querying_with_langchain(document_collection: DocumentCollection, query
 async def querying_with_langchain_gpt4(document_collection: DocumentCollection,
                                        query: str,
                                        prompt: str):
-    await document_collection.download_index_files("langchain", "index.faiss",
-                                                   "index.pkl")
-    index_folder_path = document_collection.local_index_folder("langchain")
+    index_folder_path = await document_collection.materialize_index(
+        "langchain", "index.faiss", "index.pkl"
+    )
     try:
-        search_index = FAISS.load_local(index_folder_path,
-                                        OpenAIEmbeddings())  # type: ignore
+        search_index = _load_search_index(index_folder_path)
         documents = search_index.similarity_search(query, k=5)
         contexts = [document.page_content for document in documents]
         augmented_query = augmented_query = (
@@ -149,9 +154,9 @@ async def querying_with_langchain_gpt3_5(document_collection: DocumentCollection
                                          prompt: str,
                                          source_text_filtering: bool,
                                          model_size: str):
-    await document_collection.download_index_files("langchain", "index.faiss",
-                                                   "index.pkl")
-    index_folder_path = document_collection.local_index_folder("langchain")
+    index_folder_path = await document_collection.materialize_index(
+        "langchain", "index.faiss", "index.pkl"
+    )
 
     if model_size == "16k":
         model_name = "gpt-3.5-turbo-16k"
@@ -159,8 +164,7 @@ async def querying_with_langchain_gpt3_5(document_collection: DocumentCollection
         model_name = "gpt-3.5-turbo"
 
     try:
-        search_index = FAISS.load_local(index_folder_path,
-                                        OpenAIEmbeddings())  # type: ignore
+        search_index = _load_search_index(index_folder_path)
         documents = search_index.similarity_search(query, k=5)
         if prompt != "":
             system_rules = prompt
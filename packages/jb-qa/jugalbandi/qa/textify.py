@@ -1,4 +1,5 @@
 import re
+from typing import Dict
 from jugalbandi.document_collection import DocumentCollection, DocumentFormat
 import fitz
 import docx2txt
@@ -20,7 +21,7 @@ def pdf_to_text_converter(pdf_file_path):
 
 
 class TextConverter:
-    async def textify(self, filename: str, doc_collection: DocumentCollection) -> str:
+    def _to_text(self, filename: str, doc_collection: DocumentCollection) -> str:
         file_path = doc_collection.local_file_path(filename)
         if filename.endswith(".pdf"):
             content = pdf_to_text_converter(file_path)
@@ -34,7 +35,30 @@ class TextConverter:
         regex = r"(?<!\n\s)\n(?!\n| \n)"
         content = re.sub(regex, "", content)
 
-        content = repr(content)[1:-1]
-        await doc_collection.write_file(filename, content, DocumentFormat.TEXT)
+        return repr(content)[1:-1]
+
+    async def textify(self, filename: str, doc_collection: DocumentCollection) -> str:
+        content = self._to_text(filename, doc_collection)
+        await doc_collection.write_file(
+            filename, content.encode("utf-8"), DocumentFormat.TEXT
+        )
         await doc_collection.public_url(filename, DocumentFormat.TEXT)
         return content
+
+    async def textify_collection(
+        self, doc_collection: DocumentCollection
+    ) -> Dict[str, str]:
+        """Text of every document, written with a single manifest update"""
+        contents = {
+            filename: self._to_text(filename, doc_collection)
+            async for filename in doc_collection.list_files()
+        }
+        await doc_collection.write_files(
+            {
+                filename: content.encode("utf-8")
+                for filename, content in contents.items()
+            },
+            DocumentFormat.TEXT,
+        )
+        await doc_collection.public_urls(list(contents), DocumentFormat.TEXT)
+        return contents
@@ -69,8 +69,7 @@ async def test_langchain_indexing(doc_repo: DocumentRepository,
     doc_collection = doc_repo.new_collection()
     async with aiofiles.open(file_path, "rb") as file:
         await doc_collection.init_from_files([DocumentSourceFile("testing.pdf", file)])
-    async for filename in doc_collection.list_files():
-        await text_converter.textify(filename, doc_collection)
+    await text_converter.textify_collection(doc_collection)
     try:
         await langchain_indexer.index(doc_collection)
     except Exception as e:
@@ -5,6 +5,7 @@ from .speech_processor import (
     AzureSpeechProcessor,
     CompositeSpeechProcessor,
 )
+from .long_audio import LongAudioSpeechProcessor
 
 __all__ = [
     "SpeechProcessor",
@@ -12,4 +13,5 @@ __all__ = [
     "GoogleSpeechProcessor",
     "AzureSpeechProcessor",
     "CompositeSpeechProcessor",
+    "LongAudioSpeechProcessor",
 ]
@@ -0,0 +1,156 @@
+import asyncio
+import io
+from typing import List, Tuple
+import wave
+import numpy as np
+from jugalbandi.core import AudioFormat, Language
+from jugalbandi.audio_converter import pcm_to_wav
+from .speech_processor import SpeechProcessor
+
+
+def _frame_energies(samples: np.ndarray, frame_size: int) -> np.ndarray:
+    frame_count = len(samples) // frame_size
+    frames = samples[: frame_count * frame_size].astype(np.float64)
+    frames = frames.reshape(frame_count, frame_size)
+    rms = np.sqrt(np.mean(frames**2, axis=1))
+    return 20 * np.log10(np.maximum(rms, 1.0))
+
+
+def voiced_frames(
+    samples: np.ndarray,
+    frame_size: int,
+    threshold_db: float = 12.0,
+    min_energy_db: float = 30.0,
+) -> np.ndarray:
+    """
+    Energy based voice activity: a frame is voiced when it is ``threshold_db``
+    above the noise floor (10th percentile of the frame energies), or within
+    ``threshold_db`` of the loudest frame for audio without pauses, and above
+    ``min_energy_db`` (relative to an int16 sample value of 1).
+    """
+    energies = _frame_energies(samples, frame_size)
+    if len(energies) == 0:
+        return np.zeros(0, dtype=bool)
+    noise_floor = np.percentile(energies, 10)
+    threshold = min(noise_floor + threshold_db, energies.max() - threshold_db)
+    return energies >= max(threshold, min_energy_db)
+
+
+def split_on_silence(
+    samples: np.ndarray,
+    sample_rate: int,
+    max_chunk_seconds: float = 45.0,
+    min_chunk_seconds: float = 10.0,
+    min_silence_seconds: float = 0.3,
+    frame_seconds: float = 0.03,
+) -> List[Tuple[int, int]]:
+    """
+    Splits ``samples`` into (start, end) sample ranges no longer than
+    ``max_chunk_seconds``. Cuts are made in the middle of the latest pause that
+    keeps the chunk under the limit; audio without pauses is cut hard. Chunks
+    without any voiced frame are dropped.
+    """
+    frame_size = int(sample_rate * frame_seconds)
+    voiced = voiced_frames(samples, frame_size)
+    frame_count = len(voiced)
+    if frame_count == 0:
+        return []
+
+    # middle frame of every silent run that is long enough to cut at
+    min_silence_frames = max(1, int(min_silence_seconds / frame_seconds))
+    padded = np.concatenate(([True], voiced, [True]))
+    edges = np.flatnonzero(np.diff(padded.astype(np.int8)))
+    run_starts, run_ends = edges[::2], edges[1::2]
+    long_runs = (run_ends - run_starts) >= min_silence_frames
+    cut_points = (run_starts[long_runs] + run_ends[long_runs]) // 2
+
+    max_frames = max(1, int(max_chunk_seconds / frame_seconds))
+    min_frames = int(min_chunk_seconds / frame_seconds)
+    chunks = []
+    start = 0
+    while start < frame_count:
+        end = frame_count
+        if frame_count - start > max_frames:
+            candidates = cut_points[
+                (cut_points >= start + min_frames) & (cut_points <= start + max_frames)
+            ]
+            end = int(candidates[-1]) if len(candidates) else start + max_frames
+        if voiced[start:end].any():
+            chunks.append((start * frame_size, min(end * frame_size, len(samples))))
+        start = end
+    if chunks:
+        # keep the samples after the last full frame
+        last_start, last_end = chunks[-1]
+        if last_end == frame_count * frame_size:
+            chunks[-1] = (last_start, len(samples))
+    return chunks
+
+
+class LongAudioSpeechProcessor(SpeechProcessor):
+    """
+    Speech to text for audio longer than the backends accept in one request.
+    The 16 kHz PCM wav is split at pauses, the chunks are recognized
+    concurrently by ``speech_processor`` and the transcripts joined in order.
+    """
+
+    def __init__(
+        self,
+        speech_processor: SpeechProcessor,
+        max_chunk_seconds: float = 45.0,
+        min_chunk_seconds: float = 10.0,
+        max_concurrency: int = 4,
+    ):
+        self.speech_processor = speech_processor
+        self.max_chunk_seconds = max_chunk_seconds
+        self.min_chunk_seconds = min_chunk_seconds
+        self.max_concurrency = max_concurrency
+
+    async def speech_to_text(self, wav_data: bytes, input_language: Language) -> str:
+        with wave.open(io.BytesIO(wav_data), "rb") as reader:
+            sample_rate = reader.getframerate()
+            channels = reader.getnchannels()
+            sample_width = reader.getsampwidth()
+            frame_count = reader.getnframes()
+            if (
+                frame_count <= self.max_chunk_seconds * sample_rate
+                or channels != 1
+                or sample_width != 2
+            ):
+                return await self.speech_processor.speech_to_text(
+                    wav_data, input_language
+                )
+            pcm_data = reader.readframes(frame_count)
+
+        samples = np.frombuffer(pcm_data, dtype=np.int16)
+        chunks = split_on_silence(
+            samples,
+            sample_rate,
+            max_chunk_seconds=self.max_chunk_seconds,
+            min_chunk_seconds=self.min_chunk_seconds,
+        )
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+
+        async def _recognize(start: int, end: int) -> str:
+            chunk = pcm_to_wav(samples[start:end].tobytes(), sample_rate=sample_rate)
+            async with semaphore:
+                return await self.speech_processor.speech_to_text(
+                    chunk, input_language
+                )
+
+        transcripts = await asyncio.gather(
+            *[_recognize(start, end) for start, end in chunks]
+        )
+        return " ".join(
+            transcript.strip() for transcript in transcripts if transcript.strip()
+        )
+
+    async def text_to_speech(
+        self,
+        text: str,
+        input_language: Language,
+        *,
+        output_format: AudioFormat = AudioFormat.MP3,
+    ) -> bytes:
+        return await self.speech_processor.text_to_speech(
+            text, input_language, output_format=output_format
+        )
@@ -1,16 +1,22 @@
+import asyncio
 import base64
-import httpx
+from concurrent.futures import ThreadPoolExecutor
+import io
 import os
-import tempfile
+import threading
+from typing import List, Optional, Tuple
+import wave
 from jugalbandi.core import (
+    AdaptiveRouter,
+    AudioFormat,
     Language,
-    InternalServerException,
+    BhashiniClient,
 )
-from jugalbandi.audio_converter.converter import convert_wav_bytes_to_mp3_bytes
+from jugalbandi.core.errors import InternalServerException, ServiceUnavailableException
+from jugalbandi.audio_converter import encode_wav
 from google.cloud import texttospeech, speech
 import azure.cognitiveservices.speech as speechsdk
 from abc import ABC, abstractmethod
-import json
 
 
 class SpeechProcessor(ABC):
@@ -19,80 +25,32 @@ class SpeechProcessor(ABC):
         pass
 
     @abstractmethod
-    async def text_to_speech(self, text: str, input_language: Language) -> bytes:
+    async def text_to_speech(self,
+                             text: str,
+                             input_language: Language,
+                             *,
+                             output_format: AudioFormat = AudioFormat.MP3) -> bytes:
         pass
 
 
 class DhruvaSpeechProcessor(SpeechProcessor):
     def __init__(self):
-        self.bhashini_user_id = os.getenv('BHASHINI_USER_ID')
-        self.bhashini_api_key = os.getenv('BHASHINI_API_KEY')
-        self.bhashini_pipleline_id = os.getenv('BHASHINI_PIPELINE_ID')
-        self.bhashini_inference_url = "https://dhruva-api.bhashini.gov.in/services/inference/pipeline"
-
-    async def perform_bhashini_config_call(self,
-                                           task: str,
-                                           source_language: str,
-                                           target_language: str | None = None):
-        url = "https://meity-auth.ulcacontrib.org/ulca/apis/v0/model/getModelsPipeline"
-        if task in ['asr', 'tts']:
-            payload = json.dumps({
-                "pipelineTasks": [
-                    {
-                        "taskType": task,
-                        "config": {
-                            "language": {
-                                "sourceLanguage": source_language
-                            }
-                        }
-                    }
-                ],
-                "pipelineRequestConfig": {
-                    "pipelineId": "64392f96daac500b55c543cd"
-                }
-            })
-        else:
-            payload = json.dumps({
-                "pipelineTasks": [
-                    {
-                        "taskType": "translation",
-                        "config": {
-                            "language": {
-                                "sourceLanguage": source_language,
-                                "targetLanguage": target_language
-                            }
-                        }
-                    }
-                ],
-                "pipelineRequestConfig": {
-                    "pipelineId": self.bhashini_pipleline_id
-                }
-            })
-        headers = {
-            'userID': self.bhashini_user_id,
-            'ulcaApiKey': self.bhashini_api_key,
-            'Content-Type': 'application/json'
-        }
-
-        async with httpx.AsyncClient() as client:
-            response = await client.post(url, headers=headers, data=payload)  # type: ignore
-
-        return response.json()
+        self.bhashini_client = BhashiniClient()
 
     async def speech_to_text(self, wav_data: bytes, input_language: Language) -> str:
-        bhashini_asr_config = await self.perform_bhashini_config_call(
+        bhashini_asr_config = await self.bhashini_client.pipeline_config(
             task='asr', source_language=input_language.name.lower())
         encoded_string = base64.b64encode(wav_data).decode("ascii", "ignore")
 
-        payload = json.dumps({
+        payload = {
             "pipelineTasks": [
                 {
                     "taskType": "asr",
                     "config": {
                         "language": {
-                            "sourceLanguage": bhashini_asr_config['languages'][0]['sourceLanguage'],
+                            "sourceLanguage": bhashini_asr_config.source_language,
                         },
-                        "serviceId": bhashini_asr_config['pipelineResponseConfig'][0]['config'][0]['serviceId'],
+                        "serviceId": bhashini_asr_config.service_id,
                         "audioFormat": "wav",
                         "samplingRate": 16000
                     }
@@ -104,42 +62,29 @@ class DhruvaSpeechProcessor(SpeechProcessor):
                         "audioContent": encoded_string}
                 ]
             }
-        })
-        headers = {
-            'Accept': '*/*',
-            'User-Agent': 'Thunder Client (https://www.thunderclient.com)',
-            bhashini_asr_config['pipelineInferenceAPIEndPoint']['inferenceApiKey']['name']:
-                bhashini_asr_config['pipelineInferenceAPIEndPoint']['inferenceApiKey']['value'],
-            'Content-Type': 'application/json'
         }
+        response = await self.bhashini_client.infer(bhashini_asr_config, payload)
 
-        async with httpx.AsyncClient() as client:
-            response = await client.post(url=self.bhashini_inference_url,
-                                         headers=headers,
-                                         data=payload)  # type: ignore
-        if response.status_code != 200:
-            raise InternalServerException(
-                f"Request failed with response.text: {response.text} and "
-                  f"status_code: {response.status_code}")
-
-        return response.json()['pipelineResponse'][0]['output'][0]['source']
+        return response['pipelineResponse'][0]['output'][0]['source']
 
     async def text_to_speech(self,
                              text: str,
                              input_language: Language,
-                             gender='female') -> bytes:
-        bhashini_tts_config = await self.perform_bhashini_config_call(
+                             gender='female',
+                             *,
+                             output_format: AudioFormat = AudioFormat.MP3) -> bytes:
+        bhashini_tts_config = await self.bhashini_client.pipeline_config(
             task='tts', source_language=input_language.name.lower())
 
-        payload = json.dumps({
+        payload = {
             "pipelineTasks": [
                 {
                     "taskType": "tts",
                     "config": {
                         "language": {
-                            "sourceLanguage": bhashini_tts_config['languages'][0]['sourceLanguage']
+                            "sourceLanguage": bhashini_tts_config.source_language
                         },
-                        "serviceId": bhashini_tts_config['pipelineResponseConfig'][0]['config'][0]['serviceId'],
+                        "serviceId": bhashini_tts_config.service_id,
                         "gender": gender,
                         "samplingRate": 8000
                     }
@@ -152,28 +97,13 @@ class DhruvaSpeechProcessor(SpeechProcessor):
                     }
                 ]
             }
-        })
-        headers = {
-            'Accept': '*/*',
-            'User-Agent': 'Thunder Client (https://www.thunderclient.com)',
-            bhashini_tts_config['pipelineInferenceAPIEndPoint']['inferenceApiKey']['name']:
-                bhashini_tts_config['pipelineInferenceAPIEndPoint']['inferenceApiKey']['value'],
-            'Content-Type': 'application/json'
         }
+        response = await self.bhashini_client.infer(bhashini_tts_config, payload)
 
-        async with httpx.AsyncClient() as client:
-            response = await client.post(url=self.bhashini_inference_url,
-                                         headers=headers,
-                                         data=payload)  # type: ignore
-        if response.status_code != 200:
-            raise InternalServerException(
-                f"Request failed with response.text: {response.text} and "
-                  f"status_code: {response.status_code}")
-
-        audio_content = response.json()['pipelineResponse'][0]['audio'][0]['audioContent']
+        audio_content = response['pipelineResponse'][0]['audio'][0]['audioContent']
         audio_content = base64.b64decode(audio_content)
-        new_audio_content = convert_wav_bytes_to_mp3_bytes(audio_content)
-        return new_audio_content
+        # encoded at the 8 kHz Dhruva returns, upsampling only grows the file
+        return await encode_wav(audio_content, output_format)
 
 
 class GoogleSpeechProcessor(SpeechProcessor):
@@ -204,35 +134,61 @@ class GoogleSpeechProcessor(SpeechProcessor):
             "ES" : "es-ES",
             "TR" : "tr-TR"
         }
+        self.audio_encodings = {
+            AudioFormat.MP3: texttospeech.AudioEncoding.MP3,
+            AudioFormat.OGG_OPUS: texttospeech.AudioEncoding.OGG_OPUS,
+            AudioFormat.WAV: texttospeech.AudioEncoding.LINEAR16,
+        }
+        self._speech_client: Optional[speech.SpeechAsyncClient] = None
+        self._tts_client: Optional[texttospeech.TextToSpeechAsyncClient] = None
+
+    @property
+    def speech_client(self) -> speech.SpeechAsyncClient:
+        if self._speech_client is None:
+            self._speech_client = speech.SpeechAsyncClient()
+        return self._speech_client
+
+    @property
+    def tts_client(self) -> texttospeech.TextToSpeechAsyncClient:
+        if self._tts_client is None:
+            self._tts_client = texttospeech.TextToSpeechAsyncClient()
+        return self._tts_client
 
     async def speech_to_text(self, wav_data: bytes, input_language: Language) -> str:
         language_code = self.language_dict[input_language.name]
         if isinstance(language_code, list):
             language_code = language_code[0]
-        client = speech.SpeechAsyncClient()
         audio = speech.RecognitionAudio(content=wav_data)
         config = speech.RecognitionConfig(
             encoding=speech.RecognitionConfig.AudioEncoding.LINEAR16,
             sample_rate_hertz=16000,
             language_code=language_code,
         )
-        response = await client.recognize(config=config, audio=audio)
-        return response.results[0].alternatives[0].transcript
+        response = await self.speech_client.recognize(config=config, audio=audio)
+        # every pause in the audio starts a new result
+        return " ".join(
+            result.alternatives[0].transcript.strip()
+            for result in response.results
+            if result.alternatives
+        )
 
-    async def text_to_speech(self, text: str, input_language: Language) -> bytes:
+    async def text_to_speech(self,
+                             text: str,
+                             input_language: Language,
+                             *,
+                             output_format: AudioFormat = AudioFormat.MP3) -> bytes:
         language_code = self.language_dict[input_language.name]
         if isinstance(language_code, list):
             language_code = language_code[1]
-        client = texttospeech.TextToSpeechAsyncClient()
         input_text = texttospeech.SynthesisInput(text=text)
         voice = texttospeech.VoiceSelectionParams(
             language_code=language_code,
             ssml_gender=texttospeech.SsmlVoiceGender.FEMALE,
         )
         audio_config = texttospeech.AudioConfig(
-            audio_encoding=texttospeech.AudioEncoding.MP3
+            audio_encoding=self.audio_encodings[output_format]
         )
-        response = await client.synthesize_speech(
+        response = await self.tts_client.synthesize_speech(
             request={"input": input_text, "voice": voice, "audio_config": audio_config}
         )
         audio_content = response.audio_content
@@ -240,6 +196,13 @@ class GoogleSpeechProcessor(SpeechProcessor):
 
 
 class AzureSpeechProcessor(SpeechProcessor):
+    # a recognition session gets this long, plus the audio duration times the
+    # factor, before it is stopped and its worker thread is freed
+    recognition_timeout = 15.0
+    recognition_timeout_factor = 2.0
+    # the duration assumed for audio other than plain PCM wav
+    unknown_audio_duration = 300.0
+
     def __init__(self):
         self.language_dict = {
             "EN" : ["en-US", "en-US-JennyNeural"],
@@ -267,74 +230,158 @@ class AzureSpeechProcessor(SpeechProcessor):
             "ES" : ["es-ES", "	es-ES-ElviraNeural"],
             "TR" : ["tr-TR", "tr-TR-EmelNeural"]
         }
-        self.speech_config = speechsdk.SpeechConfig(subscription=os.getenv('AZURE_SPEECH_KEY'),
-                                                    region=os.getenv('AZURE_SPEECH_REGION'))
+        self.output_formats = {
+            AudioFormat.MP3: speechsdk.SpeechSynthesisOutputFormat.Audio16Khz32KBitRateMonoMp3,
+            AudioFormat.OGG_OPUS: speechsdk.SpeechSynthesisOutputFormat.Ogg16Khz16BitMonoOpus,
+            AudioFormat.WAV: speechsdk.SpeechSynthesisOutputFormat.Riff16Khz16BitMonoPcm,
+        }
+        self.subscription = os.getenv('AZURE_SPEECH_KEY')
+        self.region = os.getenv('AZURE_SPEECH_REGION')
+        # the speech SDK only offers blocking futures, so calls run on a bounded
+        # pool instead of the event loop
+        self.executor = ThreadPoolExecutor(
+            max_workers=int(os.getenv('AZURE_SPEECH_MAX_WORKERS', '8')),
+            thread_name_prefix='azure-speech',
+        )
 
-    async def speech_to_text(self, wav_data: bytes, input_language: Language) -> str:
-        language_code = self.language_dict[input_language.name][0]
-        temp_wav_file = tempfile.NamedTemporaryFile()
-        temp_wav_file.write(wav_data)
-        audio_config = speechsdk.AudioConfig(filename=temp_wav_file.name)
-        speech_recognizer = speechsdk.SpeechRecognizer(speech_config=self.speech_config,
+    def _speech_config(self) -> speechsdk.SpeechConfig:
+        # a fresh config per call, concurrent calls use different voices
+        return speechsdk.SpeechConfig(subscription=self.subscription,
+                                      region=self.region)
+
+    async def _run(self, func, *args):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, func, *args)
+
+    @staticmethod
+    def _audio_input(
+        wav_data: bytes,
+    ) -> Tuple[speechsdk.audio.PushAudioInputStream, Optional[float]]:
+        """The stream to recognize and its duration in seconds, if known"""
+        duration = None
+        try:
+            with wave.open(io.BytesIO(wav_data)) as wav_file:
+                stream_format = speechsdk.audio.AudioStreamFormat(
+                    samples_per_second=wav_file.getframerate(),
+                    bits_per_sample=wav_file.getsampwidth() * 8,
+                    channels=wav_file.getnchannels(),
+                )
+                frames = wav_file.readframes(wav_file.getnframes())
+                duration = wav_file.getnframes() / wav_file.getframerate()
+        except (wave.Error, EOFError):
+            # not a plain PCM wav, hand the bytes over as they are
+            stream_format, frames = None, wav_data
+        if stream_format is None:
+            stream = speechsdk.audio.PushAudioInputStream()
+        else:
+            stream = speechsdk.audio.PushAudioInputStream(stream_format=stream_format)
+        stream.write(frames)
+        stream.close()
+        return stream, duration
+
+    def _recognize(self, wav_data: bytes, language_code: str) -> str:
+        stream, duration = self._audio_input(wav_data)
+        if duration is None:
+            duration = self.unknown_audio_duration
+        timeout = self.recognition_timeout + self.recognition_timeout_factor * duration
+        audio_config = speechsdk.audio.AudioConfig(stream=stream)
+        speech_recognizer = speechsdk.SpeechRecognizer(speech_config=self._speech_config(),
                                                        audio_config=audio_config,
                                                        language=language_code)
-        result = speech_recognizer.recognize_once_async().get()
-        if temp_wav_file:
-            temp_wav_file.close()
+        # recognize_once stops at the first pause, recognize continuously until
+        # the pushed audio is exhausted
+        transcripts: List[str] = []
+        errors: List[str] = []
+        done = threading.Event()
+
+        def _recognized(event):
+            if event.result.reason == speechsdk.ResultReason.RecognizedSpeech:
+                transcripts.append(event.result.text)
+
+        def _canceled(event):
+            if event.cancellation_details.reason == speechsdk.CancellationReason.Error:
+                errors.append(event.cancellation_details.error_details)
+            done.set()
+
+        speech_recognizer.recognized.connect(_recognized)
+        speech_recognizer.canceled.connect(_canceled)
+        speech_recognizer.session_stopped.connect(lambda _: done.set())
+        speech_recognizer.start_continuous_recognition_async().get()
+        # neither session_stopped nor canceled may ever come, the thread would
+        # be lost to the pool
+        finished = done.wait(timeout)
+        speech_recognizer.stop_continuous_recognition()
+        if not finished:
+            raise ServiceUnavailableException(
+                f"Azure speech recognition did not finish within {timeout:g} seconds"
+            )
+        if errors:
+            raise InternalServerException(f"Azure speech recognition failed: {errors[0]}")
+        return " ".join(transcripts)
+
+    def _synthesize(self, text: str, voice_language_code: str, output_format: AudioFormat) -> bytes:
+        speech_config = self._speech_config()
+        speech_config.speech_synthesis_voice_name = voice_language_code
+        speech_config.set_speech_synthesis_output_format(self.output_formats[output_format])
+        # audio_config=None keeps the synthesized audio in memory
+        speech_synthesizer = speechsdk.SpeechSynthesizer(speech_config=speech_config,
+                                                         audio_config=None)
+        result = speech_synthesizer.speak_text_async(text).get()
+        if result.reason == speechsdk.ResultReason.Canceled:
+            raise InternalServerException(
+                f"Azure speech synthesis failed: {result.cancellation_details.error_details}"
+            )
+        return result.audio_data
 
-        return result.text
+    async def speech_to_text(self, wav_data: bytes, input_language: Language) -> str:
+        language_code = self.language_dict[input_language.name][0]
+        return await self._run(self._recognize, wav_data, language_code)
 
-    async def text_to_speech(self, text: str, input_language: Language) -> bytes:
+    async def text_to_speech(self,
+                             text: str,
+                             input_language: Language,
+                             *,
+                             output_format: AudioFormat = AudioFormat.MP3) -> bytes:
         voice_language_code = self.language_dict[input_language.name][1]
-        temp_output_file = tempfile.NamedTemporaryFile()
-        audio_config = speechsdk.audio.AudioOutputConfig(filename=temp_output_file.name)
-        self.speech_config.speech_synthesis_voice_name = voice_language_code
-        speech_synthesizer = speechsdk.SpeechSynthesizer(speech_config=self.speech_config,
-                                                         audio_config=audio_config)
-        speech_synthesis_result = speech_synthesizer.speak_text_async(text).get()
-        if temp_output_file:
-            temp_output_file.close()
-
-        return speech_synthesis_result.audio_data
+        return await self._run(self._synthesize, text, voice_language_code, output_format)
 
 
 class CompositeSpeechProcessor(SpeechProcessor):
-    def __init__(self, *speech_processors: SpeechProcessor):
+    def __init__(self, *speech_processors: SpeechProcessor, hedge: bool = False):
         self.speech_processors = speech_processors
         self.european_language_codes = ["EN", "AF", "AR", "ZH", "FR", "DE", "ID",
                                         "IT", "JA", "KO", "PT", "RU", "ES", "TR"]
         self.azure_not_supported_language_codes = ["OR", "PA"]
+        self.router = AdaptiveRouter(hedge=hedge)
 
-    async def speech_to_text(self, wav_data: bytes, input_language: Language) -> str:
-        excs = []
-        for speech_processor in self.speech_processors:
-            try:
-                if (input_language.name in self.european_language_codes and
-                        isinstance(speech_processor, DhruvaSpeechProcessor)):
-                    pass
-                elif (input_language.name in self.azure_not_supported_language_codes and
-                      isinstance(speech_processor, AzureSpeechProcessor)):
-                    pass
-                else:
-                    return await speech_processor.speech_to_text(wav_data, input_language)
-            except Exception as exc:
-                excs.append(exc)
-
-        raise ExceptionGroup("CompositeSpeechProcessor speech to text failed", excs)
-
-    async def text_to_speech(self, text: str, input_language: Language) -> bytes:
-        excs = []
+    def _supported_processors(self, input_language: Language) -> List[SpeechProcessor]:
+        supported = []
         for speech_processor in self.speech_processors:
-            try:
-                if (input_language.name in self.european_language_codes and
-                        isinstance(speech_processor, DhruvaSpeechProcessor)):
-                    pass
-                elif (input_language.name in self.azure_not_supported_language_codes and
-                      isinstance(speech_processor, AzureSpeechProcessor)):
-                    pass
-                else:
-                    return await speech_processor.text_to_speech(text, input_language)
-            except Exception as exc:
-                excs.append(exc)
-
-        raise ExceptionGroup("CompositeSpeechProcessor text to speech failed", excs)
+            if (input_language.name in self.european_language_codes and
+                    isinstance(speech_processor, DhruvaSpeechProcessor)):
+                continue
+            if (input_language.name in self.azure_not_supported_language_codes and
+                    isinstance(speech_processor, AzureSpeechProcessor)):
+                continue
+            supported.append(speech_processor)
+        return supported
+
+    async def speech_to_text(self, wav_data: bytes, input_language: Language) -> str:
+        return await self.router.call(
+            self._supported_processors(input_language),
+            lambda speech_processor: speech_processor.speech_to_text(
+                wav_data, input_language),
+            "CompositeSpeechProcessor speech to text failed",
+        )
+
+    async def text_to_speech(self,
+                             text: str,
+                             input_language: Language,
+                             *,
+                             output_format: AudioFormat = AudioFormat.MP3) -> bytes:
+        return await self.router.call(
+            self._supported_processors(input_language),
+            lambda speech_processor: speech_processor.text_to_speech(
+                text, input_language, output_format=output_format),
+            "CompositeSpeechProcessor text to speech failed",
+        )
@@ -0,0 +1,77 @@
+import io
+import wave
+import numpy as np
+import pytest
+from jugalbandi.audio_converter import pcm_to_wav
+from jugalbandi.core.language import Language
+from jugalbandi.speech_processor import LongAudioSpeechProcessor, SpeechProcessor
+from jugalbandi.speech_processor.long_audio import split_on_silence
+
+SAMPLE_RATE = 16000
+
+
+def _tone(seconds: float) -> np.ndarray:
+    t = np.arange(int(seconds * SAMPLE_RATE)) / SAMPLE_RATE
+    return (8000 * np.sin(2 * np.pi * 440 * t)).astype(np.int16)
+
+
+def _silence(seconds: float) -> np.ndarray:
+    return np.zeros(int(seconds * SAMPLE_RATE), dtype=np.int16)
+
+
+class DurationSpeechProcessor(SpeechProcessor):
+    def __init__(self):
+        self.durations = []
+
+    async def speech_to_text(self, wav_data, input_language):
+        with wave.open(io.BytesIO(wav_data), "rb") as reader:
+            duration = reader.getnframes() / reader.getframerate()
+        self.durations.append(duration)
+        return f"chunk{len(self.durations)}"
+
+    async def text_to_speech(self, text, input_language, *, output_format=None):
+        return b""
+
+
+def test_split_on_silence_cuts_at_pauses():
+    samples = np.concatenate(
+        [_tone(8), _silence(1), _tone(8), _silence(1), _tone(8), _silence(2)]
+    )
+    chunks = split_on_silence(
+        samples, SAMPLE_RATE, max_chunk_seconds=12, min_chunk_seconds=4
+    )
+    assert len(chunks) == 3
+    assert all(end - start <= 12 * SAMPLE_RATE for start, end in chunks)
+    # cuts fall inside the pauses
+    assert 8 * SAMPLE_RATE < chunks[0][1] < 9 * SAMPLE_RATE
+    assert 17 * SAMPLE_RATE < chunks[1][1] < 18 * SAMPLE_RATE
+
+
+def test_split_on_silence_hard_cuts_without_pauses():
+    chunks = split_on_silence(
+        _tone(25), SAMPLE_RATE, max_chunk_seconds=10, min_chunk_seconds=4
+    )
+    assert len(chunks) == 3
+    assert chunks[-1][1] == 25 * SAMPLE_RATE
+
+
+@pytest.mark.asyncio
+async def test_long_audio_transcripts_are_stitched_in_order():
+    samples = np.concatenate([_tone(8), _silence(1), _tone(8), _silence(1), _tone(8)])
+    recognizer = DurationSpeechProcessor()
+    processor = LongAudioSpeechProcessor(
+        recognizer, max_chunk_seconds=12, min_chunk_seconds=4
+    )
+    text = await processor.speech_to_text(
+        pcm_to_wav(samples.tobytes()), Language.EN
+    )
+    assert text == "chunk1 chunk2 chunk3"
+    assert all(duration <= 12 for duration in recognizer.durations)
+
+
+@pytest.mark.asyncio
+async def test_short_audio_is_not_split():
+    recognizer = DurationSpeechProcessor()
+    processor = LongAudioSpeechProcessor(recognizer)
+    await processor.speech_to_text(pcm_to_wav(_tone(5).tobytes()), Language.EN)
+    assert recognizer.durations == [5]
@@ -7,7 +7,10 @@ from jugalbandi.speech_processor import (
     AzureSpeechProcessor,
     CompositeSpeechProcessor,
 )
+from jugalbandi.audio_converter import pcm_to_wav
+from jugalbandi.core.errors import ServiceUnavailableException
 from jugalbandi.core.language import Language
+from jugalbandi.speech_processor import speech_processor
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -133,3 +136,42 @@ async def test_composite_text_to_speech(composite_speech_processor: CompositeSpe
         Language.EN,
     )
     assert audio_bytes is not None and isinstance(audio_bytes, bytes)
+
+
+class StuckRecognizer:
+    """A recognition session that never stops or gets canceled"""
+
+    class Signal:
+        def connect(self, callback):
+            pass
+
+    class Future:
+        def get(self):
+            pass
+
+    stopped = 0
+
+    def __init__(self, **kwargs):
+        self.recognized = self.Signal()
+        self.canceled = self.Signal()
+        self.session_stopped = self.Signal()
+
+    def start_continuous_recognition_async(self):
+        return self.Future()
+
+    def stop_continuous_recognition(self):
+        StuckRecognizer.stopped += 1
+
+
+@pytest.mark.asyncio
+async def test_azure_speech_to_text_times_out(monkeypatch):
+    monkeypatch.setattr(speech_processor.speechsdk, "SpeechRecognizer", StuckRecognizer)
+    processor = AzureSpeechProcessor()
+    monkeypatch.setattr(processor, "_speech_config", lambda: None)
+    processor.recognition_timeout = 0.1
+    processor.recognition_timeout_factor = 0.1
+    # one second of audio, the session gets 0.2 seconds
+    wav_data = pcm_to_wav(b"\x00\x00" * 16000)
+    with pytest.raises(ServiceUnavailableException):
+        await processor.speech_to_text(wav_data, Language.EN)
+    assert StuckRecognizer.stopped == 1
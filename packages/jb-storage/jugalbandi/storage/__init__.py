@@ -1,4 +1,24 @@
-from .storage import Storage, NullStorage, LocalStorage
+from .storage import Storage, NullStorage, LocalStorage, BulkResult
 from .google_storage import GoogleStorage
+from .caching_storage import CachingStorage
+from .materializer import (
+    IndexMaterializer,
+    IndexPointer,
+    combined_version,
+    publish_index,
+    read_index_pointer,
+)
 
-__all__ = ["Storage", "NullStorage", "LocalStorage", "GoogleStorage"]
+__all__ = [
+    "Storage",
+    "NullStorage",
+    "LocalStorage",
+    "GoogleStorage",
+    "CachingStorage",
+    "BulkResult",
+    "IndexMaterializer",
+    "IndexPointer",
+    "combined_version",
+    "publish_index",
+    "read_index_pointer",
+]
@@ -0,0 +1,314 @@
+import asyncio
+from collections import OrderedDict
+from dataclasses import dataclass
+import hashlib
+import itertools
+import logging
+import os
+import re
+import shutil
+import time
+from typing import AsyncIterator, Dict, Optional, Tuple
+import aiofiles
+from aiofiles import os as aiofiles_os
+from .storage import LocalStorage, Storage
+
+logger = logging.getLogger(__name__)
+
+# directories of the caches below local_dir, by process id
+CACHE_DIR_REGEX = re.compile(r"^storage-cache-(\d+)-\d+$")
+_cache_numbers = itertools.count()
+
+
+def _process_exists(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def _remove_stale_cache_dirs(local_dir: str):
+    """Cache directories of processes that ended without a shutdown"""
+    for entry in os.scandir(local_dir):
+        match = CACHE_DIR_REGEX.match(entry.name)
+        if match is None or not entry.is_dir():
+            continue
+        pid = int(match.group(1))
+        if pid != os.getpid() and not _process_exists(pid):
+            shutil.rmtree(entry.path, ignore_errors=True)
+
+
+@dataclass
+class _CacheEntry:
+    filename: str
+    size: int
+    version: Optional[str]
+    checked_at: float
+
+
+class _DiskCache:
+    """Size bounded LRU of file contents on local disk, keyed by remote path"""
+
+    def __init__(self, local_dir: str, max_bytes: int):
+        os.makedirs(local_dir, exist_ok=True)
+        _remove_stale_cache_dirs(local_dir)
+        # a private directory per cache, workers sharing local_dir do not
+        # overwrite each other's files. Left over by an earlier process with
+        # the same id, it is emptied first.
+        self.cache_dir = os.path.join(
+            local_dir, f"storage-cache-{os.getpid()}-{next(_cache_numbers)}"
+        )
+        shutil.rmtree(self.cache_dir, ignore_errors=True)
+        os.makedirs(self.cache_dir)
+        self.max_bytes = max_bytes
+        self.total_bytes = 0
+        self.entries: OrderedDict[str, _CacheEntry] = OrderedDict()
+        self.pending: Dict[str, asyncio.Task] = {}
+
+    def _filename(self, key: str) -> str:
+        return os.path.join(
+            self.cache_dir, hashlib.sha256(key.encode("utf-8")).hexdigest()
+        )
+
+    def get(self, key: str) -> Optional[_CacheEntry]:
+        entry = self.entries.get(key)
+        if entry is not None:
+            self.entries.move_to_end(key)
+        return entry
+
+    async def read(self, entry: _CacheEntry) -> bytes:
+        async with aiofiles.open(entry.filename, "rb") as f:
+            return await f.read()
+
+    async def put(self, key: str, content: bytes, version: Optional[str]):
+        if len(content) > self.max_bytes:
+            await self.invalidate(key)
+            return
+        filename = self._filename(key)
+        temp_filename = f"{filename}.{os.getpid()}.{id(content)}.tmp"
+        async with aiofiles.open(temp_filename, "wb") as f:
+            await f.write(content)
+        await aiofiles_os.replace(temp_filename, filename)
+
+        previous = self.entries.pop(key, None)
+        if previous is not None:
+            self.total_bytes -= previous.size
+        self.entries[key] = _CacheEntry(
+            filename, len(content), version, time.monotonic()
+        )
+        self.total_bytes += len(content)
+        await self._evict()
+
+    async def _evict(self):
+        while self.total_bytes > self.max_bytes and self.entries:
+            _, entry = self.entries.popitem(last=False)
+            self.total_bytes -= entry.size
+            await self._remove(entry.filename)
+
+    async def invalidate(self, key: str):
+        entry = self.entries.pop(key, None)
+        if entry is not None:
+            self.total_bytes -= entry.size
+            await self._remove(entry.filename)
+
+    async def invalidate_prefix(self, prefix: str):
+        for key in [key for key in self.entries if key.startswith(prefix)]:
+            await self.invalidate(key)
+
+    @staticmethod
+    async def _remove(filename: str):
+        try:
+            await aiofiles_os.remove(filename)
+        except FileNotFoundError:
+            pass
+
+    def close(self):
+        self.entries.clear()
+        self.total_bytes = 0
+        shutil.rmtree(self.cache_dir, ignore_errors=True)
+
+
+class CachingStorage(Storage):
+    """
+    Read-through cache in front of a remote store.
+
+    ``read_file`` is served from a size bounded LRU on local disk. Within
+    ``ttl`` seconds of the last check a cached file is returned as is; after
+    that it is revalidated against the object version (the GCS generation)
+    with a metadata call, or simply fetched again when the remote store has
+    no versions or ``revalidate`` is off. ``write_file`` writes through.
+
+    The cache lives in a directory of its own below ``local_dir``, removed by
+    ``shutdown``, or by the next cache created there if the process died.
+    """
+
+    def __init__(
+        self,
+        remote: Storage,
+        local_dir: str,
+        max_bytes: int = 1024 * 1024 * 1024,
+        ttl: float = 60.0,
+        revalidate: bool = True,
+        _cache: Optional[_DiskCache] = None,
+    ):
+        self.remote = remote
+        self.local_dir = local_dir
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.revalidate = revalidate
+        self._owns_cache = _cache is None
+        self._cache = _cache or _DiskCache(local_dir, max_bytes)
+
+    @property  # type: ignore[override]
+    def max_concurrency(self) -> int:
+        return self.remote.max_concurrency
+
+    async def _version(self, file_path: str) -> Optional[str]:
+        if not self.revalidate:
+            return None
+        return await self.remote.file_version(file_path)
+
+    async def _fetch(self, key: str, file_path: str) -> bytes:
+        # the version is read first: if the object changes in between, the
+        # next revalidation sees a newer version and fetches it again
+        version = await self._version(file_path)
+        content = await self.remote.read_file(file_path)
+        await self._cache.put(key, content, version)
+        return content
+
+    async def read_file(self, file_path: str) -> bytes:
+        key = self.remote.path(file_path)
+        entry = self._cache.get(key)
+        if entry is not None:
+            fresh = time.monotonic() - entry.checked_at < self.ttl
+            if not fresh and entry.version is not None:
+                fresh = await self._version(file_path) == entry.version
+                if fresh:
+                    entry.checked_at = time.monotonic()
+            if fresh:
+                try:
+                    return await self._cache.read(entry)
+                except FileNotFoundError:
+                    # evicted while revalidating
+                    pass
+
+        # concurrent readers of the same file share one download
+        task = self._cache.pending.get(key)
+        if task is None:
+            task = asyncio.create_task(self._fetch(key, file_path))
+            self._cache.pending[key] = task
+            task.add_done_callback(lambda _: self._cache.pending.pop(key, None))
+        return await asyncio.shield(task)
+
+    async def read_file_with_version(
+        self, file_path: str
+    ) -> Tuple[bytes, Optional[str]]:
+        # always revalidated, a cached copy within ttl may be older
+        key = self.remote.path(file_path)
+        version = await self.remote.file_version(file_path)
+        entry = self._cache.get(key)
+        if version is not None and entry is not None and entry.version == version:
+            try:
+                return await self._cache.read(entry), version
+            except FileNotFoundError:
+                pass
+        content = await self.remote.read_file(file_path)
+        await self._cache.put(key, content, version)
+        return content, version
+
+    async def read_range(
+        self, file_path: str, start: int, end: Optional[int] = None
+    ) -> AsyncIterator[bytes]:
+        # ranges are served from the cache when the file is already there,
+        # they never download the whole file
+        entry = self._cache.get(self.remote.path(file_path))
+        if entry is not None and time.monotonic() - entry.checked_at < self.ttl:
+            try:
+                local_store = LocalStorage(self._cache.cache_dir)
+                async for chunk in local_store.read_range(
+                    os.path.basename(entry.filename), start, end
+                ):
+                    yield chunk
+                return
+            except FileNotFoundError:
+                pass
+        async for chunk in self.remote.read_range(file_path, start, end):
+            yield chunk
+
+    async def write_file(self, file_path: str, file_content: bytes):
+        key = self.remote.path(file_path)
+        await self._cache.invalidate(key)
+        await self.remote.write_file(file_path, file_content)
+        try:
+            version = await self._version(file_path)
+        except Exception:
+            logger.exception(f"could not get version of {key}")
+            return
+        await self._cache.put(key, file_content, version)
+
+    async def write_file_if_version(
+        self, file_path: str, file_content: bytes, version: Optional[str]
+    ) -> bool:
+        await self._cache.invalidate(self.remote.path(file_path))
+        return await self.remote.write_file_if_version(
+            file_path, file_content, version
+        )
+
+    async def remove_file(self, file_path: str):
+        # GoogleStorage.remove_file removes everything under the prefix
+        await self._cache.invalidate_prefix(self.remote.path(file_path))
+        await self.remote.remove_file(file_path)  # type: ignore
+
+    async def copy_file(
+        self, file_path: str, target_bucket: str, target_file_path: str
+    ):
+        await self._cache.invalidate(f"gs://{target_bucket}/{target_file_path}")
+        await self.remote.copy_file(  # type: ignore
+            file_path, target_bucket, target_file_path
+        )
+
+    def path(self, path_suffix: str) -> str:
+        return self.remote.path(path_suffix)
+
+    def list_files(
+        self, folder_path: str, start_offset: str = "", end_offset: str = ""
+    ) -> AsyncIterator[str]:
+        return self.remote.list_files(folder_path, start_offset, end_offset)
+
+    def list_subfolders(
+        self, folder_path: str, start_offset: str = "", end_offset: str = ""
+    ) -> AsyncIterator[str]:
+        return self.remote.list_subfolders(folder_path, start_offset, end_offset)
+
+    def list_all_files(self, folder_path: str) -> AsyncIterator[str]:
+        return self.remote.list_all_files(folder_path)  # type: ignore
+
+    async def make_public(self, file_path: str) -> str:
+        return await self.remote.make_public(file_path)
+
+    async def public_url(self, file_path: str) -> str:
+        return await self.remote.public_url(file_path)
+
+    async def file_exists(self, file_name: str) -> bool:
+        return await self.remote.file_exists(file_name)
+
+    async def file_version(self, file_path: str) -> Optional[str]:
+        return await self.remote.file_version(file_path)
+
+    def new_store(self, folder_suffix: str) -> "CachingStorage":
+        return CachingStorage(
+            self.remote.new_store(folder_suffix),
+            self.local_dir,
+            self.max_bytes,
+            self.ttl,
+            self.revalidate,
+            self._cache,
+        )
+
+    async def shutdown(self):
+        if self._owns_cache:
+            self._cache.close()
+        await self.remote.shutdown()
@@ -1,15 +1,18 @@
-from typing import AsyncIterator, Self
+import asyncio
+from typing import AsyncIterator, Dict, List, Optional, Self, Tuple
 import os
 import logging
+import urllib.parse
 import aiohttp
-from .storage import Storage
-from gcloud.aio.storage import Storage as GoogleAioStorage  # for async operations
-from google.cloud import storage  # for synchronous operations
+from cachetools import TTLCache
+from .storage import STREAM_CHUNK_SIZE, Storage
+from gcloud.aio.storage import Storage as GoogleAioStorage
 from gcloud.aio.auth import Token
 from tenacity import (
     retry,
     wait_random_exponential,
     after_log,
+    retry_if_exception,
     retry_if_not_exception_type,
 )
 
@@ -24,6 +27,18 @@ VERIFY_SSL = True
 STORAGE_EMULATOR_HOST = os.environ.get("STORAGE_EMULATOR_HOST")
 if STORAGE_EMULATOR_HOST:
     VERIFY_SSL = False
+    API_ROOT = STORAGE_EMULATOR_HOST
+    if not API_ROOT.startswith("http"):
+        API_ROOT = f"http://{API_ROOT}"
+else:
+    API_ROOT = "https://storage.googleapis.com"
+
+PUBLIC_URL_ROOT = "https://storage.googleapis.com"
+
+# the JSON API returns at most 1000 entries per page
+MAX_PAGE_SIZE = 1000
+
+ListingKey = Tuple[str, str, str, str]
 
 
 @retry(
@@ -48,61 +63,153 @@ async def _upload(client, bucket_name, object_name, content):
     return status
 
 
+def _is_precondition_failure(e: BaseException) -> bool:
+    return isinstance(e, aiohttp.ClientResponseError) and e.status == 412
+
+
+@retry(
+    wait=wait_random_exponential(multiplier=1, max=60),
+    retry=retry_if_exception(lambda e: not _is_precondition_failure(e)),
+    after=after_log(logger, logging.DEBUG),
+)
+async def _upload_if_generation(client, bucket_name, object_name, content, generation):
+    status = await client.upload(
+        bucket_name,
+        object_name,
+        content,
+        parameters={"ifGenerationMatch": generation},
+    )
+    return status
+
+
+class _ClientState:
+    # connection pool, token, client and listing cache shared by a
+    # GoogleStorage and the stores derived from it with new_store
+    def __init__(self, listing_cache_ttl: float):
+        self.connector: aiohttp.TCPConnector | None = None
+        self.session: aiohttp.ClientSession | None = None
+        self.token: Token | None = None
+        self.client: GoogleAioStorage | None = None
+        self.listings: TTLCache | None = None
+        if listing_cache_ttl > 0:
+            self.listings = TTLCache(maxsize=256, ttl=listing_cache_ttl)
+
+
 class GoogleStorage(Storage):
-    def __init__(self, bucket_name: str, base_path: str):
+    """
+    Storage on a GCS bucket below ``base_path``.
+
+    Listings fetch up to ``page_size`` entries per request and prefetch the
+    next page while the current one is consumed. With ``listing_cache_ttl``
+    set, complete listings are cached for that many seconds; writes and
+    removals through this store (or the stores derived from it) invalidate
+    the listings they affect.
+
+    All requests share one connection pool of ``max_connections``; bulk
+    reads and writes keep at most ``max_concurrency`` requests in flight.
+    """
+
+    def __init__(
+        self,
+        bucket_name: str,
+        base_path: str,
+        _state: _ClientState | None = None,
+        page_size: int = MAX_PAGE_SIZE,
+        listing_cache_ttl: float = 0.0,
+        max_connections: int = 100,
+        max_concurrency: int = 32,
+    ):
         self.bucket_name = bucket_name
         self.base_path = base_path
-        self._token_session: aiohttp.ClientSession | None = None
-        self._token: Token | None = None
-        self._connector: aiohttp.TCPConnector | None = None
+        self.page_size = min(page_size, MAX_PAGE_SIZE)
+        self.listing_cache_ttl = listing_cache_ttl
+        self.max_connections = max_connections
+        self.max_concurrency = max_concurrency
+        self._owns_state = _state is None
+        self._state = _state or _ClientState(listing_cache_ttl)
 
     async def shutdown(self):
+        if not self._owns_state:
+            return
+        state = self._state
+
         try:
-            if self._token is not None:
-                await self._token.close()
-            self._token = None
+            if state.token is not None:
+                await state.token.close()
+            state.token = None
         except Exception:
             logger.exception("error closing token")
 
+        state.client = None
         try:
-            if self._token_session is not None:
-                await self._token_session.close()
-            self._token_session = None
+            if state.session is not None:
+                await state.session.close()
+            state.session = None
         except Exception:
-            logger.exception("error closing token session")
+            logger.exception("error closing session")
 
         try:
-            if self._connector is not None:
-                await self._connector.close()
-            self._connector = None
+            if state.connector is not None:
+                await state.connector.close()
+            state.connector = None
         except Exception:
             logger.exception("error closing connector")
 
     @property
     def connector(self) -> aiohttp.TCPConnector:
-        if self._connector is None:
-            self._connector = aiohttp.TCPConnector(ssl=VERIFY_SSL, limit=1000)
-        return self._connector
+        if self._state.connector is None:
+            self._state.connector = aiohttp.TCPConnector(
+                ssl=VERIFY_SSL, limit=self.max_connections
+            )
+        return self._state.connector
 
     @property
-    def token(self) -> Token:
-        if self._token is None:
-            self._token_session = aiohttp.ClientSession(
+    def session(self) -> aiohttp.ClientSession:
+        if self._state.session is None or self._state.session.closed:
+            self._state.session = aiohttp.ClientSession(
                 connector=self.connector, connector_owner=False
             )
-            self._token = Token(
-                session=self._token_session,
+        return self._state.session
+
+    @property
+    def token(self) -> Token:
+        if self._state.token is None:
+            self._state.token = Token(
+                session=self.session,
                 scopes=["https://www.googleapis.com/auth/devstorage.read_write"],
             )
-        return self._token
+        return self._state.token
+
+    @property
+    def client(self) -> GoogleAioStorage:
+        # long lived, closed with the session in shutdown
+        if self._state.client is None:
+            self._state.client = GoogleAioStorage(
+                session=self.session, token=self.token
+            )
+        return self._state.client
 
     async def write_file(self, file_path: str, content: bytes):
         object_name = f"{self.base_path}/{file_path}"
-        async with aiohttp.ClientSession(
-            connector=self.connector, connector_owner=False
-        ) as session:
-            async with GoogleAioStorage(session=session, token=self.token) as client:
-                await _upload(client, self.bucket_name, object_name, content)
+        client = self.client
+        await _upload(client, self.bucket_name, object_name, content)
+        self._invalidate_listings(object_name)
+
+    async def write_file_if_version(
+        self, file_path: str, content: bytes, version: Optional[str]
+    ) -> bool:
+        object_name = f"{self.base_path}/{file_path}"
+        # generation 0 matches only when there is no live object
+        try:
+            await _upload_if_generation(
+                self.client, self.bucket_name, object_name, content, version or "0"
+            )
+        except aiohttp.ClientResponseError as e:
+            if _is_precondition_failure(e):
+                return False
+            raise
+        self._invalidate_listings(object_name)
+        return True
 
     @retry(
         wait=wait_random_exponential(multiplier=1, max=60),
@@ -110,18 +217,41 @@ class GoogleStorage(Storage):
     )
     async def read_file(self, file_path: str) -> bytes:
         object_name = f"{self.base_path}/{file_path}"
-        async with aiohttp.ClientSession(
-            connector=self.connector, connector_owner=False
-        ) as session:
-            async with GoogleAioStorage(session=session, token=self.token) as client:
-                try:
-                    content = await client.download(self.bucket_name, object_name)
-                    return content
-                except aiohttp.ClientResponseError as e:
-                    if e.status == 404:
-                        raise FileNotFoundError(f"file {file_path} not found")
-                    else:
-                        raise
+        client = self.client
+        try:
+            content = await client.download(self.bucket_name, object_name)
+            return content
+        except aiohttp.ClientResponseError as e:
+            if e.status == 404:
+                raise FileNotFoundError(f"file {file_path} not found")
+            else:
+                raise
+
+    async def read_range(
+        self, file_path: str, start: int, end: Optional[int] = None
+    ) -> AsyncIterator[bytes]:
+        object_name = f"{self.base_path}/{file_path}"
+        if end is not None and end <= start:
+            return
+        headers = {}
+        if start > 0 or end is not None:
+            # http ranges include the last byte
+            last_byte = "" if end is None else str(end - 1)
+            headers["Range"] = f"bytes={start}-{last_byte}"
+        try:
+            stream = await self.client.download_stream(
+                self.bucket_name, object_name, headers=headers
+            )
+        except aiohttp.ClientResponseError as e:
+            if e.status == 404:
+                raise FileNotFoundError(f"file {file_path} not found")
+            if e.status == 416:
+                # start is past the end of the object
+                return
+            raise
+        async with stream:
+            while chunk := await stream.read(STREAM_CHUNK_SIZE):
+                yield chunk
 
     def _relative_path(self, path_suffix: str):
         if self.base_path is None or self.base_path == "":
@@ -134,189 +264,201 @@ class GoogleStorage(Storage):
     def path(self, path_suffix: str):
         return f"gs://{self.bucket_name}/{self._relative_path(path_suffix)}"
 
+    def _invalidate_listings(self, object_name: str):
+        listings = self._state.listings
+        if listings is None:
+            return
+        for key in list(listings.keys()):
+            _, bucket_name, prefix, _ = key
+            if bucket_name == self.bucket_name and (
+                # a file below the listing, or a removed folder with the
+                # listing below it
+                object_name.startswith(prefix)
+                or prefix.startswith(object_name)
+            ):
+                listings.pop(key, None)
+
+    async def _pages(self, params: Dict[str, str]) -> AsyncIterator[Dict]:
+        # the next page is requested as soon as the current one arrives, so the
+        # caller's work on a page overlaps with fetching the next
+        client = self.client
+        params = {**params, "maxResults": str(self.page_size)}
+        next_page = asyncio.create_task(
+            _list_objects(client, self.bucket_name, params)
+        )
+        try:
+            while next_page is not None:
+                data = await next_page
+                next_page = None
+                page_token = data.get("nextPageToken")
+                if page_token:
+                    next_page = asyncio.create_task(
+                        _list_objects(
+                            client,
+                            self.bucket_name,
+                            {**params, "pageToken": page_token},
+                        )
+                    )
+                yield data
+        finally:
+            if next_page is not None:
+                next_page.cancel()
+                await asyncio.gather(next_page, return_exceptions=True)
+
+    async def _listing(
+        self,
+        field: str,
+        prefix: str,
+        delimiter: bool,
+        start_offset: str = "",
+        end_offset: str = "",
+    ) -> AsyncIterator[str]:
+        """Names below prefix from the items or prefixes of a listing"""
+        params = {"prefix": prefix}
+        if delimiter:
+            params["delimiter"] = "/"
+        if start_offset != "":
+            params["startOffset"] = f"{prefix}{start_offset}"
+        if end_offset != "":
+            params["endOffset"] = f"{prefix}{end_offset}"
+
+        listings = self._state.listings
+        key: ListingKey = (
+            field,
+            self.bucket_name,
+            prefix,
+            f"{delimiter}|{start_offset}|{end_offset}",
+        )
+        if listings is not None and key in listings:
+            for name in listings[key]:
+                yield name
+            return
+
+        names: List[str] = []
+        async for data in self._pages(params):
+            for entry in data.get(field, []):
+                name = entry["name"] if field == "items" else entry
+                names.append(name)
+                yield name
+        if listings is not None:
+            listings[key] = names
+
     async def list_files(
         self,
         folder_path: str,
         start_offset: str = "",
         end_offset: str = "",
     ) -> AsyncIterator[str]:
-        data = None
         prefix = f"{self._relative_path(folder_path)}/"
+        async for name in self._listing(
+            "items", prefix, True, start_offset, end_offset
+        ):
+            yield name[len(prefix) :]
 
-        async with aiohttp.ClientSession(
-            connector=self.connector, connector_owner=False
-        ) as session:
-            async with GoogleAioStorage(session=session, token=self.token) as client:
-                page_token = None
-                max_results = 100
-                params = {
-                    "delimiter": "/",
-                    "maxResults": str(max_results),
-                    "prefix": prefix,
-                }
-
-                while True:
-                    if page_token is not None:
-                        params["pageToken"] = page_token
-
-                    if end_offset != "":
-                        params["startOffset"] = f"{prefix}{start_offset}"
-
-                    if end_offset != "":
-                        params["endOffset"] = f"{prefix}{end_offset}"
-
-                    data = await _list_objects(client, self.bucket_name, params)
+    async def _acl_headers(self) -> dict:
+        if STORAGE_EMULATOR_HOST:
+            return {}
+        return {"Authorization": f"Bearer {await self.token.get()}"}
 
-                    if "items" not in data or len(data["items"]) == 0:
-                        return
-
-                    for file_entry in data["items"]:
-                        yield file_entry["name"][len(prefix) :]
+    async def make_public(self, file_path: str) -> str:
+        blob_name = f"{self.base_path}/{file_path}"
+        # https://cloud.google.com/storage/docs/json_api/v1/objectAccessControls/insert
+        url = (
+            f"{API_ROOT}/storage/v1/b/{self.bucket_name}/o/"
+            f"{urllib.parse.quote(blob_name, safe='')}/acl"
+        )
+        async with self.session.post(
+            url,
+            headers=await self._acl_headers(),
+            json={"entity": "allUsers", "role": "READER"},
+        ) as response:
+            if response.status == 404:
+                raise FileNotFoundError(f"file {file_path} not found")
+            response.raise_for_status()
+        return self._public_url(blob_name)
 
-                    if len(data["items"]) < max_results or "nextPageToken" not in data:
-                        return
+    def _public_url(self, blob_name: str) -> str:
+        # same url as google.cloud.storage.Blob.public_url
+        return (
+            f"{PUBLIC_URL_ROOT}/{self.bucket_name}/"
+            f"{urllib.parse.quote(blob_name, safe='/~')}"
+        )
 
-                    page_token = data["nextPageToken"]
+    async def public_url(self, file_path: str) -> str:
+        # the url only resolves once the object is public, see make_public
+        return self._public_url(f"{self.base_path}/{file_path}")
 
-    async def make_public(self, file_path: str) -> str:
+    async def file_exists(self, file_path: str) -> bool:
         blob_name = f"{self.base_path}/{file_path}"
-        storage_client = storage.Client()
-        bucket = storage_client.bucket(self.bucket_name)
-        blob = bucket.blob(blob_name)
         try:
-            blob.make_public()
-            return blob.public_url
+            await self.client.download_metadata(self.bucket_name, blob_name)
+            return True
         except aiohttp.ClientResponseError as e:
             if e.status == 404:
-                raise FileNotFoundError(f"file {file_path} not found")
-            else:
-                raise
+                return False
+            raise
 
-    async def public_url(self, file_path: str) -> str:
-        # simple approach, but does not provide public url
-        # see https://cloud.google.com/storage/docs/access-public-data
-        # full_file_path = f"{self.base_path}/{file_path}"
-        # return (
-        #     "https://storage.googleapis.com/"
-        #     f"{self.bucket_name}/{urllib.parse.quote(full_file_path)}"
-        # )
-
-        # synchronous method for getting public_url, throws exception if not available
+    async def file_version(self, file_path: str) -> Optional[str]:
         blob_name = f"{self.base_path}/{file_path}"
-        storage_client = storage.Client()
-        bucket = storage_client.bucket(self.bucket_name)
-        blob = bucket.blob(blob_name)
-        return blob.public_url
-
-    async def file_exists(self, file_path: str) -> bool:
-        blob_name = f"{self.base_path}/{file_path}"
-        client = storage.Client()
-        bucket = client.get_bucket(self.bucket_name)
-        blob = bucket.blob(blob_name)
-        return blob.exists()
+        try:
+            metadata = await self.client.download_metadata(
+                self.bucket_name, blob_name
+            )
+        except aiohttp.ClientResponseError as e:
+            if e.status == 404:
+                return None
+            raise
+        # the generation changes on every overwrite of the object
+        return metadata.get("generation")
 
     def new_store(self, folder_suffix: str) -> "GoogleStorage":
         folder_path = self._relative_path(folder_suffix)
-        return GoogleStorage(self.bucket_name, folder_path)
+        return GoogleStorage(
+            self.bucket_name,
+            folder_path,
+            self._state,
+            self.page_size,
+            self.listing_cache_ttl,
+            self.max_connections,
+            self.max_concurrency,
+        )
 
     async def list_subfolders(
         self, folder_path: str, start_offset: str = "", end_offset: str = ""
     ) -> AsyncIterator[str]:
-        data = None
         prefix = f"{self._relative_path(folder_path)}/"
-
-        async with aiohttp.ClientSession(
-            connector=self.connector, connector_owner=False
-        ) as session:
-            async with GoogleAioStorage(session=session, token=self.token) as client:
-                page_token = None
-                max_results = 100
-                params = {
-                    "delimiter": "/",
-                    "maxResults": str(max_results),
-                    "startOffset": f"{prefix}{start_offset}",
-                    "prefix": prefix,
-                }
-                while True:
-                    if page_token is not None:
-                        params["pageToken"] = page_token
-
-                    if end_offset != "":
-                        params["endOffset"] = f"{prefix}{end_offset}"
-
-                    data = await _list_objects(client, self.bucket_name, params)
-
-                    if "prefixes" not in data or len(data["prefixes"]) == 0:
-                        return
-
-                    for subfolder in data["prefixes"]:
-                        yield subfolder[len(prefix) : -1]
-
-                    if (
-                        len(data["prefixes"]) < max_results
-                        or "nextPageToken" not in data
-                    ):
-                        return
-
-                    page_token = data["nextPageToken"]
+        async for name in self._listing(
+            "prefixes", prefix, True, start_offset, end_offset
+        ):
+            yield name[len(prefix) : -1]
 
     async def remove_file(self, file_path: str):
         full_file_path = self._relative_path(file_path)
-        async with aiohttp.ClientSession(
-            connector=self.connector, connector_owner=False
-        ) as session:
-            async with GoogleAioStorage(session=session, token=self.token) as client:
-                objects = await client.list_objects(self.bucket_name,
-                                                    params={"prefix": full_file_path})
-                for blob in objects['items']:
-                    await client.delete(self.bucket_name, blob['name'])
+        client = self.client
+        async for data in self._pages({"prefix": full_file_path}):
+            for blob in data.get("items", []):
+                await client.delete(self.bucket_name, blob["name"])
+        self._invalidate_listings(full_file_path)
 
     async def list_all_files(self, folder_path: str):
         prefix = f"{self._relative_path(folder_path)}/"
-
-        async with aiohttp.ClientSession(
-            connector=self.connector, connector_owner=False
-        ) as session:
-            async with GoogleAioStorage(session=session, token=self.token) as client:
-                page_token = None
-                max_results = 100
-                params = {
-                    "maxResults": str(max_results),
-                    "prefix": prefix,
-                }
-
-                while True:
-                    if page_token is not None:
-                        params["pageToken"] = page_token
-
-                    data = await _list_objects(client, self.bucket_name, params)
-
-                    if "items" not in data or len(data["items"]) == 0:
-                        return
-
-                    for file_entry in data["items"]:
-                        yield file_entry["name"][len(prefix) :]
-
-                    if len(data["items"]) < max_results or "nextPageToken" not in data:
-                        return
-
-                    page_token = data["nextPageToken"]
+        async for name in self._listing("items", prefix, False):
+            yield name[len(prefix) :]
 
     async def copy_file(
         self, file_path: str, target_bucket: str, target_file_path: str
     ):
         full_file_path = self._relative_path(file_path)
 
-        async with aiohttp.ClientSession(
-            connector=self.connector, connector_owner=False
-        ) as session:
-            async with GoogleAioStorage(session=session, token=self.token) as client:
-                await client.copy(
-                    self.bucket_name,
-                    full_file_path,
-                    target_bucket,
-                    new_name=target_file_path,
-                )
+        client = self.client
+        await client.copy(
+            self.bucket_name,
+            full_file_path,
+            target_bucket,
+            new_name=target_file_path,
+        )
+        if target_bucket == self.bucket_name:
+            self._invalidate_listings(target_file_path)
 
     @classmethod
     def new_gcs_file_adapter(cls, base_path: str) -> Self:
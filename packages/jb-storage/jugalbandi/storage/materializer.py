@@ -0,0 +1,161 @@
+import asyncio
+from dataclasses import dataclass
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+from typing import Dict, Iterable, List, Optional, Tuple
+import aiofiles
+from aiofiles import os as aiofiles_os
+from .storage import Storage
+
+
+def combined_version(versions: Iterable[Optional[str]]) -> Optional[str]:
+    """One version for a set of files from their versions, None if any is unknown"""
+    digest = hashlib.sha256()
+    for version in versions:
+        if version is None:
+            return None
+        digest.update(f"{version}\n".encode("utf-8"))
+    return digest.hexdigest()[:16]
+
+
+CURRENT_FILE_NAME = "CURRENT"
+
+
+@dataclass
+class IndexPointer:
+    """Contents of the CURRENT object of a published index"""
+
+    version: str
+    files: List[str]
+
+
+def content_version(files: Dict[str, bytes]) -> str:
+    return combined_version(
+        f"{name}:{hashlib.sha256(content).hexdigest()}"
+        for name, content in sorted(files.items())
+    )  # type: ignore
+
+
+async def publish_index(store: Storage, folder: str, files: Dict[str, bytes]) -> str:
+    """
+    Writes the index files to ``{folder}/{version}/`` and then points
+    ``{folder}/CURRENT`` at that version. Readers that follow CURRENT never
+    see files of two different versions. Returns the version.
+    """
+    version = content_version(files)
+    errors = [
+        result.error
+        async for result in store.write_many(
+            (f"{folder}/{version}/{name}", content) for name, content in files.items()
+        )
+        if result.error is not None
+    ]
+    if errors:
+        raise ExceptionGroup(f"Could not publish index {folder}", errors)
+    pointer = {"version": version, "files": sorted(files)}
+    await store.write_file(
+        f"{folder}/{CURRENT_FILE_NAME}", json.dumps(pointer).encode("utf-8")
+    )
+    return version
+
+
+async def read_index_pointer(store: Storage, folder: str) -> Optional[IndexPointer]:
+    """The published version of the index in ``folder``, None if there is none"""
+    try:
+        content = await store.read_file(f"{folder}/{CURRENT_FILE_NAME}")
+    except FileNotFoundError:
+        return None
+    if not content:
+        return None
+    pointer = json.loads(content)
+    return IndexPointer(pointer["version"], pointer["files"])
+
+
+class IndexMaterializer:
+    """
+    Copies of remote index files in versioned local directories,
+    ``{base_dir}/{name}/{version}/``.
+
+    A version is downloaded into a temporary directory next to its final
+    place and published with an atomic rename, so readers never see a half
+    written index. Concurrent callers for the same (name, version) wait on
+    one download, and a version that is already on disk is returned after a
+    single stat of its directory.
+
+    With ``remove_superseded`` set, the other versions of an index are
+    removed once a new version is in place, for indexes that are not
+    evicted by a janitor.
+    """
+
+    def __init__(self, base_dir: str, remove_superseded: bool = False):
+        self.base_dir = base_dir
+        self.remove_superseded = remove_superseded
+        self._pending: Dict[Tuple[str, str], asyncio.Task] = {}
+
+    def folder(self, name: str, version: str) -> str:
+        return os.path.join(self.base_dir, name, version)
+
+    async def materialize(
+        self, name: str, version: str, store: Storage, files: Dict[str, str]
+    ) -> str:
+        """
+        Local directory of ``version`` of the index ``name``, with ``files``
+        (local file name -> path in ``store``) downloaded on first use.
+        """
+        folder = self.folder(name, version)
+        # checked on every call, the folder may have been evicted meanwhile
+        if await aiofiles_os.path.isdir(folder):
+            return folder
+
+        key = (name, version)
+        task = self._pending.get(key)
+        if task is None:
+            task = asyncio.create_task(self._download(name, version, store, files))
+            self._pending[key] = task
+            task.add_done_callback(lambda _: self._pending.pop(key, None))
+        await asyncio.shield(task)
+        return folder
+
+    async def _download(
+        self, name: str, version: str, store: Storage, files: Dict[str, str]
+    ):
+        folder = self.folder(name, version)
+        parent = os.path.dirname(folder)
+        await aiofiles_os.makedirs(parent, exist_ok=True)
+        temp_folder = tempfile.mkdtemp(prefix=".download-", dir=parent)
+        try:
+            local_names = {file_path: name for name, file_path in files.items()}
+            async for result in store.read_many(local_names):
+                if result.error is not None:
+                    raise result.error
+                local_path = os.path.join(temp_folder, local_names[result.file_path])
+                async with aiofiles.open(local_path, "wb") as f:
+                    await f.write(result.content)  # type: ignore
+            try:
+                await aiofiles_os.rename(temp_folder, folder)
+            except OSError:
+                # another worker published the same version first
+                if not await aiofiles_os.path.isdir(folder):
+                    raise
+        finally:
+            if await aiofiles_os.path.isdir(temp_folder):
+                await asyncio.to_thread(shutil.rmtree, temp_folder, True)
+        if self.remove_superseded:
+            await self._remove_other_versions(name, version)
+
+    async def _remove_other_versions(self, name: str, version: str):
+        parent = os.path.join(self.base_dir, name)
+        for entry in await aiofiles_os.listdir(parent):
+            # temporary directories of downloads in progress start with "."
+            if (
+                entry == version
+                or entry.startswith(".")
+                or (name, entry) in self._pending
+            ):
+                continue
+            await asyncio.to_thread(
+                shutil.rmtree, os.path.join(parent, entry), True
+            )
@@ -1,14 +1,45 @@
 from abc import ABC, abstractmethod
+import asyncio
+from dataclasses import dataclass
 import os
-from typing import AsyncIterator, Self
+import shutil
+from typing import (
+    AsyncIterator,
+    Awaitable,
+    Callable,
+    Iterable,
+    List,
+    Optional,
+    Self,
+    Set,
+    Tuple,
+    TypeVar,
+)
+from weakref import WeakValueDictionary
 from aiofiles import os as aiofiles_os
 import aiofiles
 import logging
 
 logger = logging.getLogger(__name__)
 
+STREAM_CHUNK_SIZE = 256 * 1024
+
+T = TypeVar("T")
+
+
+@dataclass
+class BulkResult:
+    """Outcome of one file of a bulk operation"""
+
+    file_path: str
+    content: Optional[bytes] = None
+    error: Optional[Exception] = None
+
 
 class Storage(ABC):
+    # default number of concurrent requests of the bulk operations
+    max_concurrency: int = 16
+
     @abstractmethod
     async def write_file(self, file_path: str, file_content: bytes):
         pass
@@ -17,6 +48,89 @@ class Storage(ABC):
     async def read_file(self, file_path: str) -> bytes:
         pass
 
+    async def read_range(
+        self, file_path: str, start: int, end: Optional[int] = None
+    ) -> AsyncIterator[bytes]:
+        """
+        Yields the bytes ``start`` up to, not including, ``end`` of the file
+        (to the end of the file when ``end`` is None), in chunks. Stores
+        without ranged reads fall back to reading the whole file.
+        """
+        content = await self.read_file(file_path)
+        content = content[start:end]
+        for offset in range(0, len(content), STREAM_CHUNK_SIZE):
+            yield content[offset : offset + STREAM_CHUNK_SIZE]
+
+    def open_stream(self, file_path: str) -> AsyncIterator[bytes]:
+        """Yields the content of the file in chunks"""
+        return self.read_range(file_path, 0)
+
+    async def _run_bulk(
+        self,
+        items: Iterable[T],
+        operation: Callable[[T], Awaitable[BulkResult]],
+        max_concurrency: Optional[int],
+    ) -> AsyncIterator[BulkResult]:
+        # items are taken from the iterable only as slots free up, so lazily
+        # produced content is not all held in memory at once
+        limit = max_concurrency or self.max_concurrency
+        remaining = iter(items)
+        pending: Set[asyncio.Task] = set()
+        try:
+            while True:
+                for item in remaining:
+                    pending.add(asyncio.create_task(operation(item)))
+                    if len(pending) >= limit:
+                        break
+                if not pending:
+                    return
+                done, pending = await asyncio.wait(
+                    pending, return_when=asyncio.FIRST_COMPLETED
+                )
+                for task in done:
+                    yield task.result()
+        finally:
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+
+    def read_many(
+        self, file_paths: Iterable[str], max_concurrency: Optional[int] = None
+    ) -> AsyncIterator[BulkResult]:
+        """
+        Reads the files with at most ``max_concurrency`` reads in flight and
+        yields a result per file as soon as it completes. A failed read is
+        yielded with its error instead of failing the others.
+        """
+
+        async def _read(file_path: str) -> BulkResult:
+            try:
+                return BulkResult(file_path, content=await self.read_file(file_path))
+            except Exception as e:
+                return BulkResult(file_path, error=e)
+
+        return self._run_bulk(file_paths, _read, max_concurrency)
+
+    def write_many(
+        self,
+        items: Iterable[Tuple[str, bytes]],
+        max_concurrency: Optional[int] = None,
+    ) -> AsyncIterator[BulkResult]:
+        """
+        Writes (file path, content) items with at most ``max_concurrency``
+        writes in flight, yielding a result per file as it completes.
+        """
+
+        async def _write(item: Tuple[str, bytes]) -> BulkResult:
+            file_path, content = item
+            try:
+                await self.write_file(file_path, content)
+                return BulkResult(file_path)
+            except Exception as e:
+                return BulkResult(file_path, error=e)
+
+        return self._run_bulk(items, _write, max_concurrency)
+
     @abstractmethod
     def path(self, path_suffix: str) -> str:
         pass
@@ -37,6 +151,19 @@ class Storage(ABC):
     async def make_public(self, file_path: str) -> str:
         pass
 
+    async def make_public_many(
+        self, file_paths: List[str], max_concurrency: int = 32
+    ) -> List[str]:
+        semaphore = asyncio.Semaphore(max_concurrency)
+
+        async def _make_public(file_path: str) -> str:
+            async with semaphore:
+                return await self.make_public(file_path)
+
+        return await asyncio.gather(
+            *[_make_public(file_path) for file_path in file_paths]
+        )
+
     @abstractmethod
     async def public_url(self, file_path: str) -> str:
         pass
@@ -45,6 +172,38 @@ class Storage(ABC):
     async def file_exists(self, file_name: str) -> bool:
         pass
 
+    async def file_version(self, file_path: str) -> Optional[str]:
+        """
+        Opaque version of the stored file that changes whenever the file
+        does, None if the store does not track versions.
+        """
+        return None
+
+    async def read_file_with_version(
+        self, file_path: str
+    ) -> Tuple[bytes, Optional[str]]:
+        """
+        Content of the file and its version. The content may be newer than
+        the version but never older, so a ``write_file_if_version`` based on
+        it cannot overwrite a change it did not see.
+        """
+        version = await self.file_version(file_path)
+        return await self.read_file(file_path), version
+
+    async def write_file_if_version(
+        self, file_path: str, file_content: bytes, version: Optional[str]
+    ) -> bool:
+        """
+        Writes the file only if its current version is ``version`` (None: only
+        if the file does not exist) and returns whether it was written. The
+        check is atomic on stores with versions, see GoogleStorage; here it is
+        a separate read of the version.
+        """
+        if await self.file_version(file_path) != version:
+            return False
+        await self.write_file(file_path, file_content)
+        return True
+
     @abstractmethod
     def new_store(self, folder_suffix: str) -> Self:
         pass
@@ -55,6 +214,9 @@ class Storage(ABC):
 
 
 class LocalStorage(Storage):
+    # conditional writes to a file, across the stores of this process
+    _write_locks: "WeakValueDictionary[str, asyncio.Lock]" = WeakValueDictionary()
+
     def __init__(self, base_dir: str):
         self.base_dir = base_dir
 
@@ -75,6 +237,39 @@ class LocalStorage(Storage):
         async with aiofiles.open(self.path(file_suffix), "rb") as f:
             return await f.read()
 
+    async def read_range(
+        self, file_suffix: str, start: int, end: Optional[int] = None
+    ) -> AsyncIterator[bytes]:
+        async with aiofiles.open(self.path(file_suffix), "rb") as f:
+            await f.seek(start)
+            remaining = None if end is None else end - start
+            while remaining is None or remaining > 0:
+                size = STREAM_CHUNK_SIZE
+                if remaining is not None:
+                    size = min(size, remaining)
+                chunk = await f.read(size)
+                if not chunk:
+                    return
+                if remaining is not None:
+                    remaining -= len(chunk)
+                yield chunk
+
+    async def write_file_if_version(
+        self, file_suffix: str, file_content: bytes, version: Optional[str]
+    ) -> bool:
+        file_path = os.path.abspath(self.path(file_suffix))
+        lock = self._write_locks.setdefault(file_path, asyncio.Lock())
+        async with lock:
+            if await self.file_version(file_suffix) != version:
+                return False
+            # a new inode per write, versions differ even within one mtime tick
+            await self._make_dir_for_file(file_path)
+            temp_file_path = f"{file_path}.{os.getpid()}.tmp"
+            async with aiofiles.open(temp_file_path, "wb") as f:
+                await f.write(file_content)
+            await aiofiles_os.replace(temp_file_path, file_path)
+            return True
+
     def path(self, path_suffix: str):
         return f"{self.base_dir}/{path_suffix}"
 
@@ -86,10 +281,25 @@ class LocalStorage(Storage):
             if entry.is_file():
                 yield entry.name
 
-    def list_subfolders(
+    async def list_subfolders(
         self, folder_path: str, start_offset: str = "", end_offset: str = ""
-    ) -> AsyncIterator[str]:
-        raise NotImplementedError("method make_public not implemented")
+    ):
+        try:
+            dir_iterator = await aiofiles_os.scandir(self.path(folder_path))
+        except FileNotFoundError:
+            # like a bucket, a folder without files has no subfolders
+            return
+        for entry in dir_iterator:
+            if entry.is_dir():
+                yield entry.name
+
+    async def remove_file(self, file_path: str):
+        # a folder is removed with everything below it, like a prefix in a bucket
+        path = self.path(file_path)
+        if await aiofiles_os.path.isdir(path):
+            await asyncio.to_thread(shutil.rmtree, path)
+        elif await aiofiles_os.path.exists(path):
+            await aiofiles_os.remove(path)
 
     async def make_public(self, file_path: str) -> str:
         raise NotImplementedError("method make_public not implemented")
@@ -100,6 +310,13 @@ class LocalStorage(Storage):
     async def file_exists(self, file_name: str) -> bool:
         return await aiofiles_os.path.exists(self.path(file_name))
 
+    async def file_version(self, file_path: str) -> Optional[str]:
+        try:
+            stat = await aiofiles_os.stat(self.path(file_path))
+        except FileNotFoundError:
+            return None
+        return f"{stat.st_ino}-{stat.st_mtime_ns}-{stat.st_size}"
+
     def new_store(self, folder_suffix: str) -> "LocalStorage":
         folder_path = self.path(folder_suffix)
         return LocalStorage(folder_path)
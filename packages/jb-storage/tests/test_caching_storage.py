@@ -0,0 +1,82 @@
+import asyncio
+import os
+import subprocess
+import sys
+import tempfile
+import pytest
+from jugalbandi.storage import CachingStorage, LocalStorage
+
+
+class CountingStorage(LocalStorage):
+    def __init__(self, base_dir: str):
+        super().__init__(base_dir)
+        self.reads = 0
+
+    async def read_file(self, file_suffix: str) -> bytes:
+        self.reads += 1
+        await asyncio.sleep(0.01)
+        return await super().read_file(file_suffix)
+
+
+@pytest.fixture()
+def cache_dir():
+    with tempfile.TemporaryDirectory() as temp_dir:
+        yield temp_dir
+
+
+async def test_read_through(local_store: LocalStorage, cache_dir: str):
+    remote = CountingStorage(local_store.path(""))
+    store = CachingStorage(remote, cache_dir, ttl=60)
+    await remote.write_file("a.txt", b"first")
+
+    contents = await asyncio.gather(*[store.read_file("a.txt") for _ in range(5)])
+    assert contents == [b"first"] * 5
+    assert remote.reads == 1
+    assert await store.read_file("a.txt") == b"first"
+    assert remote.reads == 1
+
+    # changed behind the cache, seen once the ttl is over
+    await remote.write_file("a.txt", b"second")
+    store.ttl = 0
+    assert await store.read_file("a.txt") == b"second"
+    assert remote.reads == 2
+    assert await store.read_file("a.txt") == b"second"
+    assert remote.reads == 2
+
+    await store.write_file("a.txt", b"third")
+    assert await remote.read_file("a.txt") == b"third"
+    assert await store.read_file("a.txt") == b"third"
+    await store.shutdown()
+
+
+async def test_cache_size_is_bounded(local_store: LocalStorage, cache_dir: str):
+    store = CachingStorage(local_store, cache_dir, max_bytes=10)
+    for name in ["a", "b", "c"]:
+        await local_store.write_file(name, b"x" * 4)
+        await store.read_file(name)
+    cache = store._cache
+    assert cache.total_bytes == 8
+    assert sorted(os.listdir(cache.cache_dir)) == sorted(
+        os.path.basename(entry.filename) for entry in cache.entries.values()
+    )
+    await store.shutdown()
+
+
+async def test_cache_directories_are_removed(
+    local_store: LocalStorage, cache_dir: str
+):
+    process = subprocess.Popen([sys.executable, "-c", ""])
+    process.wait()
+    # left over by a process that did not shut down
+    stale_dir = os.path.join(cache_dir, f"storage-cache-{process.pid}-0")
+    os.makedirs(stale_dir)
+
+    store = CachingStorage(local_store, cache_dir)
+    assert not os.path.exists(stale_dir)
+    assert os.listdir(cache_dir) == [os.path.basename(store._cache.cache_dir)]
+
+    # stores for sub folders share the cache of their parent
+    await store.new_store("sub").shutdown()
+    assert os.path.exists(store._cache.cache_dir)
+    await store.shutdown()
+    assert os.listdir(cache_dir) == []
@@ -0,0 +1,62 @@
+from typing import Dict
+from jugalbandi.storage import GoogleStorage
+
+
+class FakeClient:
+    def __init__(self):
+        self.objects: Dict[str, bytes] = {}
+        self.listings = 0
+
+    async def upload(self, bucket_name, object_name, content, **kwargs):
+        self.objects[object_name] = content
+        return {"generation": "1"}
+
+    async def delete(self, bucket_name, object_name):
+        del self.objects[object_name]
+
+    async def list_objects(self, bucket_name, params):
+        self.listings += 1
+        prefix = params["prefix"]
+        items, prefixes = [], set()
+        for name in sorted(self.objects):
+            if not name.startswith(prefix):
+                continue
+            rest = name[len(prefix) :]
+            if "delimiter" in params and "/" in rest:
+                prefixes.add(f"{prefix}{rest.split('/')[0]}/")
+            else:
+                items.append({"name": name})
+        return {"items": items, "prefixes": sorted(prefixes)}
+
+
+async def _list(store: GoogleStorage, folder_path: str):
+    return [name async for name in store.list_files(folder_path)]
+
+
+async def test_removal_invalidates_listings_below_it():
+    store = GoogleStorage("bucket", "base", listing_cache_ttl=60)
+    client = FakeClient()
+    store._state.client = client
+    await store.write_file("lib/doc/metadata.json", b"{}")
+    await store.write_file("lib/doc/sections/1.txt", b"1")
+    await store.write_file("lib/other/metadata.json", b"{}")
+
+    assert await _list(store, "lib/doc") == ["metadata.json"]
+    assert await _list(store, "lib/doc/sections") == ["1.txt"]
+    assert await _list(store, "lib/other") == ["metadata.json"]
+    assert [name async for name in store.list_subfolders("lib")] == [
+        "doc",
+        "other",
+    ]
+    listings = client.listings
+    assert await _list(store, "lib/doc") == ["metadata.json"]
+    assert client.listings == listings
+
+    await store.remove_file("lib/doc")
+    assert await _list(store, "lib/doc") == []
+    assert await _list(store, "lib/doc/sections") == []
+    assert [name async for name in store.list_subfolders("lib")] == ["other"]
+    # listings elsewhere stay cached
+    listings = client.listings
+    assert await _list(store, "lib/other") == ["metadata.json"]
+    assert client.listings == listings
@@ -0,0 +1,46 @@
+import asyncio
+from jugalbandi.storage import LocalStorage
+
+
+async def test_write_file_if_version(local_store: LocalStorage):
+    # None creates the file, but only if it does not exist
+    assert await local_store.write_file_if_version("a/b.json", b"1", None)
+    assert not await local_store.write_file_if_version("a/b.json", b"2", None)
+
+    content, version = await local_store.read_file_with_version("a/b.json")
+    assert content == b"1" and version is not None
+    assert await local_store.write_file_if_version("a/b.json", b"2", version)
+    # the version changed with the write, even within one mtime tick
+    assert not await local_store.write_file_if_version("a/b.json", b"3", version)
+    assert await local_store.read_file("a/b.json") == b"2"
+
+
+async def test_write_file_if_version_has_one_winner(local_store: LocalStorage):
+    await local_store.write_file("counter", b"0")
+    _, version = await local_store.read_file_with_version("counter")
+    written = await asyncio.gather(
+        *[
+            local_store.write_file_if_version("counter", str(i).encode(), version)
+            for i in range(1, 11)
+        ]
+    )
+    assert written.count(True) == 1
+    winner = written.index(True) + 1
+    assert await local_store.read_file("counter") == str(winner).encode()
+
+
+async def test_list_subfolders_and_remove_file(local_store: LocalStorage):
+    assert [name async for name in local_store.list_subfolders("lib")] == []
+    await local_store.write_file("lib/doc1/metadata.json", b"{}")
+    await local_store.write_file("lib/doc2/metadata.json", b"{}")
+    await local_store.write_file("lib/catalog.json", b"{}")
+    assert sorted([name async for name in local_store.list_subfolders("lib")]) == [
+        "doc1",
+        "doc2",
+    ]
+
+    await local_store.remove_file("lib/doc1")
+    await local_store.remove_file("lib/catalog.json")
+    await local_store.remove_file("lib/missing")
+    assert [name async for name in local_store.list_subfolders("lib")] == ["doc2"]
+    assert not await local_store.file_exists("lib/catalog.json")
@@ -1,159 +1,171 @@
-import httpx
+import asyncio
 import os
 from abc import ABC, abstractmethod
+from typing import Dict, List
+from cachetools import TTLCache
 from google.cloud.translate import TranslationServiceAsyncClient
 from jugalbandi.core import (
+    AdaptiveRouter,
     Language,
-    InternalServerException,
+    BhashiniClient,
+    get_http_client,
 )
-import json
 import uuid
-import aiohttp
+
+
+def _chunks(texts: List[str], max_items: int, max_chars: int) -> List[List[str]]:
+    chunks: List[List[str]] = []
+    chunk: List[str] = []
+    chunk_chars = 0
+    for text in texts:
+        if chunk and (len(chunk) >= max_items or chunk_chars + len(text) > max_chars):
+            chunks.append(chunk)
+            chunk = []
+            chunk_chars = 0
+        chunk.append(text)
+        chunk_chars += len(text)
+    if chunk:
+        chunks.append(chunk)
+    return chunks
 
 
 class Translator(ABC):
+    # upper bounds for a single batched request, overridden by the
+    # implementations to match their service limits
+    batch_max_items: int = 1
+    batch_max_chars: int = 5000
+    # chunks of one batch that are translated at the same time
+    batch_max_concurrency: int = 4
+
+    def __init__(self):
+        self._translation_cache: TTLCache = TTLCache(maxsize=4096, ttl=3600)
+
     @abstractmethod
     async def translate_text(
         self, text: str, source_language: Language, destination_language: Language
     ) -> str:
         pass
 
+    async def _translate_chunk(
+        self, texts: List[str], source_language: Language, destination_language: Language
+    ) -> List[str]:
+        return list(await asyncio.gather(*[
+            self.translate_text(text, source_language, destination_language)
+            for text in texts
+        ]))
 
-class DhruvaTranslator(Translator):
-    def __init__(self):
-        self.bhashini_user_id = os.getenv('BHASHINI_USER_ID')
-        self.bhashini_api_key = os.getenv('BHASHINI_API_KEY')
-        self.bhashini_pipleline_id = os.getenv('BHASHINI_PIPELINE_ID')
-        self.bhashini_inference_url = "https://dhruva-api.bhashini.gov.in/services/inference/pipeline"
-
-    async def perform_bhashini_config_call(self,
-                                           task: str,
-                                           source_language: str,
-                                           target_language: str | None = None):
-        url = "https://meity-auth.ulcacontrib.org/ulca/apis/v0/model/getModelsPipeline"
-        if task in ['asr', 'tts']:
-            payload = json.dumps({
-                "pipelineTasks": [
-                    {
-                        "taskType": task,
-                        "config": {
-                            "language": {
-                                "sourceLanguage": source_language
-                            }
-                        }
-                    }
-                ],
-                "pipelineRequestConfig": {
-                    "pipelineId": "64392f96daac500b55c543cd"
-                }
-            })
-        else:
-            payload = json.dumps({
-                "pipelineTasks": [
-                    {
-                        "taskType": "translation",
-                        "config": {
-                            "language": {
-                                "sourceLanguage": source_language,
-                                "targetLanguage": target_language
-                            }
-                        }
-                    }
-                ],
-                "pipelineRequestConfig": {
-                    "pipelineId": self.bhashini_pipleline_id
-                }
-            })
-        headers = {
-            'userID': self.bhashini_user_id,
-            'ulcaApiKey': self.bhashini_api_key,
-            'Content-Type': 'application/json'
-        }
+    async def translate_batch(
+        self, texts: List[str], source_language: Language, destination_language: Language
+    ) -> List[str]:
+        """
+        Translate ``texts`` keeping their order. Empty strings, duplicates and
+        previously translated strings are not sent again; the rest is split
+        into chunks of at most ``batch_max_items`` / ``batch_max_chars``, at
+        most ``batch_max_concurrency`` of which are in flight.
+        """
+        translations: Dict[str, str] = {"": ""}
+        # a dict for its insertion order and constant time lookups
+        pending: Dict[str, None] = {}
+        for text in texts:
+            if text in translations or text in pending:
+                continue
+            key = (text, source_language, destination_language)
+            if key in self._translation_cache:
+                translations[text] = self._translation_cache[key]
+            else:
+                pending[text] = None
 
-        async with httpx.AsyncClient() as client:
-            response = await client.post(url, headers=headers, data=payload)  # type: ignore
+        semaphore = asyncio.Semaphore(self.batch_max_concurrency)
 
-        return response.json()
+        async def _translate(chunk: List[str]) -> List[str]:
+            async with semaphore:
+                return await self._translate_chunk(
+                    chunk, source_language, destination_language
+                )
 
-    async def translate_text(
-        self, text: str, source_language: Language, destination_language: Language
-    ) -> str:
+        chunks = _chunks(list(pending), self.batch_max_items, self.batch_max_chars)
+        results = await asyncio.gather(*[_translate(chunk) for chunk in chunks])
+        for chunk, translated_chunk in zip(chunks, results):
+            for text, translated_text in zip(chunk, translated_chunk):
+                translations[text] = translated_text
+                key = (text, source_language, destination_language)
+                self._translation_cache[key] = translated_text
+
+        return [translations[text] for text in texts]
+
+
+class DhruvaTranslator(Translator):
+    batch_max_items = 25
+    batch_max_chars = 5000
+
+    def __init__(self):
+        super().__init__()
+        self.bhashini_client = BhashiniClient()
+
+    async def _translate_chunk(
+        self, texts: List[str], source_language: Language, destination_language: Language
+    ) -> List[str]:
         source = source_language.name.lower()
         destination = destination_language.name.lower()
 
-        bhashini_translation_config = await self.perform_bhashini_config_call(
+        bhashini_translation_config = await self.bhashini_client.pipeline_config(
             task='translation', source_language=source, target_language=destination)
 
-        payload = json.dumps({
+        payload = {
             "pipelineTasks": [
                 {
                     "taskType": "translation",
                     "config": {
                         "language": {
-                            "sourceLanguage": bhashini_translation_config['languages'][0]['sourceLanguage'],
-                            "targetLanguage": bhashini_translation_config['languages'][0]['targetLanguageList'][
-                                0]
+                            "sourceLanguage": bhashini_translation_config.source_language,
+                            "targetLanguage": bhashini_translation_config.target_language
                         },
-                        "serviceId": bhashini_translation_config['pipelineResponseConfig'][0]['config'][0][
-                            'serviceId']
+                        "serviceId": bhashini_translation_config.service_id
                     }
                 }
             ],
             "inputData": {
-                "input": [
-                    {
-                        "source": text
-                    }
-                ]
+                "input": [{"source": text} for text in texts]
             }
-        })
-        headers = {
-            'Accept': '*/*',
-            'User-Agent': 'Thunder Client (https://www.thunderclient.com)',
-            bhashini_translation_config['pipelineInferenceAPIEndPoint']['inferenceApiKey']['name']:
-                bhashini_translation_config['pipelineInferenceAPIEndPoint']['inferenceApiKey']['value'],
-            'Content-Type': 'application/json'
         }
+        response = await self.bhashini_client.infer(bhashini_translation_config, payload)
 
-        async with httpx.AsyncClient() as client:
-            response = await client.post(url=self.bhashini_inference_url,
-                                         headers=headers,
-                                         data=payload)  # type: ignore
-        if response.status_code != 200:
-            raise InternalServerException(
-                f"Request failed with response.text: {response.text} and "
-                  f"status_code: {response.status_code}")
+        return [output['target'] for output in response['pipelineResponse'][0]['output']]
 
-        indicText = response.json()['pipelineResponse'][0]['output'][0]['target']
-        return indicText
+    async def translate_text(
+        self, text: str, source_language: Language, destination_language: Language
+    ) -> str:
+        indicTexts = await self._translate_chunk([text], source_language, destination_language)
+        return indicTexts[0]
 
 
 class AzureTranslator(Translator):
+    # Azure accepts at most 1000 elements and 50000 characters per request
+    batch_max_items = 1000
+    batch_max_chars = 50000
+
     def __init__(self):
+        super().__init__()
         self.subscription_key = os.getenv('AZURE_TRANSLATION_KEY')
         self.resource_location = os.getenv('AZURE_TRANSLATION_RESOURCE_LOCATION')
         self.endpoint = "https://api.cognitive.microsofttranslator.com"
 
-    async def translate_text(
-            self, text: str, source_language: Language, destination_language: Language
-    ) -> str:
+    @staticmethod
+    def _language_code(language: Language) -> str:
+        if language.name == 'ZH':
+            return 'zh-Hans'
+        return language.name.lower()
+
+    async def _translate_chunk(
+        self, texts: List[str], source_language: Language, destination_language: Language
+    ) -> List[str]:
         path = '/translate'
         constructed_url = self.endpoint + path
 
-        if source_language.name == 'ZH':
-            source_language_code = 'zh-Hans'
-        else:
-            source_language_code = source_language.name.lower()
-
-        if destination_language.name == 'ZH':
-            destination_language_code = 'zh-Hans'
-        else:
-            destination_language_code = destination_language.name.lower()
-
         params = {
             'api-version': '3.0',
-            'from': source_language_code,
-            'to': destination_language_code
+            'from': self._language_code(source_language),
+            'to': self._language_code(destination_language)
         }
         headers = {
             'Ocp-Apim-Subscription-Key': self.subscription_key,
@@ -161,12 +173,16 @@ class AzureTranslator(Translator):
             'Content-type': 'application/json',
             'X-ClientTraceId': str(uuid.uuid4())
         }
-        body = [{'text': text}]
+        body = [{'text': text} for text in texts]
 
-        async with aiohttp.ClientSession(connector=aiohttp.TCPConnector(ssl=False)) as session:
-            async with session.post(constructed_url, params=params, headers=headers, json=body) as response:
-                response = await response.json()
-                return response[0]['translations'][0]['text']
+        response = await get_http_client().post(constructed_url, params=params, headers=headers, json=body)
+        return [item['translations'][0]['text'] for item in response.json()]
+
+    async def translate_text(
+            self, text: str, source_language: Language, destination_language: Language
+    ) -> str:
+        translations = await self._translate_chunk([text], source_language, destination_language)
+        return translations[0]
 
     async def transliterate_text(self, text: str, source_language: Language, from_script: str, to_script: str) -> str:
         path = '/transliterate'
@@ -186,37 +202,55 @@ class AzureTranslator(Translator):
         }
         body = [{'text': text}]
 
-        async with aiohttp.ClientSession(connector=aiohttp.TCPConnector(ssl=False)) as session:
-            async with session.post(constructed_url, params=params, headers=headers, json=body) as response:
-                response = await response.json()
-                print(response)
-                return response[0]['text']
+        response = await get_http_client().post(constructed_url, params=params, headers=headers, json=body)
+        return response.json()[0]['text']
 
 
 class GoogleTranslator(Translator):
-    async def translate_text(
-        self, text: str, source_language: Language, destination_language: Language
-    ) -> str:
-        client = TranslationServiceAsyncClient()
+    # Google recommends at most 1024 entries and 30000 codepoints per request
+    batch_max_items = 1024
+    batch_max_chars = 30000
+
+    def __init__(self):
+        super().__init__()
+        self._client: TranslationServiceAsyncClient | None = None
+
+    @property
+    def client(self) -> TranslationServiceAsyncClient:
+        if self._client is None:
+            self._client = TranslationServiceAsyncClient()
+        return self._client
+
+    async def _translate_chunk(
+        self, texts: List[str], source_language: Language, destination_language: Language
+    ) -> List[str]:
         location = "global"
         # TODO: make the project_id versatile
         project_id = "indian-legal-bert"
         parent = f"projects/{project_id}/locations/{location}"
-        response = await client.translate_text(
+        response = await self.client.translate_text(
             request={
                 "parent": parent,
-                "contents": [text],
+                "contents": texts,
                 "mime_type": "text/plain",
                 "source_language_code": source_language.name.lower(),
                 "target_language_code": destination_language.name.lower(),
             }
         )
-        return response.translations[0].translated_text
+        return [translation.translated_text for translation in response.translations]
+
+    async def translate_text(
+        self, text: str, source_language: Language, destination_language: Language
+    ) -> str:
+        translations = await self._translate_chunk([text], source_language, destination_language)
+        return translations[0]
 
 
 class CompositeTranslator(Translator):
-    def __init__(self, *translators: Translator):
+    def __init__(self, *translators: Translator, hedge: bool = False):
+        super().__init__()
         self.translators = translators
+        self.router = AdaptiveRouter(hedge=hedge)
 
     async def translate_text(
         self, text: str, source_language: Language, destination_language: Language
@@ -224,14 +258,24 @@ class CompositeTranslator(Translator):
         if source_language.value == destination_language.value:
             return text
 
-        excs = []
-        for translator in self.translators:
-            try:
-                print("INSIDE THIS translator", translator)
-                return await translator.translate_text(
-                    text, source_language, destination_language
-                )
-            except Exception as exc:
-                excs.append(exc)
+        return await self.router.call(
+            self.translators,
+            lambda translator: translator.translate_text(
+                text, source_language, destination_language
+            ),
+            "CompositeTranslator translation failed",
+        )
 
-        raise ExceptionGroup("CompositeTranslator translation failed", excs)
+    async def translate_batch(
+        self, texts: List[str], source_language: Language, destination_language: Language
+    ) -> List[str]:
+        if source_language.value == destination_language.value:
+            return list(texts)
+
+        return await self.router.call(
+            self.translators,
+            lambda translator: translator.translate_batch(
+                texts, source_language, destination_language
+            ),
+            "CompositeTranslator batch translation failed",
+        )
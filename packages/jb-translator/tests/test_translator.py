@@ -1,7 +1,15 @@
 import pytest
 import os
-from jugalbandi.translator.translator import DhruvaTranslator, GoogleTranslator, AzureTranslator
+import asyncio
+from jugalbandi.translator.translator import (
+    Translator,
+    DhruvaTranslator,
+    GoogleTranslator,
+    AzureTranslator,
+    CompositeTranslator,
+)
 from jugalbandi.core.language import Language
+from jugalbandi.core.errors import IncorrectInputException, ServiceUnavailableException
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -69,3 +77,127 @@ async def test_google_translator(google_translator: GoogleTranslator):
         english_text
         == "Who is a civil servant as per Karnataka State Civil Services Act"
     )
+
+
+class RecordingTranslator(Translator):
+    batch_max_items = 2
+
+    def __init__(self):
+        super().__init__()
+        self.chunks = []
+
+    async def translate_text(self, text, source_language, destination_language):
+        return (await self._translate_chunk([text], source_language, destination_language))[0]
+
+    async def _translate_chunk(self, texts, source_language, destination_language):
+        self.chunks.append(list(texts))
+        return [text.upper() for text in texts]
+
+
+@pytest.mark.asyncio
+async def test_translate_batch_preserves_order_and_skips_known_texts():
+    translator = RecordingTranslator()
+    texts = ["a", "b", "", "a", "c", "b"]
+    translated = await translator.translate_batch(texts, Language.EN, Language.HI)
+    assert translated == ["A", "B", "", "A", "C", "B"]
+    assert translator.chunks == [["a", "b"], ["c"]]
+
+    translated = await translator.translate_batch(["c", "d"], Language.EN, Language.HI)
+    assert translated == ["C", "D"]
+    assert translator.chunks[-1] == ["d"]
+
+
+@pytest.mark.asyncio
+async def test_translate_batch_bounds_concurrent_chunks():
+    class SlowTranslator(RecordingTranslator):
+        batch_max_concurrency = 2
+        in_flight = 0
+        max_in_flight = 0
+
+        async def _translate_chunk(self, texts, source_language, destination_language):
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+            await asyncio.sleep(0.01)
+            self.in_flight -= 1
+            return [text.upper() for text in texts]
+
+    translator = SlowTranslator()
+    texts = [str(i) for i in range(10)]
+    assert await translator.translate_batch(texts, Language.EN, Language.HI) == texts
+    assert translator.max_in_flight == 2
+
+
+class DelayedTranslator(Translator):
+    def __init__(self, delay, fail=False, error=ServiceUnavailableException):
+        super().__init__()
+        self.delay = delay
+        self.fail = fail
+        self.error = error
+        self.calls = 0
+
+    async def translate_text(self, text, source_language, destination_language):
+        self.calls += 1
+        await asyncio.sleep(self.delay)
+        if self.fail:
+            raise self.error("backend down")
+        return f"{text}:{self.delay}"
+
+
+@pytest.mark.asyncio
+async def test_composite_translator_hedges_slow_backend():
+    slow = DelayedTranslator(5)
+    fast = DelayedTranslator(0.01)
+    composite = CompositeTranslator(slow, fast, hedge=True)
+    composite.router.hedge_delay = 0.05
+    translated = await composite.translate_text("a", Language.EN, Language.HI)
+    assert translated == "a:0.01"
+    assert slow.calls == 1 and fast.calls == 1
+
+
+@pytest.mark.asyncio
+async def test_composite_translator_skips_open_circuit():
+    broken = DelayedTranslator(0, fail=True)
+    working = DelayedTranslator(0)
+    composite = CompositeTranslator(broken, working)
+    for _ in range(composite.router.failure_threshold):
+        assert await composite.translate_text("a", Language.EN, Language.HI) == "a:0"
+    assert broken.calls == composite.router.failure_threshold
+
+    assert await composite.translate_text("a", Language.EN, Language.HI) == "a:0"
+    assert broken.calls == composite.router.failure_threshold
+
+
+@pytest.mark.asyncio
+async def test_composite_translator_probes_half_open_circuit_once():
+    broken = DelayedTranslator(0.05, fail=True)
+    working = DelayedTranslator(0)
+    composite = CompositeTranslator(broken, working, hedge=True)
+    composite.router.reset_timeout = 0
+    for _ in range(composite.router.failure_threshold):
+        await composite.translate_text("a", Language.EN, Language.HI)
+    assert broken.calls == composite.router.failure_threshold
+
+    # half open right away, a single call tries the broken backend again
+    translated = await asyncio.gather(
+        *[composite.translate_text("a", Language.EN, Language.HI) for _ in range(5)]
+    )
+    assert translated == ["a:0"] * 5
+    assert broken.calls == composite.router.failure_threshold + 1
+
+
+@pytest.mark.asyncio
+async def test_composite_translator_blames_only_backend_failures():
+    rejecting = DelayedTranslator(0, fail=True, error=IncorrectInputException)
+    working = DelayedTranslator(0)
+    composite = CompositeTranslator(rejecting, working)
+    for _ in range(composite.router.failure_threshold + 1):
+        with pytest.raises(IncorrectInputException):
+            await composite.translate_text("a", Language.EN, Language.HI)
+    assert working.calls == 0
+
+    # neither a bad request nor an unknown error opens the circuit
+    rejecting.error = RuntimeError
+    for _ in range(composite.router.failure_threshold + 1):
+        assert await composite.translate_text("a", Language.EN, Language.HI) == "a:0"
+    assert rejecting.calls == 2 * (composite.router.failure_threshold + 1)
+    assert composite.router.breaker_for(rejecting).allow()